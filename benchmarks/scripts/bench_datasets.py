@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Deterministic, cached benchmark input datasets
+
+A dataset is identified by its shape, dtype, value distribution and seed.
+It is generated once into a .npy file in the cache directory and reused by
+every later run with the same key, so inputs are identical between runs and
+setup does not regenerate them.
+
+Files are created with numpy.lib.format.open_memmap and filled in
+fixed-size chunks. Each chunk is drawn from its own generator, seeded from
+(seed, chunk index). Memory use is bounded by one chunk, so datasets larger
+than RAM work. The content does not depend on the machine or its memory. A
+file is written under a temporary name and renamed into place, so readers
+never see partial data.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+DATASET_FORMAT = 1
+DEFAULT_CACHE_DIR = os.environ.get(
+    "BENCHMARK_DATA_CACHE", os.path.join("..", "data", "cache")
+)
+# Elements per generated chunk; part of the dataset format, as it fixes
+# which generator produces which values
+CHUNK_ELEMENTS = 1 << 22
+DISTRIBUTIONS = ("normal", "uniform", "zeros", "ones")
+
+
+def dataset_key(shape, dtype="float32", distribution="normal", seed=0):
+    """Stable identifier of a dataset"""
+    spec = {
+        "format": DATASET_FORMAT,
+        "shape": [int(d) for d in shape],
+        "dtype": np.dtype(dtype).str,
+        "distribution": distribution,
+        "seed": int(seed),
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _fill(chunk, distribution, seed, index):
+    if distribution == "zeros":
+        chunk[...] = 0
+        return
+    if distribution == "ones":
+        chunk[...] = 1
+        return
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(index,)))
+    if distribution == "normal":
+        values = rng.standard_normal(chunk.size)
+    else:
+        values = rng.random(chunk.size)
+    chunk[...] = values.astype(chunk.dtype, copy=False)
+
+
+def dataset_path(
+    shape, dtype="float32", distribution="normal", seed=0, cache_dir=DEFAULT_CACHE_DIR
+):
+    """
+    Path of a dataset in the cache, generating it on first use.
+
+    Parameters
+    ----------
+    shape : 'tuple'
+        Array shape.
+    dtype : 'str'
+        Element type.
+    distribution : 'str'
+        One of DISTRIBUTIONS: standard normal, uniform in [0, 1), zeros or ones.
+    seed : 'int'
+        Seed of the random distributions.
+    cache_dir : 'str'
+        Directory holding the generated datasets.
+    """
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(
+            f"Unknown distribution '{distribution}', expected one of {DISTRIBUTIONS}"
+        )
+    shape = tuple(int(d) for d in shape)
+    dtype = np.dtype(dtype)
+    dims = "x".join(str(d) for d in shape) or "scalar"
+    name = f"{distribution}_{dims}_{dtype.name}_s{seed}_{dataset_key(shape, dtype, distribution, seed)}.npy"
+    path = os.path.join(cache_dir, name)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = os.path.join(cache_dir, f".{name}.{os.getpid()}.tmp")
+    try:
+        # open_memmap writes the header and sizes the file; the data is then
+        # filled through one mapped window per chunk, so resident memory stays
+        # at one chunk however large the dataset is
+        header = open_memmap(tmp, mode="w+", dtype=dtype, shape=shape)
+        offset, size = header.offset, header.size
+        del header
+        for index, start in enumerate(range(0, size, CHUNK_ELEMENTS)):
+            count = min(CHUNK_ELEMENTS, size - start)
+            chunk = np.memmap(
+                tmp,
+                dtype=dtype,
+                mode="r+",
+                shape=(count,),
+                offset=offset + start * dtype.itemsize,
+            )
+            _fill(chunk, distribution, seed, index)
+            chunk.flush()
+            del chunk
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return path
+
+
+def load_dataset(
+    shape, dtype="float32", distribution="normal", seed=0, cache_dir=DEFAULT_CACHE_DIR
+):
+    """Read-only memory map of a dataset, see dataset_path()"""
+    return np.load(
+        dataset_path(shape, dtype, distribution, seed, cache_dir), mmap_mode="r"
+    )
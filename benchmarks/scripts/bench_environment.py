@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Benchmark environment control and noise checks
+
+Timings swing when the runner migrates between cores, the frequency
+governor ramps, turbo boosts, other work loads the machine or the CPU
+throttles thermally. pin_to_cpus() builds a preexec_fn that pins runner
+processes to a fixed core set. system_state() reads the governor,
+frequency, turbo, load average and throttle counters from sysfs/procfs.
+check_state() turns a before/after pair into warnings.
+
+Everything degrades gracefully: files the platform does not provide
+(macOS, containers, VMs) are reported as None and not warned about.
+"""
+
+import glob
+import os
+
+SYSFS_CPU = "/sys/devices/system/cpu"
+# 1-minute load average above which the machine does not count as idle
+LOAD_WARNING = 0.5
+# Relative frequency change between before and after that is warned about
+FREQUENCY_DRIFT_WARNING = 0.1
+
+
+def parse_cpu_list(text):
+    """CPUs of a kernel-style cpu list such as '2,4-7'"""
+    cpus = set()
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _cpu_ids(cpus=None):
+    if cpus is not None:
+        return sorted(cpus)
+    online = _read(os.path.join(SYSFS_CPU, "online"))
+    if online:
+        return sorted(parse_cpu_list(online))
+    return list(range(os.cpu_count() or 1))
+
+
+def pin_to_cpus(cpus):
+    """
+    preexec_fn pinning a child process to the given CPUs, or None when
+    no CPUs are given. Raises OSError where affinity is not supported.
+    """
+    if not cpus:
+        return None
+    if not hasattr(os, "sched_setaffinity"):
+        raise OSError("CPU affinity is not supported on this platform")
+    cpus = set(cpus)
+    available = os.sched_getaffinity(0)
+    if not cpus <= available:
+        raise OSError(
+            f"CPUs {sorted(cpus - available)} are not available "
+            f"(allowed: {sorted(available)})"
+        )
+
+    def pin():
+        os.sched_setaffinity(0, cpus)
+
+    return pin
+
+
+def turbo_enabled():
+    """Whether turbo/boost is on, None when unknown"""
+    no_turbo = _read(os.path.join(SYSFS_CPU, "intel_pstate", "no_turbo"))
+    if no_turbo is not None:
+        return no_turbo == "0"
+    boost = _read(os.path.join(SYSFS_CPU, "cpufreq", "boost"))
+    if boost is not None:
+        return boost == "1"
+    return None
+
+
+def _throttle_count(cpu):
+    counts = [
+        _read(path)
+        for path in glob.glob(
+            os.path.join(SYSFS_CPU, f"cpu{cpu}", "thermal_throttle", "*_throttle_count")
+        )
+    ]
+    counts = [int(count) for count in counts if count is not None]
+    return sum(counts) if counts else None
+
+
+def system_state(cpus=None):
+    """
+    Snapshot of the noise sources relevant to the given CPUs (all online
+    CPUs by default).
+
+    Returns
+    -------
+    'dict'
+        governors and frequencies_mhz per CPU, turbo, loadavg (1, 5, 15
+        minutes), throttle_count per CPU, isolated CPUs and max_temp_c over
+        the thermal zones. Unavailable values are None.
+    """
+    ids = _cpu_ids(cpus)
+    governors, frequencies, throttles = {}, {}, {}
+    for cpu in ids:
+        cpufreq = os.path.join(SYSFS_CPU, f"cpu{cpu}", "cpufreq")
+        governors[cpu] = _read(os.path.join(cpufreq, "scaling_governor"))
+        khz = _read(os.path.join(cpufreq, "scaling_cur_freq"))
+        frequencies[cpu] = int(khz) / 1000 if khz else None
+        throttles[cpu] = _throttle_count(cpu)
+
+    temps = [_read(path) for path in glob.glob("/sys/class/thermal/thermal_zone*/temp")]
+    temps = [int(t) / 1000 for t in temps if t and t.lstrip("-").isdigit()]
+    isolated = _read(os.path.join(SYSFS_CPU, "isolated"))
+    return {
+        "cpus": ids,
+        "governors": governors,
+        "frequencies_mhz": frequencies,
+        "turbo": turbo_enabled(),
+        "loadavg": list(os.getloadavg()) if hasattr(os, "getloadavg") else None,
+        "throttle_count": throttles,
+        "isolated": sorted(parse_cpu_list(isolated)) if isolated else [],
+        "max_temp_c": max(temps) if temps else None,
+    }
+
+
+def check_state(before, after=None, pinned=None):
+    """Warnings about a benchmark environment, from states before and after a sweep"""
+    warnings = []
+    governors = {g for g in before["governors"].values() if g is not None}
+    if governors - {"performance"}:
+        warnings.append(
+            f"CPU frequency governor is {', '.join(sorted(governors))}, "
+            f"not 'performance'"
+        )
+    if before["turbo"]:
+        warnings.append(
+            "Turbo boost is enabled; frequencies depend on load and temperature"
+        )
+    if before["loadavg"] and before["loadavg"][0] > LOAD_WARNING:
+        warnings.append(
+            f"Machine is not idle: 1-minute load average {before['loadavg'][0]:.2f}"
+        )
+    if pinned and not set(pinned) <= set(before["isolated"]):
+        warnings.append(
+            f"Pinned CPUs {sorted(set(pinned) - set(before['isolated']))} are not "
+            f"isolated (isolcpus); other tasks may run on them"
+        )
+    if after is None:
+        return warnings
+
+    throttled = [
+        cpu
+        for cpu, count in after["throttle_count"].items()
+        if count is not None
+        and before["throttle_count"].get(cpu) is not None
+        and count > before["throttle_count"][cpu]
+    ]
+    if throttled:
+        warnings.append(f"Thermal throttling on CPU(s) {throttled} during the sweep")
+    drifted = [
+        cpu
+        for cpu, mhz in after["frequencies_mhz"].items()
+        if mhz
+        and before["frequencies_mhz"].get(cpu)
+        and abs(mhz / before["frequencies_mhz"][cpu] - 1) > FREQUENCY_DRIFT_WARNING
+    ]
+    if drifted:
+        warnings.append(
+            f"CPU frequency changed by more than {FREQUENCY_DRIFT_WARNING:.0%} "
+            f"on CPU(s) {drifted} during the sweep"
+        )
+    return warnings
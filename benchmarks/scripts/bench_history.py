@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark history store
+
+Every benchmark run is appended as one JSON line to a history file, tagged
+with the git commit of the tree, the platform and the versions of the tools
+involved. Appends take an exclusive lock, so concurrent runs on one machine
+do not interleave their records.
+"""
+
+import fcntl
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+import numpy as np
+
+DEFAULT_HISTORY = "../results/benchmark_history.jsonl"
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+
+
+def _command_output(cmd, cwd=None):
+    try:
+        result = subprocess.run(
+            cmd, cwd=cwd, capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    output = (result.stdout or result.stderr).strip()
+    return output.splitlines()[0] if output else None
+
+
+def git_state():
+    """Commit of the source tree and whether it has local modifications"""
+    commit = _command_output(["git", "rev-parse", "HEAD"], cwd=REPO_DIR)
+    status = _command_output(
+        ["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR
+    )
+    return {"commit": commit, "dirty": bool(status)}
+
+
+def run_metadata(runner=None):
+    """Identification of a benchmark run: time, git state, platform and tool versions"""
+    tools = {"python": platform.python_version(), "numpy": np.__version__}
+    if runner:
+        tools["scenario_runner"] = {
+            "path": os.path.abspath(runner),
+            "version": _command_output([runner, "--version"]),
+        }
+        try:
+            tools["scenario_runner"]["mtime"] = os.path.getmtime(runner)
+        except OSError:
+            pass
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "git": git_state(),
+        "platform": f"{platform.system()} {platform.machine()}",
+        "platform_info": {
+            "system": platform.system(),
+            "release": platform.release(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "node": platform.node(),
+        },
+        "tools": tools,
+    }
+
+
+def append_run(record, path=DEFAULT_HISTORY):
+    """Append one run record to the history file"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    line = json.dumps(record) + "\n"
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.write(line)
+            f.flush()
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def load_history(path=DEFAULT_HISTORY):
+    """All run records, oldest first; unreadable lines are skipped"""
+    runs = []
+    try:
+        with open(path) as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    runs.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(
+                        f"Warning: skipping corrupt line {number} of {path}",
+                        file=sys.stderr,
+                    )
+    except FileNotFoundError:
+        pass
+    return runs
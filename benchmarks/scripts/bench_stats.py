@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Statistics for benchmark timings
+
+All functions take plain sequences of per-iteration times and only need
+NumPy:
+
+- detect_warmup() finds where a series settles with a single change-point
+  search, so slow first iterations (cold caches, clock ramp-up, lazy
+  pipeline creation) are not mixed into the steady state.
+- reject_outliers() drops samples further than k scaled MADs from the
+  median.
+- median_ci() is the distribution-free confidence interval of the median
+  from order statistics; it is cheap enough to evaluate after every batch
+  and drives the adaptive stopping rule.
+- bootstrap_ci() gives percentile-bootstrap intervals for any statistic
+  (median, p90, p99) in the final report.
+- mann_whitney() tests whether two runs' samples come from the same
+  distribution, for regression checks against the benchmark history.
+"""
+
+import math
+
+import numpy as np
+
+# Two-sided normal quantiles for the supported confidence levels
+_Z = {0.90: 1.6449, 0.95: 1.9600, 0.99: 2.5758}
+MAD_SCALE = 1.4826  # MAD -> standard deviation for normal data
+
+
+def _z(confidence):
+    if confidence not in _Z:
+        raise ValueError(f"confidence must be one of {sorted(_Z)}")
+    return _Z[confidence]
+
+
+def detect_warmup(samples, max_fraction=0.5):
+    """
+    Number of leading samples that belong to a warmup phase.
+
+    The series is split at the point that minimizes the summed squared
+    deviation of the two segments (a single least-squares change point).
+    The split is accepted when it explains more variance than a BIC
+    penalty and the leading segment is slower than the rest; otherwise
+    there is no warmup. At most max_fraction of the samples are discarded.
+    """
+    x = np.asarray(samples, dtype=np.float64)
+    n = len(x)
+    if n < 6:
+        return 0
+    csum = np.cumsum(x)
+    csum2 = np.cumsum(x * x)
+    total, total2 = csum[-1], csum2[-1]
+    k = np.arange(1, int(n * max_fraction) + 1)
+    head_sse = csum2[k - 1] - csum[k - 1] ** 2 / k
+    tail_sse = (total2 - csum2[k - 1]) - (total - csum[k - 1]) ** 2 / (n - k)
+    cost = head_sse + tail_sse
+    best = int(np.argmin(cost))
+    split = int(k[best])
+
+    sse = total2 - total * total / n
+    tail = x[split:]
+    variance = max(float(np.var(tail)), 1e-12 * float(np.mean(tail)) ** 2, 1e-300)
+    if sse - cost[best] <= 2 * math.log(n) * variance:
+        return 0
+    if np.mean(x[:split]) <= np.median(tail):
+        return 0
+    return split
+
+
+def reject_outliers(samples, k=3.5):
+    """
+    Samples within k scaled median absolute deviations of the median,
+    and the number rejected. Nothing is rejected when the MAD is zero.
+    """
+    x = np.asarray(samples, dtype=np.float64)
+    if len(x) < 3:
+        return x, 0
+    median = np.median(x)
+    mad = MAD_SCALE * np.median(np.abs(x - median))
+    if mad == 0:
+        return x, 0
+    keep = np.abs(x - median) <= k * mad
+    return x[keep], int(len(x) - np.count_nonzero(keep))
+
+
+def median_ci(samples, confidence=0.95):
+    """
+    Distribution-free confidence interval of the median from the order
+    statistics, or None with fewer than 6 samples.
+    """
+    x = np.sort(np.asarray(samples, dtype=np.float64))
+    n = len(x)
+    if n < 6:
+        return None
+    half = _z(confidence) * math.sqrt(n) / 2
+    lo = max(int(math.floor(n / 2 - half)), 0)
+    hi = min(int(math.ceil(n / 2 + half)), n - 1)
+    return float(x[lo]), float(x[hi])
+
+
+def percentile(samples, q):
+    return float(np.percentile(np.asarray(samples, dtype=np.float64), q))
+
+
+def bootstrap_ci(samples, statistic, confidence=0.95, resamples=2000, seed=0):
+    """Percentile-bootstrap confidence interval of statistic(samples, axis=1)"""
+    x = np.asarray(samples, dtype=np.float64)
+    if len(x) < 2:
+        value = float(statistic(x[None, :], axis=1)[0]) if len(x) else float("nan")
+        return value, value
+    rng = np.random.default_rng(seed)
+    values = np.empty(resamples)
+    # Resample in blocks to bound memory for long series
+    block = max(1, (1 << 22) // len(x))
+    for start in range(0, resamples, block):
+        count = min(block, resamples - start)
+        draws = x[rng.integers(0, len(x), size=(count, len(x)))]
+        values[start : start + count] = statistic(draws, axis=1)
+    alpha = (1 - confidence) / 2
+    lo, hi = np.quantile(values, [alpha, 1 - alpha])
+    return float(lo), float(hi)
+
+
+def summarize(samples, confidence=0.95, resamples=2000):
+    """
+    Median, p90, p99, mean and spread of steady-state samples, with
+    bootstrap confidence intervals of the quantiles.
+    """
+    x = np.asarray(samples, dtype=np.float64)
+    quantiles = {"median_ms": 50, "p90_ms": 90, "p99_ms": 99}
+    summary = {name: percentile(x, q) for name, q in quantiles.items()}
+    summary["ci"] = {
+        name: list(
+            bootstrap_ci(
+                x,
+                lambda d, axis, q=q: np.percentile(d, q, axis=axis),
+                confidence,
+                resamples,
+            )
+        )
+        for name, q in quantiles.items()
+    }
+    summary["confidence"] = confidence
+    summary.update(
+        avg_ms=float(np.mean(x)),
+        std_ms=float(np.std(x)),
+        min_ms=float(np.min(x)),
+        max_ms=float(np.max(x)),
+    )
+    return summary
+
+
+def mann_whitney(x, y):
+    """
+    Two-sided Mann-Whitney U test of x against y, using the normal
+    approximation with tie and continuity corrections.
+
+    Returns
+    -------
+    'dict'
+        u (for x), p_value, and the probability that a sample of x is larger
+        than one of y (ties counted half), which is 0.5 when they are alike.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n1, n2 = len(x), len(y)
+    if n1 == 0 or n2 == 0:
+        raise ValueError("Mann-Whitney needs samples on both sides")
+    values, inverse, counts = np.unique(
+        np.concatenate([x, y]), return_inverse=True, return_counts=True
+    )
+    # Average rank of each distinct value, 1-based
+    upper = np.cumsum(counts)
+    ranks = (upper - (counts - 1) / 2)[inverse]
+    u = float(ranks[:n1].sum() - n1 * (n1 + 1) / 2)
+
+    n = n1 + n2
+    mean = n1 * n2 / 2
+    ties = float(np.sum(counts.astype(np.float64) ** 3 - counts))
+    tie_term = ties / (n * (n - 1)) if n > 1 else 0.0
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term)
+    if variance <= 0:
+        p_value = 1.0
+    else:
+        delta = u - mean
+        z = (abs(delta) - 0.5) / math.sqrt(variance) if abs(delta) > 0.5 else 0.0
+        p_value = min(1.0, math.erfc(z / math.sqrt(2)))
+    return {"u": u, "p_value": p_value, "prob_greater": u / (n1 * n2)}
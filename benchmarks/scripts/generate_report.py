@@ -1,35 +1,172 @@
 #!/usr/bin/env python3
+import argparse
 import json
-import matplotlib.pyplot as plt
+import sys
+
 import numpy as np
 
-def generate_report():
-    with open('../results/benchmark_results.json', 'r') as f:
-        data = json.load(f)
-    
+import bench_history
+import bench_stats
+
+
+def _samples(metrics):
+    """Steady-state samples of one size, or the summary value for old records"""
+    if metrics.get('samples_ms'):
+        return metrics['samples_ms']
+    value = metrics.get('median_ms', metrics.get('avg_ms'))
+    return [value] if value is not None else []
+
+
+def compare_runs(latest, baseline_runs, threshold, alpha):
+    """
+    Compare every benchmark/size of the latest run with the pooled samples
+    of the baseline runs.
+
+    A size regresses (improves) when its median is more than threshold
+    slower (faster) than the baseline median and a Mann-Whitney test
+    rejects equal distributions at level alpha.
+    """
+    comparisons = []
+    for bench_name, results in latest['results'].items():
+        for size, metrics in results.items():
+            current = _samples(metrics)
+            baseline = []
+            for run in baseline_runs:
+                baseline += _samples(run['results'].get(bench_name, {}).get(size, {}))
+            entry = {
+                'benchmark': bench_name,
+                'size': size,
+                'latest_ms': float(np.median(current)) if current else None,
+                'baseline_ms': float(np.median(baseline)) if baseline else None,
+                'baseline_samples': len(baseline),
+                'change': None,
+                'p_value': None,
+            }
+            comparisons.append(entry)
+            if len(current) < 3 or len(baseline) < 3:
+                entry['status'] = 'insufficient data'
+                continue
+            entry['change'] = entry['latest_ms'] / entry['baseline_ms'] - 1
+            entry['p_value'] = bench_stats.mann_whitney(current, baseline)['p_value']
+            significant = entry['p_value'] < alpha
+            if significant and entry['change'] > threshold:
+                entry['status'] = 'REGRESSION'
+            elif significant and entry['change'] < -threshold:
+                entry['status'] = 'improvement'
+            else:
+                entry['status'] = 'unchanged'
+    return comparisons
+
+
+def print_summary(data):
     print("# ARM ML SDK Benchmark Report")
     print(f"\nDate: {data['date']}")
     print(f"Platform: {data['platform']}")
+    git = data.get('git')
+    if git:
+        print(f"Commit: {git['commit']}{' (modified)' if git['dirty'] else ''}")
     print("\n## Results Summary\n")
-    
+
     for bench_name, results in data['results'].items():
         print(f"### {bench_name}")
-        print("\n| Size | Avg Time (ms) | Std Dev | Performance |")
-        print("|------|---------------|---------|-------------|")
-        
+        print("\n| Size | Median (ms) | CI | p90 (ms) | p99 (ms) | Runs |")
+        print("|------|-------------|----|----------|----------|------|")
+
         for size, metrics in results.items():
-            print(f"| {size} | {metrics['avg_ms']:.2f} | ±{metrics['std_ms']:.2f} | - |")
+            if 'median_ms' not in metrics:
+                print(f"| {size} | {metrics['avg_ms']:.2f} | ±{metrics['std_ms']:.2f} | - | - | - |")
+                continue
+            low, high = metrics['ci']['median_ms']
+            print(f"| {size} | {metrics['median_ms']:.3f} | [{low:.3f}, {high:.3f}] | "
+                  f"{metrics['p90_ms']:.3f} | {metrics['p99_ms']:.3f} | {metrics['iterations']} |")
         print()
-    
-    # Generate plots
-    fig, axes = plt.subplots(2, 2, figsize=(12, 10))
-    
-    # Plot matrix multiplication comparison
-    # ... plotting code ...
-    
+
+
+def print_comparison(comparisons, baseline_runs, threshold, alpha):
+    commits = sorted({(run.get('git') or {}).get('commit') or '?' for run in baseline_runs})
+    print(f"## Comparison with the previous {len(baseline_runs)} run(s)\n")
+    print(f"Baseline commits: {', '.join(c[:12] for c in commits)}")
+    print(f"Threshold: {threshold:.1%} change of the median, Mann-Whitney p < {alpha}\n")
+    print("| Benchmark | Size | Baseline (ms) | Latest (ms) | Change | p-value | Status |")
+    print("|-----------|------|---------------|-------------|--------|---------|--------|")
+    fmt = lambda value, spec: '-' if value is None else format(value, spec)
+    for entry in comparisons:
+        print(f"| {entry['benchmark']} | {entry['size']} | {fmt(entry['baseline_ms'], '.3f')} | "
+              f"{fmt(entry['latest_ms'], '.3f')} | {fmt(entry['change'], '+.1%')} | "
+              f"{fmt(entry['p_value'], '.2g')} | {entry['status']} |")
+    print()
+
+
+def plot_history(runs, path):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    bench_names = list(runs[-1]['results'])
+    fig, axes = plt.subplots(len(bench_names), 1, figsize=(10, 4 * len(bench_names)), squeeze=False)
+    for ax, bench_name in zip(axes[:, 0], bench_names):
+        for size in runs[-1]['results'][bench_name]:
+            points = [(i, run['results'][bench_name][size])
+                      for i, run in enumerate(runs)
+                      if size in run['results'].get(bench_name, {})]
+            ax.plot([i for i, _ in points],
+                    [m.get('median_ms', m.get('avg_ms')) for _, m in points],
+                    marker='o', label=f"size {size}")
+        ax.set_title(bench_name)
+        ax.set_xlabel('run')
+        ax.set_ylabel('median time (ms)')
+        ax.legend()
     plt.tight_layout()
-    plt.savefig('../results/benchmark_plots.png')
-    print("\nPlots saved to benchmark_plots.png")
+    plt.savefig(path)
+    print(f"\nPlots saved to {path}")
+
+
+def generate_report():
+    parser = argparse.ArgumentParser(
+        description="Report the latest benchmark run and check it against the history")
+    parser.add_argument('--history', default=bench_history.DEFAULT_HISTORY,
+                        help='JSON-lines benchmark history written by run_benchmarks.py')
+    parser.add_argument('--results', default='../results/benchmark_results.json',
+                        help='Latest results, used when the history is empty')
+    parser.add_argument('--baseline-runs', type=int, default=5,
+                        help='Number of previous runs pooled into the baseline')
+    parser.add_argument('--threshold', type=float, default=0.05,
+                        help='Relative change of the median that counts as a regression '
+                             'or improvement')
+    parser.add_argument('--alpha', type=float, default=0.01,
+                        help='Significance level of the Mann-Whitney test')
+    parser.add_argument('--any-platform', action='store_true',
+                        help='Also use baseline runs recorded on other platforms')
+    parser.add_argument('--plot', metavar='PNG',
+                        help='Plot the median time of every size over the history')
+    args = parser.parse_args()
+
+    runs = bench_history.load_history(args.history)
+    if not runs:
+        with open(args.results, 'r') as f:
+            runs = [json.load(f)]
+    latest = runs[-1]
+    print_summary(latest)
+
+    previous = [run for run in runs[:-1]
+                if args.any_platform or run.get('platform') == latest.get('platform')]
+    baseline_runs = previous[-args.baseline_runs:] if args.baseline_runs > 0 else []
+    if not baseline_runs:
+        print("No earlier runs to compare with.")
+        regressions = []
+    else:
+        comparisons = compare_runs(latest, baseline_runs, args.threshold, args.alpha)
+        print_comparison(comparisons, baseline_runs, args.threshold, args.alpha)
+        regressions = [e for e in comparisons if e['status'] == 'REGRESSION']
+        improvements = [e for e in comparisons if e['status'] == 'improvement']
+        print(f"{len(regressions)} regression(s), {len(improvements)} improvement(s)")
+        for entry in regressions:
+            print(f"  REGRESSION {entry['benchmark']} size {entry['size']}: "
+                  f"{entry['baseline_ms']:.3f} -> {entry['latest_ms']:.3f} ms ({entry['change']:+.1%})")
+
+    if args.plot:
+        plot_history(runs, args.plot)
+    return 1 if regressions else 0
 
 if __name__ == "__main__":
-    generate_report()
+    sys.exit(generate_report())
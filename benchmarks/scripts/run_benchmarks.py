@@ -1,104 +1,353 @@
 #!/usr/bin/env python3
-import subprocess
-import time
 import json
 import numpy as np
 import os
 import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
 from datetime import datetime
 
-SCENARIO_RUNNER = "/Users/jerry/Vulkan/ai-ml-sdk-for-vulkan/build-final/bin/scenario-runner"
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'unified-ml-sdk', 'tools'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'scripts'))
+from scenario_session import open_session
+from process_usage import mean_usage
+from staging import Stager
+import bench_stats
+import bench_history
+import bench_datasets
+import bench_environment
+
+# Point SCENARIO_RUNNER at unified-ml-sdk/tools/numpy_scenario_runner.py to
+# run without a Vulkan device
+SCENARIO_RUNNER = os.environ.get(
+    "SCENARIO_RUNNER",
+    "/Users/jerry/Vulkan/ai-ml-sdk-for-vulkan/build-final/bin/scenario-runner"
+)
+
+def runner_supports(runner, option):
+    """Whether the runner's --help lists a command line option"""
+    try:
+        result = subprocess.run([runner, '--help'], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return option in result.stdout + result.stderr
+
+def write_null_dispatch_scenario(scenario_file, output_dir):
+    """
+    Copy of a scenario whose dispatches are empty (rangeND of zeros), with
+    the same resources, shaders and bindings, so running it measures
+    everything except the device work. Outputs are redirected to
+    output_dir. The copy sits next to the original so relative paths
+    still resolve.
+    """
+    with open(scenario_file) as f:
+        scenario = json.load(f)
+    for entry in scenario.get('resources', []):
+        desc = next(iter(entry.values()))
+        if 'dst' in desc:
+            desc['dst'] = os.path.join(os.path.abspath(output_dir), f"{desc['uid']}.npy")
+    for command in scenario.get('commands', []):
+        kind, desc = next(iter(command.items()))
+        if kind == 'dispatch_compute':
+            desc['rangeND'] = [0] * len(desc.get('rangeND', [1, 1, 1]))
+    fd, path = tempfile.mkstemp(suffix='.null.json',
+                                dir=os.path.dirname(os.path.abspath(scenario_file)))
+    with os.fdopen(fd, 'w') as f:
+        json.dump(scenario, f, indent=2)
+    return path
 
 class Benchmark:
-    def __init__(self, name, scenario_file, sizes):
+    """
+    Timing sweep of one scenario over a list of problem sizes.
+
+    Each size is sampled adaptively: iterations are run in batches until
+    the confidence interval of the median is narrower than target_rel_ci
+    (relative to the median), the time budget is spent or max_iterations
+    is reached. Leading warmup iterations found by change-point detection
+    and MAD outliers are excluded from the statistics.
+
+    Inputs come from the seeded dataset cache (bench_datasets), so every
+    run measures the same data and only the first one generates it.
+
+    Host overhead is measured with a null-dispatch copy of the scenario and
+    subtracted ("net" time). When the session reports per-dispatch times
+    (session runners, or the profiling dump of per-run processes) the sum
+    of the dispatch times is reported as device time. Throughput is given
+    for the wall-clock, net and device times.
+    """
+    def __init__(self, name, scenario_file, sizes, seed=0,
+                 data_cache=bench_datasets.DEFAULT_CACHE_DIR, cpus=None):
         self.name = name
         self.scenario_file = scenario_file
         self.sizes = sizes
+        self.seed = seed
+        self.data_cache = data_cache
+        # Runner processes are pinned to these CPUs, when given
+        self.cpus = sorted(cpus) if cpus else None
+        self.stager = Stager()
         self.results = {}
     
-    def run(self, iterations=5):
+    def run(self, target_rel_ci=0.02, time_budget_s=10.0, min_iterations=10,
+            max_iterations=500, confidence=0.95, baseline=True):
         print(f"\n{'='*60}")
         print(f"Benchmark: {self.name}")
         print(f"{'='*60}")
         
-        for size in self.sizes:
-            print(f"\nSize: {size}")
-            times = []
-            
-            # Prepare data
-            self.prepare_data(size)
-            
-            # Warm up
-            self._run_scenario()
-            
-            # Benchmark runs
-            for i in range(iterations):
-                start = time.perf_counter()
-                self._run_scenario()
-                end = time.perf_counter()
-                elapsed = (end - start) * 1000  # Convert to ms
-                times.append(elapsed)
-                print(f"  Run {i+1}: {elapsed:.2f} ms")
-            
-            avg_time = np.mean(times)
-            std_time = np.std(times)
-            
-            self.results[size] = {
-                'avg_ms': avg_time,
-                'std_ms': std_time,
-                'min_ms': min(times),
-                'max_ms': max(times)
+        env = os.environ.copy()
+        env['DYLD_LIBRARY_PATH'] = '/usr/local/lib'
+        self.sampling = dict(target_rel_ci=target_rel_ci, time_budget_s=time_budget_s,
+                             min_iterations=min_iterations, max_iterations=max_iterations,
+                             confidence=confidence)
+        
+        # One runner process for the whole sweep, so the timings measure the
+        # workload instead of process start and Vulkan setup
+        null_scenario = null_dir = None
+        try:
+            if baseline:
+                null_dir = tempfile.mkdtemp(prefix='null-dispatch-')
+                null_scenario = write_null_dispatch_scenario(self.scenario_file, null_dir)
+            profiling = runner_supports(SCENARIO_RUNNER, '--profiling-dump-path')
+            preexec_fn = bench_environment.pin_to_cpus(self.cpus)
+            with open_session(SCENARIO_RUNNER, env, profiling=profiling,
+                              preexec_fn=preexec_fn) as self.session:
+                print(f"Timing: {self.session.timing_label} ({self.session.timing})")
+                for size in self.sizes:
+                    self._run_size(size, null_scenario, null_dir)
+        finally:
+            if null_scenario:
+                os.unlink(null_scenario)
+            if null_dir:
+                shutil.rmtree(null_dir, ignore_errors=True)
+    
+    def _run_size(self, size, null_scenario=None, null_dir=None):
+        print(f"\nSize: {size}")
+        confidence = self.sampling['confidence']
+        
+        # Prepare data, then (re)load the scenario so the session picks it up
+        self.prepare_data(size)
+        handle = self.session.load(self.scenario_file, '.')
+        before = bench_environment.system_state(self.cpus)
+        sample = self._sample(handle)
+        after = bench_environment.system_state(self.cpus)
+        
+        result = bench_stats.summarize(sample['steady'], confidence)
+        result.update({
+            'timing': self.session.timing,
+            'iterations': len(sample['times']),
+            'warmup_discarded': sample['warmup'],
+            'outliers_rejected': sample['outliers'],
+            'samples': len(sample['steady']),
+            'ci_rel_width': sample['rel_ci'],
+            'converged': sample['converged'],
+            'samples_ms': [float(t) for t in sample['steady']],
+        })
+        self.results[size] = result
+        warnings = bench_environment.check_state(before, after, self.cpus)
+        result['environment'] = {'cpu_affinity': self.cpus, 'before': before, 'after': after,
+                                 'warnings': warnings}
+        
+        low, high = result['ci']['median_ms']
+        print(f"  {result['iterations']} runs ({sample['warmup']} warmup, "
+              f"{sample['outliers']} outliers), "
+              f"{'converged' if sample['converged'] else 'budget exhausted'}")
+        print(f"  Median: {result['median_ms']:.3f} ms [{low:.3f}, {high:.3f}] "
+              f"({confidence:.0%} CI, {sample['rel_ci']:.1%} wide)")
+        print(f"  p90: {result['p90_ms']:.3f} ms  p99: {result['p99_ms']:.3f} ms")
+        for warning in warnings:
+            print(f"  Warning: {warning}")
+        
+        # Device time: per-dispatch timestamps from the session or the
+        # runner's profiling dump
+        device = [d for d in sample['device_times'][sample['warmup']:] if d is not None]
+        if device:
+            device, _ = bench_stats.reject_outliers(device)
+            result['device_median_ms'] = float(np.median(device))
+            result['device_ci'] = list(bench_stats.median_ci(device, confidence) or
+                                       (result['device_median_ms'],) * 2)
+            print(f"  Device: {result['device_median_ms']:.3f} ms")
+        
+        # Host resource usage of the runner per steady-state run
+        result['host_usage'] = mean_usage(sample['usages'][sample['warmup']:])
+        if result['host_usage']:
+            usage = result['host_usage']
+            print(f"  Host: {usage['user_cpu_ms']:.2f} ms user, {usage['sys_cpu_ms']:.2f} ms sys, "
+                  f"{usage['max_rss_mb']:.1f} MB peak RSS")
+        
+        # Host overhead: the same scenario with empty dispatches
+        if null_scenario:
+            null_handle = self.session.load(null_scenario, null_dir)
+            null = self._sample(null_handle)
+            overhead = bench_stats.summarize(null['steady'], confidence)
+            result['baseline'] = {
+                'median_ms': overhead['median_ms'],
+                'ci': overhead['ci']['median_ms'],
+                'iterations': len(null['times']),
+                'converged': null['converged'],
             }
-            
-            print(f"  Average: {avg_time:.2f} ± {std_time:.2f} ms")
-            
-            # Calculate throughput if applicable
-            self.calculate_metrics(size, avg_time)
+            result['net_median_ms'] = result['median_ms'] - overhead['median_ms']
+            print(f"  Null-dispatch baseline: {overhead['median_ms']:.3f} ms, "
+                  f"net {result['net_median_ms']:.3f} ms")
+            if result['net_median_ms'] <= 0:
+                print("  Warning: the workload is not measurably slower than its "
+                      "null-dispatch baseline")
+        
+        # Calculate throughput if applicable
+        result['throughput'] = {}
+        for label, key in (('wall', 'median_ms'), ('net', 'net_median_ms'),
+                           ('device', 'device_median_ms')):
+            if result.get(key, 0) > 0:
+                metrics = self.calculate_metrics(size, result[key])
+                if metrics:
+                    result['throughput'][label] = metrics
+                    print(f"  {label.capitalize():<6} " +
+                          ", ".join(f"{value:.2f} {unit}" for unit, value in metrics.items()))
+    
+    def _sample(self, handle):
+        """
+        Time a loaded scenario until the median is known precisely enough
+        or the budget is spent.
+        """
+        settings = self.sampling
+        confidence = settings['confidence']
+        min_iterations = settings['min_iterations']
+        max_iterations = settings['max_iterations']
+        
+        # Warm up
+        self._run_scenario(handle)
+        
+        # Sample in growing batches
+        times, device_times, usages = [], [], []
+        start = time.monotonic()
+        deadline = start + settings['time_budget_s']
+        batch = min_iterations
+        converged = False
+        while True:
+            for wall, device, usage in self._run_batch(handle, batch):
+                times.append(wall)
+                device_times.append(device)
+                usages.append(usage)
+            warmup = bench_stats.detect_warmup(times)
+            steady, outliers = bench_stats.reject_outliers(times[warmup:])
+            ci = bench_stats.median_ci(steady, confidence)
+            median = float(np.median(steady))
+            rel_ci = (ci[1] - ci[0]) / median if ci and median > 0 else float('inf')
+            if len(steady) >= min_iterations and rel_ci <= settings['target_rel_ci']:
+                converged = True
+                break
+            if len(times) >= max_iterations or time.monotonic() >= deadline:
+                break
+            # Estimate how many more runs fit in the budget, at most doubling
+            now = time.monotonic()
+            per_run_s = (now - start) / len(times)
+            remaining = (deadline - now) / per_run_s if per_run_s > 0 else batch
+            batch = int(max(1, min(len(times), remaining, max_iterations - len(times))))
+        return {'times': times, 'device_times': device_times, 'usages': usages, 'warmup': warmup,
+                'steady': steady, 'outliers': outliers, 'rel_ci': rel_ci,
+                'converged': converged}
+    
+    def _run_batch(self, handle, iterations):
+        """
+        Execute the loaded scenario several times, returning (time, device
+        time, host usage) per run, times in ms; the device time is None
+        without dispatch timings.
+        """
+        runs = self.session.run(handle, iterations)
+        failed = [run for run in runs if not run['success']]
+        if failed:
+            raise RuntimeError(f"{self.name}: scenario failed: {failed[0].get('error')}")
+        return [(run[self.session.timing],
+                 sum(d['time_ms'] for d in run['dispatches']) if run.get('dispatches') else None,
+                 run.get('usage', {}))
+                for run in runs]
     
     def prepare_data(self, size):
         # Override in subclasses
         pass
     
+    def place_dataset(self, path, shape, dtype='float32', distribution='normal', seed=0):
+        """Make a cached dataset available at the path the scenario reads, without copying"""
+        src = bench_datasets.dataset_path(shape, dtype, distribution, self.seed + seed,
+                                          self.data_cache)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.stager.stage_file(src, path)
+    
     def calculate_metrics(self, size, time_ms):
-        # Override in subclasses
-        pass
+        """Throughput at a given time per run, as {unit: value}; override in subclasses"""
+        return {}
     
-    def _run_scenario(self):
-        env = os.environ.copy()
-        env['DYLD_LIBRARY_PATH'] = '/usr/local/lib'
-        
-        cmd = [SCENARIO_RUNNER, '--scenario', self.scenario_file, '--output', '.']
-        subprocess.run(cmd, env=env, capture_output=True)
+    def _run_scenario(self, handle):
+        """Execute the loaded scenario once, returning its time in ms"""
+        return self.session.run(handle)[0][self.session.timing]
 
 class MatrixMultBenchmark(Benchmark):
     def prepare_data(self, size):
-        # Create square matrices
-        A = np.random.randn(size, size).astype(np.float32)
-        B = np.random.randn(size, size).astype(np.float32)
-        np.save(f'../data/matrix_a_{size}.npy', A)
-        np.save(f'../data/matrix_b_{size}.npy', B)
+        # Square matrices
+        self.place_dataset(f'../data/matrix_a_{size}.npy', (size, size), seed=0)
+        self.place_dataset(f'../data/matrix_b_{size}.npy', (size, size), seed=1)
     
     def calculate_metrics(self, size, time_ms):
         # FLOPS = 2 * M * N * K for matrix multiplication
         flops = 2 * size * size * size
         gflops = (flops / 1e9) / (time_ms / 1000)
-        print(f"  Performance: {gflops:.2f} GFLOPS")
+        return {'GFLOPS': gflops}
 
 class MemoryBandwidthBenchmark(Benchmark):
     def prepare_data(self, size):
-        data = np.random.randn(size).astype(np.float32)
-        np.save(f'../data/bandwidth_{size}.npy', data)
+        self.place_dataset(f'../data/bandwidth_{size}.npy', (size,))
     
     def calculate_metrics(self, size, time_ms):
         # Bandwidth = 2 * size * sizeof(float) / time
         bytes_transferred = 2 * size * 4  # Read + Write, 4 bytes per float
         bandwidth_gb = (bytes_transferred / 1e9) / (time_ms / 1000)
-        print(f"  Bandwidth: {bandwidth_gb:.2f} GB/s")
+        return {'GB/s': bandwidth_gb}
 
 def main():
+    parser = argparse.ArgumentParser(description="Run the scenario benchmarks")
+    parser.add_argument('--target-ci', type=float, default=0.02,
+                        help='Stop sampling a size once the confidence interval of the '
+                             'median is narrower than this fraction of the median')
+    parser.add_argument('--time-budget', type=float, default=10.0,
+                        help='Maximum sampling time per size in seconds')
+    parser.add_argument('--min-iterations', type=int, default=10,
+                        help='Minimum number of steady-state samples per size')
+    parser.add_argument('--max-iterations', type=int, default=500,
+                        help='Maximum number of timed runs per size')
+    parser.add_argument('--confidence', type=float, default=0.95, choices=[0.90, 0.95, 0.99],
+                        help='Confidence level of the reported intervals')
+    parser.add_argument('--history', default=bench_history.DEFAULT_HISTORY,
+                        help='JSON-lines file every run is appended to')
+    parser.add_argument('--no-history', action='store_true',
+                        help='Do not append this run to the history')
+    parser.add_argument('--no-baseline', action='store_true',
+                        help='Do not measure the null-dispatch baseline of each size')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the generated input data')
+    parser.add_argument('--data-cache', default=bench_datasets.DEFAULT_CACHE_DIR,
+                        help='Directory of the cached input datasets')
+    parser.add_argument('--cpus', type=bench_environment.parse_cpu_list,
+                        help="Pin the scenario runner to these CPUs, e.g. '2,3' or '4-7'; "
+                             "best on cores isolated with isolcpus")
+    args = parser.parse_args()
+    
+    metadata = bench_history.run_metadata(SCENARIO_RUNNER)
     print("ARM ML SDK Performance Benchmarks")
     print(f"Date: {datetime.now()}")
-    print(f"Platform: macOS ARM64")
+    print(f"Platform: {metadata['platform']}")
+    print(f"Commit: {metadata['git']['commit']}{' (modified)' if metadata['git']['dirty'] else ''}")
+    
+    try:
+        bench_environment.pin_to_cpus(args.cpus)
+    except OSError as e:
+        print(f"Error: cannot pin to CPUs {sorted(args.cpus)}: {e}")
+        sys.exit(1)
+    if args.cpus:
+        print(f"Runner pinned to CPUs: {sorted(args.cpus)}")
+    for warning in bench_environment.check_state(bench_environment.system_state(args.cpus),
+                                                 pinned=args.cpus):
+        print(f"Warning: {warning}")
     
     # Check if scenario runner exists
     if not os.path.exists(SCENARIO_RUNNER):
@@ -109,35 +358,42 @@ def main():
         MatrixMultBenchmark(
             "Matrix Multiplication (Naive)",
             "../scenarios/matrix_mult_naive.json",
-            [128, 256, 512, 1024]
+            [128, 256, 512, 1024],
+            seed=args.seed, data_cache=args.data_cache, cpus=args.cpus
         ),
         MatrixMultBenchmark(
             "Matrix Multiplication (Tiled)",
             "../scenarios/matrix_mult_tiled.json",
-            [128, 256, 512, 1024]
+            [128, 256, 512, 1024],
+            seed=args.seed, data_cache=args.data_cache, cpus=args.cpus
         ),
         MemoryBandwidthBenchmark(
             "Memory Bandwidth",
             "../scenarios/memory_bandwidth.json",
-            [1024*1024, 4*1024*1024, 16*1024*1024]  # 1MB, 4MB, 16MB
+            [1024*1024, 4*1024*1024, 16*1024*1024],  # 1MB, 4MB, 16MB
+            seed=args.seed, data_cache=args.data_cache, cpus=args.cpus
         )
     ]
     
     results = {}
     for bench in benchmarks:
-        bench.run()
+        bench.run(target_rel_ci=args.target_ci, time_budget_s=args.time_budget,
+                  min_iterations=args.min_iterations, max_iterations=args.max_iterations,
+                  confidence=args.confidence, baseline=not args.no_baseline)
         results[bench.name] = bench.results
     
     # Save results
+    record = dict(metadata, seed=args.seed, cpu_affinity=sorted(args.cpus) if args.cpus else None,
+                  results=results)
     with open('../results/benchmark_results.json', 'w') as f:
-        json.dump({
-            'date': str(datetime.now()),
-            'platform': 'macOS ARM64',
-            'results': results
-        }, f, indent=2)
+        json.dump(record, f, indent=2)
+    if not args.no_history:
+        bench_history.append_run(record, args.history)
     
     print("\n" + "="*60)
     print("Benchmarks complete. Results saved to benchmark_results.json")
+    if not args.no_history:
+        print(f"Run appended to {args.history}")
 
 if __name__ == "__main__":
     main()
@@ -2,18 +2,355 @@
 # SPDX-FileCopyrightText: Copyright 2024-2025 Arm Limited and/or its affiliates <open-source-office@arm.com>
 # SPDX-License-Identifier: Apache-2.0
 #
+import argparse
+import concurrent.futures
+import json
+import math
+import os
+import pathlib
 import sys
 
+try:
+    import argcomplete
+except:
+    argcomplete = None
 import numpy as np
 from PIL import Image
 
-_, filename1, filename2 = sys.argv
-image1 = np.asarray(Image.open(filename1))
-image2 = np.asarray(Image.open(filename2))
-print(image1.shape, image2.shape)
+IMAGE_SUFFIXES = {
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".bmp",
+    ".tga",
+    ".tif",
+    ".tiff",
+    ".ppm",
+    ".pgm",
+}
+DEFAULT_MAX_RMSE = 10.0
 
-err = np.sqrt((image1 - image2) ** 2).mean()
-print("RMSE:", err)
-if err > 10:
-    print("Error too big")
-    sys.exit(1)
+
+def load_image(path):
+    """
+    Decode an image into an (H, W, C) array in its native dtype, together
+    with the range of its values (255 for 8-bit, 65535 for 16-bit images
+    and 1.0 for floating-point images).
+    """
+    with Image.open(path) as image:
+        if image.mode in ("1", "P", "PA", "CMYK", "YCbCr", "LAB", "HSV"):
+            image = image.convert("RGBA" if "A" in image.mode else "RGB")
+        array = np.asarray(image)
+        # 32-bit integer ("I") images hold 16-bit data in practice
+        data_range = {"I": 65535.0, "F": 1.0}.get(image.mode)
+    if data_range is None:
+        data_range = float(np.iinfo(array.dtype).max)
+    if array.ndim == 2:
+        array = array[:, :, None]
+    return array, data_range
+
+
+def filter_kernel(kind, size, sigma):
+    """Normalized 1-D box or Gaussian kernel"""
+    if kind == "box":
+        kernel = np.ones(size)
+    else:
+        x = np.arange(size) - (size - 1) / 2
+        kernel = np.exp(-0.5 * (x / sigma) ** 2)
+    return kernel / kernel.sum()
+
+
+def separable_filter(x, kernel):
+    """
+    'Valid' 2-D filtering of an (H, W, C) array with the outer product of a
+    1-D kernel, as one pass along the rows and one along the columns.
+    """
+    size = len(kernel)
+    h, w = x.shape[0] - size + 1, x.shape[1] - size + 1
+    rows = kernel[0] * x[:h]
+    for i in range(1, size):
+        rows += kernel[i] * x[i : i + h]
+    out = kernel[0] * rows[:, :w]
+    for i in range(1, size):
+        out += kernel[i] * rows[:, i : i + w]
+    return out
+
+
+class SimilarityAccumulator:
+    """
+    Running sums of squared error and SSIM over the tiles of an image pair.
+
+    Parameters
+    ----------
+    data_range : 'float'
+        Range of the pixel values, L in the SSIM constants (0.01 L)^2 and
+        (0.03 L)^2 and the PSNR peak.
+    kernel : 'numpy.ndarray'
+        1-D SSIM window, from filter_kernel().
+    """
+
+    def __init__(self, data_range, kernel) -> None:
+        self.data_range = data_range
+        self.kernel = kernel
+        self.c1 = (0.01 * data_range) ** 2
+        self.c2 = (0.03 * data_range) ** 2
+        self.squared_error = 0.0
+        self.max_abs_error = 0.0
+        self.pixels = 0
+        self.ssim_sum = 0.0
+        self.ssim_windows = 0
+
+    def add_error(self, x, y):
+        diff = x - y
+        self.squared_error += float(np.vdot(diff, diff))
+        self.max_abs_error = max(self.max_abs_error, float(np.abs(diff).max(initial=0)))
+        self.pixels += diff.size
+
+    def add_ssim(self, x, y):
+        """SSIM of every window lying entirely inside x and y"""
+        if min(x.shape[:2]) < len(self.kernel):
+            return
+        f = lambda a: separable_filter(a, self.kernel)
+        mu_x, mu_y = f(x), f(y)
+        mu_xx, mu_yy, mu_xy = mu_x * mu_x, mu_y * mu_y, mu_x * mu_y
+        var_x = f(x * x) - mu_xx
+        var_y = f(y * y) - mu_yy
+        cov = f(x * y) - mu_xy
+        ssim = ((2 * mu_xy + self.c1) * (2 * cov + self.c2)) / (
+            (mu_xx + mu_yy + self.c1) * (var_x + var_y + self.c2)
+        )
+        self.ssim_sum += float(ssim.sum())
+        self.ssim_windows += ssim.size
+
+    def metrics(self):
+        mse = self.squared_error / self.pixels if self.pixels else 0.0
+        return {
+            "rmse": math.sqrt(mse),
+            "psnr": 10 * math.log10(self.data_range**2 / mse) if mse else math.inf,
+            "ssim": self.ssim_sum / self.ssim_windows if self.ssim_windows else None,
+            "max_abs_error": self.max_abs_error,
+        }
+
+
+def json_safe(value):
+    """Copy of a report value with non-finite floats as strings, e.g. "inf" PSNR"""
+    if isinstance(value, dict):
+        return {key: json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(item) for item in value]
+    if isinstance(value, float) and not math.isfinite(value):
+        return str(value)
+    return value
+
+
+def compare_images(image1, image2, data_range, kernel, tile_rows=None):
+    """
+    RMSE, PSNR, SSIM and maximum absolute error of two (H, W, C) images.
+
+    Pixels are converted to float once per tile. With tile_rows the images
+    are processed in bands of that many rows, overlapping by the window size
+    so that every SSIM window is evaluated exactly once; memory use then
+    depends on the band size instead of the image size.
+    """
+    accumulator = SimilarityAccumulator(data_range, kernel)
+    height = image1.shape[0]
+    overlap = len(kernel) - 1
+    step = max(tile_rows or height, overlap + 1)
+    for top in range(0, height, step):
+        x = image1[top : top + step + overlap].astype(np.float64)
+        y = image2[top : top + step + overlap].astype(np.float64)
+        last = top + step + overlap >= height
+        # Overlap rows only complete the band's SSIM windows, except in the last band
+        accumulator.add_error(x if last else x[:step], y if last else y[:step])
+        accumulator.add_ssim(x, y)
+        if last:
+            break
+    return accumulator.metrics()
+
+
+def check_pair(task):
+    """Compare two image files and apply the thresholds"""
+    filename1, filename2, options = task
+    result = {"files": [str(filename1), str(filename2)]}
+    try:
+        image1, range1 = load_image(filename1)
+        image2, range2 = load_image(filename2)
+    except (OSError, ValueError) as e:
+        result.update(ok=False, reason=str(e))
+        return result
+    result["shapes"] = [list(image1.shape), list(image2.shape)]
+    if image1.shape != image2.shape:
+        result.update(ok=False, reason=f"shape {image1.shape} != {image2.shape}")
+        return result
+
+    kernel = filter_kernel(options["window"], options["window_size"], options["sigma"])
+    result.update(
+        compare_images(
+            image1, image2, max(range1, range2), kernel, options["tile_rows"]
+        )
+    )
+    failures = []
+    if options["max_rmse"] is not None and result["rmse"] > options["max_rmse"]:
+        failures.append(f"RMSE {result['rmse']:.4g} > {options['max_rmse']}")
+    if options["min_psnr"] is not None and result["psnr"] < options["min_psnr"]:
+        failures.append(f"PSNR {result['psnr']:.4g} < {options['min_psnr']}")
+    if options["min_ssim"] is not None and (
+        result["ssim"] is None or result["ssim"] < options["min_ssim"]
+    ):
+        failures.append(f"SSIM {result['ssim']} < {options['min_ssim']}")
+    result["ok"] = not failures
+    if failures:
+        result["reason"] = ", ".join(failures)
+    return result
+
+
+def directory_pairs(directory1, directory2):
+    """
+    Image files of two directory trees matched by relative path.
+
+    Returns
+    -------
+    'tuple'
+        The matched (file1, file2) pairs and the relative paths present on
+        only one side.
+    """
+
+    def images(root):
+        root = pathlib.Path(root)
+        return {
+            p.relative_to(root): p
+            for p in root.rglob("*")
+            if p.suffix.lower() in IMAGE_SUFFIXES and p.is_file()
+        }
+
+    images1, images2 = images(directory1), images(directory2)
+    pairs = [
+        (images1[rel], images2[rel]) for rel in sorted(images1.keys() & images2.keys())
+    ]
+    unmatched = sorted(images1.keys() ^ images2.keys())
+    return pairs, unmatched
+
+
+def describe(result):
+    line = f"{'OK' if result['ok'] else 'FAIL'} {result['files'][0]} vs {result['files'][1]}"
+    if "rmse" in result:
+        ssim = "-" if result["ssim"] is None else f"{result['ssim']:.5f}"
+        line += (
+            f": RMSE {result['rmse']:.4f}, PSNR {result['psnr']:.2f} dB, SSIM {ssim}, "
+            f"max abs error {result['max_abs_error']:g}"
+        )
+    if "reason" in result:
+        line += f" ({result['reason']})"
+    return line
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Check that two images, or two directories of images, are close"
+    )
+    parser.add_argument("path1", help="Image file or directory")
+    parser.add_argument("path2", help="Image file or directory")
+    parser.add_argument(
+        "--max-rmse",
+        type=float,
+        default=DEFAULT_MAX_RMSE,
+        help="Fail when the RMSE (in pixel units) is above this value",
+    )
+    parser.add_argument(
+        "--min-psnr", type=float, help="Fail when the PSNR in dB is below this value"
+    )
+    parser.add_argument(
+        "--min-ssim", type=float, help="Fail when the mean SSIM is below this value"
+    )
+    parser.add_argument(
+        "--window",
+        choices=("gaussian", "box"),
+        default="gaussian",
+        help="SSIM window",
+    )
+    parser.add_argument("--window-size", type=int, default=11, help="SSIM window size")
+    parser.add_argument(
+        "--sigma", type=float, default=1.5, help="Gaussian window sigma"
+    )
+    parser.add_argument(
+        "--tile-rows",
+        type=int,
+        help="Process images in bands of this many rows to bound memory use",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of image pairs compared in parallel in directory mode",
+    )
+    parser.add_argument(
+        "--report",
+        help='Write the per-image metrics as JSON; an infinite PSNR is written as "inf"',
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="Only print failures and the summary"
+    )
+    if argcomplete:
+        argcomplete.autocomplete(parser)
+    args = parser.parse_args()
+    if args.window_size < 1 or (args.tile_rows is not None and args.tile_rows < 1):
+        parser.error("--window-size and --tile-rows must be positive")
+    return args
+
+
+def main():
+    args = parse_arguments()
+    options = {
+        "max_rmse": args.max_rmse,
+        "min_psnr": args.min_psnr,
+        "min_ssim": args.min_ssim,
+        "window": args.window,
+        "window_size": args.window_size,
+        "sigma": args.sigma,
+        "tile_rows": args.tile_rows,
+    }
+
+    if not (os.path.isdir(args.path1) and os.path.isdir(args.path2)):
+        result = check_pair((args.path1, args.path2, options))
+        if "shapes" in result:
+            print(*(tuple(shape) for shape in result["shapes"]))
+        print(describe(result))
+        results = [result]
+    else:
+        pairs, unmatched = directory_pairs(args.path1, args.path2)
+        tasks = [(file1, file2, options) for file1, file2 in pairs]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(
+                pool.map(
+                    check_pair, tasks, chunksize=max(1, len(tasks) // (8 * args.jobs))
+                )
+            )
+        for rel in unmatched:
+            in1 = os.path.exists(os.path.join(args.path1, rel))
+            results.append(
+                {
+                    "files": [
+                        os.path.join(args.path1, rel) if in1 else None,
+                        None if in1 else os.path.join(args.path2, rel),
+                    ],
+                    "ok": False,
+                    "reason": f"only in {args.path1 if in1 else args.path2}",
+                }
+            )
+        for result in results:
+            if not args.quiet or not result["ok"]:
+                print(describe(result))
+        failed = sum(not result["ok"] for result in results)
+        print(f"{len(results) - failed}/{len(results)} image pairs within thresholds")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(json_safe(results), f, indent=2, allow_nan=False)
+    if not all(result["ok"] for result in results):
+        print("Error too big")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,10 @@
 # SPDX-License-Identifier: Apache-2.0
 #
 import argparse
+import concurrent.futures
+import json
+import os
+import sys
 
 try:
     import argcomplete
@@ -11,25 +15,366 @@ except:
     argcomplete = None
 import numpy
 
+sys.path.append(os.path.dirname(__file__))
+from npy_digest import array_digest, DEFAULT_DIGEST_CACHE_DIR, DigestIndex
+
+DEFAULT_BLOCK_SIZE = 1 << 22
+
+
+def _blocks(reference, candidate, block_size):
+    """
+    Yield (flat offset, reference block, candidate block) pairs of 1-D arrays.
+
+    Arrays stored in the same memory order are walked through flat views of
+    the memory maps, so only one block of each is resident at a time. Other
+    layouts are walked in C order along the first axis.
+    """
+    order = None
+    if reference.flags.c_contiguous and candidate.flags.c_contiguous:
+        order = "C"
+    elif reference.flags.f_contiguous and candidate.flags.f_contiguous:
+        order = "F"
+    if order is not None or reference.ndim <= 1:
+        ref = reference.ravel(order=order or "K")
+        cand = candidate.ravel(order=order or "K")
+        for start in range(0, ref.size, block_size):
+            yield start, ref[start : start + block_size], cand[
+                start : start + block_size
+            ]
+        return
+
+    row = reference[0].size
+    rows = max(1, block_size // max(row, 1))
+    for start in range(0, reference.shape[0], rows):
+        yield (
+            start * row,
+            numpy.ascontiguousarray(reference[start : start + rows]).reshape(-1),
+            numpy.ascontiguousarray(candidate[start : start + rows]).reshape(-1),
+        )
+
+
+def _ulp_distance(a, b):
+    """Number of representable floats between a and b, as uint64"""
+    bits = {2: numpy.uint16, 4: numpy.uint32, 8: numpy.uint64}[a.dtype.itemsize]
+    sign = numpy.uint64(1) << numpy.uint64(8 * a.dtype.itemsize - 1)
+    ia = a.view(bits).astype(numpy.uint64)
+    ib = b.view(bits).astype(numpy.uint64)
+    ma, mb = ia & ~sign, ib & ~sign
+    same_sign = (ia & sign) == (ib & sign)
+    return numpy.where(
+        same_sign, numpy.maximum(ma, mb) - numpy.minimum(ma, mb), ma + mb
+    )
+
+
+def compare_arrays(
+    reference,
+    candidate,
+    atol=0.0,
+    rtol=0.0,
+    ulp=None,
+    equal_nan=False,
+    block_size=DEFAULT_BLOCK_SIZE,
+    fail_fast=False,
+):
+    """
+    Compare two arrays block by block in a single pass.
+
+    Without tolerances the arrays must be equal. With atol/rtol an element
+    matches when |candidate - reference| <= atol + rtol * |reference|; with
+    ulp (floating-point arrays of one dtype) when the two values are at most
+    that many units in the last place apart.
+
+    Returns
+    -------
+    'dict'
+        match, elements, compared, mismatches, max_abs_error, max_ulp (ulp
+        mode) and first_mismatch (index of the first mismatching element in
+        storage order), plus a reason when the arrays cannot be compared
+        element-wise.
+    """
+    result = {
+        "match": False,
+        "shape": list(reference.shape),
+        "dtypes": [str(reference.dtype), str(candidate.dtype)],
+        "elements": int(reference.size),
+        "compared": 0,
+        "mismatches": 0,
+        "max_abs_error": 0.0,
+        "first_mismatch": None,
+    }
+    if reference.shape != candidate.shape:
+        result["reason"] = f"shape {list(reference.shape)} != {list(candidate.shape)}"
+        return result
+    if ulp is not None:
+        if reference.dtype != candidate.dtype or reference.dtype.kind != "f":
+            result["reason"] = "ULP comparison needs floating-point arrays of one dtype"
+            return result
+        result["max_ulp"] = 0
+    exact = ulp is None and atol == 0 and rtol == 0
+    numeric = reference.dtype.kind in "biufc" and candidate.dtype.kind in "biufc"
+
+    first = None
+    order = "C"
+    floating = numeric and "f" in reference.dtype.kind + candidate.dtype.kind
+    for start, ref, cand in _blocks(reference, candidate, block_size):
+        ok = ref == cand
+        if numeric:
+            ref64 = ref.astype(numpy.float64) if ref.dtype.kind != "c" else ref
+            cand64 = cand.astype(numpy.float64) if cand.dtype.kind != "c" else cand
+            with numpy.errstate(invalid="ignore", over="ignore"):
+                error = numpy.abs(cand64 - ref64)
+        if exact or not numeric:
+            pass
+        elif ulp is not None:
+            distance = _ulp_distance(ref, cand)
+            nan = numpy.isnan(ref) | numpy.isnan(cand)
+            ok = (distance <= ulp) & ~nan
+            finite = numpy.isfinite(ref) & numpy.isfinite(cand)
+            if finite.any():
+                result["max_ulp"] = max(result["max_ulp"], int(distance[finite].max()))
+        else:
+            # Equal values (including infinities) always match
+            with numpy.errstate(invalid="ignore"):
+                ok |= error <= atol + rtol * numpy.abs(ref64)
+        if equal_nan and floating:
+            ok |= numpy.isnan(ref) & numpy.isnan(cand)
+
+        if numeric:
+            valid = error[~numpy.isnan(error)]
+            if valid.size:
+                result["max_abs_error"] = max(
+                    result["max_abs_error"], float(valid.max())
+                )
+        result["compared"] += ref.size
+        bad = ref.size - int(numpy.count_nonzero(ok))
+        if bad:
+            result["mismatches"] += bad
+            if first is None:
+                first = start + int(numpy.argmin(ok))
+            if fail_fast:
+                break
+
+    if first is not None:
+        if not (reference.flags.c_contiguous and candidate.flags.c_contiguous) and (
+            reference.flags.f_contiguous and candidate.flags.f_contiguous
+        ):
+            order = "F"
+        result["first_mismatch"] = [
+            int(i) for i in numpy.unravel_index(first, reference.shape, order=order)
+        ]
+    result["match"] = result["mismatches"] == 0
+    return result
+
+
+def compare_files(reference, candidate, **options):
+    """Compare two .npy files through read-only memory maps"""
+    result = compare_arrays(
+        numpy.load(reference, mmap_mode="r"),
+        numpy.load(candidate, mmap_mode="r"),
+        **options,
+    )
+    result["files"] = [reference, candidate]
+    return result
+
+
+def _compare_pair(task):
+    reference, candidate, options = task
+    try:
+        return compare_files(reference, candidate, **options)
+    except Exception as e:
+        return {"files": [reference, candidate], "match": False, "reason": str(e)}
+
+
+def _digest_file(path):
+    try:
+        return path, array_digest(path)
+    except (OSError, ValueError):
+        return path, None
+
+
+def digest_files(files, jobs=1, cache_dir=DEFAULT_DIGEST_CACHE_DIR):
+    """
+    Array digests of files, from the indexes in cache_dir where still valid.
+
+    Returns
+    -------
+    'dict'
+        Path -> digest, or None for files that cannot be digested.
+    """
+    index = DigestIndex(cache_dir)
+    digests = {}
+    missing = []
+    for path in dict.fromkeys(files):
+        try:
+            digests[path] = index.cached_digest(path)
+        except OSError:
+            digests[path] = None
+            continue
+        if digests[path] is None:
+            missing.append(path)
+
+    if jobs > 1 and len(missing) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+            computed = list(pool.map(_digest_file, missing))
+    else:
+        computed = [_digest_file(path) for path in missing]
+    for path, digest in computed:
+        digests[path] = digest
+        if digest is not None:
+            index.update(path, digest)
+    index.save()
+    return digests
+
+
+def _identical(reference, candidate, equal_nan):
+    """Whether two digests prove a match without looking at the data"""
+    if reference is None or candidate is None:
+        return False
+    if reference["sha256"] != candidate["sha256"]:
+        return False
+    # NaN never compares equal, so identical files with NaNs only match with equal_nan
+    return equal_nan or not reference["nan"]
+
+
+def describe(result):
+    reference, candidate = result["files"]
+    status = "MATCH" if result["match"] else "MISMATCH"
+    line = f"{status} {reference} vs {candidate}"
+    if "reason" in result:
+        return f"{line}: {result['reason']}"
+    if result.get("identical"):
+        return f"{line}: identical content"
+    line += (
+        f": {result['mismatches']}/{result['compared']} mismatching"
+        f", max abs error {result['max_abs_error']:.6g}"
+    )
+    if "max_ulp" in result:
+        line += f", max ULP {result['max_ulp']}"
+    if result["first_mismatch"] is not None:
+        line += f", first at {tuple(result['first_mismatch'])}"
+    if result["compared"] < result["elements"]:
+        line += f" (stopped after {result['compared']} of {result['elements']})"
+    return line
+
 
 def parse_arguments():
     parser = argparse.ArgumentParser()
     parser.add_argument("files", metavar="file", nargs="+", help="NumPy data file")
+    parser.add_argument(
+        "--pairs",
+        action="store_true",
+        help="Compare files as consecutive (reference, candidate) pairs instead of "
+        "comparing every file against the first",
+    )
+    parser.add_argument("--atol", type=float, default=0.0, help="Absolute tolerance")
+    parser.add_argument("--rtol", type=float, default=0.0, help="Relative tolerance")
+    parser.add_argument(
+        "--ulp", type=int, help="Maximum distance in units in the last place"
+    )
+    parser.add_argument(
+        "--equal-nan", action="store_true", help="Treat NaNs in the same place as equal"
+    )
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        default=DEFAULT_BLOCK_SIZE,
+        help="Number of elements compared per block",
+    )
+    parser.add_argument(
+        "--fail-fast", action="store_true", help="Stop at the first mismatching block"
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=1, help="Number of file pairs compared in parallel"
+    )
+    parser.add_argument(
+        "--no-digest",
+        action="store_true",
+        help="Compare every pair numerically instead of matching identical files by "
+        "their cached content digest",
+    )
+    parser.add_argument(
+        "--digest-cache",
+        default=DEFAULT_DIGEST_CACHE_DIR,
+        help="Directory caching the content digests; the compared directories "
+        "are never written to (default: %(default)s)",
+    )
+    parser.add_argument("--report", help="Write the comparison statistics as JSON")
+    parser.add_argument("--quiet", action="store_true", help="Only set the exit code")
     if argcomplete:
         argcomplete.autocomplete(parser)
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.pairs and len(args.files) % 2:
+        parser.error("--pairs needs an even number of files")
+    return args
 
 
 def main():
     args = parse_arguments()
-    if len(args.files) <= 1:
+    if args.pairs:
+        pairs = list(zip(args.files[::2], args.files[1::2]))
+    else:
+        pairs = [(args.files[0], f) for f in args.files[1:]]
+    if not pairs:
         return 0
-    first = numpy.load(args.files[0])
-    for f in args.files[1:]:
-        other = numpy.load(f)
-        if not numpy.array_equal(first, other):
-            return 1
-    return 0
+
+    options = {
+        "atol": args.atol,
+        "rtol": args.rtol,
+        "ulp": args.ulp,
+        "equal_nan": args.equal_nan,
+        "block_size": args.block_size,
+        "fail_fast": args.fail_fast,
+    }
+    # Identical files are matched by digest; of the remaining pairs only one
+    # per distinct (reference, candidate) content is compared numerically
+    digests = {}
+    if not args.no_digest:
+        digests = digest_files(
+            [f for pair in pairs for f in pair], args.jobs, args.digest_cache
+        )
+    keys = []
+    tasks = {}
+    for reference, candidate in pairs:
+        ref_digest, cand_digest = digests.get(reference), digests.get(candidate)
+        if _identical(ref_digest, cand_digest, args.equal_nan):
+            keys.append(None)
+            continue
+        key = (reference, candidate)
+        if ref_digest is not None and cand_digest is not None:
+            key = (ref_digest["sha256"], cand_digest["sha256"])
+        keys.append(key)
+        tasks.setdefault(key, (reference, candidate, options))
+
+    computed = {}
+    if args.jobs > 1 and len(tasks) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            computed = dict(zip(tasks, pool.map(_compare_pair, tasks.values())))
+    else:
+        for key, task in tasks.items():
+            computed[key] = _compare_pair(task)
+            if args.fail_fast and not computed[key]["match"]:
+                break
+
+    results = []
+    for (reference, candidate), key in zip(pairs, keys):
+        if key is None:
+            result = {"match": True, "identical": True}
+        elif key in computed:
+            result = dict(computed[key])
+        else:
+            break
+        result["files"] = [reference, candidate]
+        results.append(result)
+        if args.fail_fast and not result["match"]:
+            break
+
+    if not args.quiet:
+        for result in results:
+            print(describe(result))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0 if all(result["match"] for result in results) else 1
 
 
 if __name__ == "__main__":
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: Copyright 2025 Arm Limited and/or its affiliates <open-source-office@arm.com>
+# SPDX-License-Identifier: Apache-2.0
+#
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+import time
+
+CACHE_FORMAT = 1
+HASH_CHUNK_SIZE = 1 << 20
+DEFAULT_CACHE_DIR = (
+    pathlib.Path(os.environ.get("XDG_CACHE_HOME", pathlib.Path.home() / ".cache"))
+    / "ml-sdk-for-vulkan"
+    / "conversion"
+)
+DEFAULT_CACHE_SIZE_MB = 2048
+
+
+def hash_file(path):
+    """SHA-256 of a file's contents, read in fixed-size chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """
+    Content-addressed on-disk cache of model conversion artifacts.
+
+    Entries are keyed by the hash of the model file, the converter flags and
+    the identity of the tool binaries, and hold the files a conversion
+    produced (the .vgf and the scenario template). The cache is bounded in
+    size and evicts least recently used entries. The index is guarded by a
+    file lock, so concurrent runs can share one cache directory.
+
+    Parameters
+    ----------
+    cache_dir : 'pathlib.Path'
+        Directory holding the cache entries and index.
+    max_bytes : 'int'
+        Size bound of all entries together.
+    """
+
+    def __init__(
+        self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_SIZE_MB << 20
+    ):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.entries_dir = self.cache_dir / "entries"
+        self.index_path = self.cache_dir / "index.json"
+        self.max_bytes = max_bytes
+        self.entries_dir.mkdir(parents=True, exist_ok=True)
+
+    @contextlib.contextmanager
+    def _locked_index(self):
+        with open(self.cache_dir / "index.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                index = json.loads(self.index_path.read_text())
+            except (FileNotFoundError, json.JSONDecodeError):
+                index = {}
+            index.setdefault("entries", {})
+            index.setdefault("tools", {})
+            index.setdefault("stats", {"hits": 0, "misses": 0, "evictions": 0})
+            yield index
+            tmp = self.index_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(index, indent=2))
+            os.replace(tmp, self.index_path)
+
+    def tool_identity(self, path):
+        """Content hash of a tool binary, memoized by path, size and mtime"""
+        resolved = shutil.which(str(path)) or str(path)
+        resolved = os.path.realpath(resolved)
+        stat = os.stat(resolved)
+        stamp = f"{resolved}:{stat.st_size}:{stat.st_mtime_ns}"
+        with self._locked_index() as index:
+            digest = index["tools"].get(stamp)
+        if digest is None:
+            digest = hash_file(resolved)
+            with self._locked_index() as index:
+                index["tools"][stamp] = digest
+        return digest
+
+    def key(self, model, flags, tools):
+        """
+        Cache key of a conversion.
+
+        Parameters
+        ----------
+        model : 'pathlib.Path'
+            Input model file.
+        flags : 'list'
+            Converter options that influence the output.
+        tools : 'list'
+            Paths of the binaries taking part in the conversion.
+        """
+        digest = hashlib.sha256()
+        digest.update(f"format:{CACHE_FORMAT}\n".encode())
+        digest.update(f"model:{hash_file(model)}\n".encode())
+        digest.update(f"flags:{json.dumps([str(f) for f in flags])}\n".encode())
+        for tool in tools:
+            digest.update(f"tool:{self.tool_identity(tool)}\n".encode())
+        return digest.hexdigest()
+
+    def lookup(self, key):
+        """Return the entry directory for a key and record a hit, or None and record a miss"""
+        entry = self.entries_dir / key
+        with self._locked_index() as index:
+            if key in index["entries"] and entry.is_dir():
+                index["entries"][key]["last_used"] = time.time()
+                index["stats"]["hits"] += 1
+                return entry
+            index["entries"].pop(key, None)
+            index["stats"]["misses"] += 1
+            return None
+
+    def store(self, key, files):
+        """
+        Add an entry and evict least recently used ones beyond the size bound.
+
+        Parameters
+        ----------
+        key : 'str'
+            Cache key from key().
+        files : 'dict'
+            Name inside the entry -> path of the file to store.
+        """
+        staging = pathlib.Path(
+            tempfile.mkdtemp(prefix=f".{key[:12]}-", dir=self.entries_dir)
+        )
+        for name, path in files.items():
+            shutil.copy2(path, staging / name)
+        size = sum(f.stat().st_size for f in staging.iterdir())
+
+        entry = self.entries_dir / key
+        evicted = []
+        with self._locked_index() as index:
+            if entry.exists():
+                shutil.rmtree(staging)
+            else:
+                os.replace(staging, entry)
+            now = time.time()
+            index["entries"][key] = {"size": size, "created": now, "last_used": now}
+
+            total = sum(e["size"] for e in index["entries"].values())
+            for old_key, _ in sorted(
+                index["entries"].items(), key=lambda e: e[1]["last_used"]
+            ):
+                if total <= self.max_bytes:
+                    break
+                if old_key == key:
+                    continue
+                total -= index["entries"].pop(old_key)["size"]
+                index["stats"]["evictions"] += 1
+                evicted.append(old_key)
+            for old_key in evicted:
+                shutil.rmtree(self.entries_dir / old_key, ignore_errors=True)
+        return entry
+
+    def stats(self):
+        """Hit/miss/eviction counters and current size of the cache"""
+        with self._locked_index() as index:
+            stats = dict(index["stats"])
+            stats["entries"] = len(index["entries"])
+            stats["bytes"] = sum(e["size"] for e in index["entries"].values())
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -4,6 +4,8 @@
 # SPDX-License-Identifier: Apache-2.0
 #
 import argparse
+import ast
+import sys
 
 try:
     import argcomplete
@@ -11,20 +13,246 @@ except:
     argcomplete = None
 import numpy
 
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+
+def _index_value(node):
+    if node is None:
+        return None
+    if isinstance(node, ast.Constant) and node.value is Ellipsis:
+        return Ellipsis
+    if isinstance(node, ast.Constant) and node.value is None:
+        return None
+    if isinstance(node, ast.Constant) and isinstance(node.value, int):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        value = _index_value(node.operand)
+        if isinstance(value, int):
+            return -value
+    if isinstance(node, ast.Slice):
+        return slice(
+            _index_value(node.lower), _index_value(node.upper), _index_value(node.step)
+        )
+    raise ValueError(f"unsupported index '{ast.unparse(node)}'")
+
+
+def parse_slice(text):
+    """
+    Parse a basic-indexing expression such as "[0, :10, ::2, -1]" or "..., 0".
+
+    Only integers, slices and Ellipsis are accepted, so the selection of a
+    memory-mapped array stays a view.
+    """
+    text = text.strip()
+    if not text.startswith("["):
+        text = f"[{text}]"
+    try:
+        node = ast.parse(f"_{text}", mode="eval").body
+    except SyntaxError:
+        raise ValueError(f"invalid slice expression '{text}'")
+    if not isinstance(node, ast.Subscript):
+        raise ValueError(f"invalid slice expression '{text}'")
+    index = node.slice
+    if isinstance(index, ast.Tuple):
+        return tuple(_index_value(element) for element in index.elts)
+    return (_index_value(index),)
+
+
+def array_stats(array, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Summary statistics gathered over buffered chunks of at most chunk_size
+    elements, so arbitrarily large (memory-mapped or strided) arrays are
+    never loaded at once.
+
+    Returns
+    -------
+    'dict'
+        min, max and mean of the non-NaN values (None when there are none)
+        and the number of NaN and infinite values.
+    """
+    stats = {"min": None, "max": None, "mean": None, "nan": 0, "inf": 0}
+    if array.size == 0:
+        return stats
+    if array.dtype.kind not in "biufc":
+        raise ValueError(f"no statistics for dtype {array.dtype}")
+
+    complex_ = array.dtype.kind == "c"
+    floating = array.dtype.kind in "fc"
+    accumulator = numpy.complex128 if complex_ else numpy.float64
+    total = accumulator(0)
+    count = 0
+    lo = hi = None
+    iterator = numpy.nditer(
+        array,
+        flags=["external_loop", "buffered", "zerosize_ok"],
+        buffersize=chunk_size,
+        order="C",
+    )
+    for chunk in iterator:
+        if array.dtype.kind == "b":
+            chunk = chunk.view(numpy.uint8)
+        if floating:
+            nan = numpy.isnan(chunk)
+            stats["nan"] += int(numpy.count_nonzero(nan))
+            stats["inf"] += int(numpy.count_nonzero(numpy.isinf(chunk)))
+            if nan.any():
+                chunk = chunk[~nan]
+            if chunk.size == 0:
+                continue
+        count += chunk.size
+        with numpy.errstate(over="ignore", invalid="ignore"):
+            total += chunk.sum(dtype=accumulator)
+        if not complex_:
+            chunk_lo, chunk_hi = chunk.min(), chunk.max()
+            lo = chunk_lo if lo is None else min(lo, chunk_lo)
+            hi = chunk_hi if hi is None else max(hi, chunk_hi)
+
+    if count:
+        stats["mean"] = (total / count).item()
+    if lo is not None:
+        stats["min"], stats["max"] = lo.item(), hi.item()
+    return stats
+
+
+def describe(path, array, selection=None):
+    order = "F" if array.flags.f_contiguous and not array.flags.c_contiguous else "C"
+    lines = [
+        f"{path}: shape {array.shape} dtype {array.dtype} "
+        f"({array.nbytes / (1 << 20):.1f} MB, {order} order)"
+    ]
+    if selection is not None:
+        lines.append(
+            f"  selection {selection} -> shape {array[parse_slice(selection)].shape}"
+        )
+    return "\n".join(lines)
+
+
+def format_stats(stats):
+    return "  " + "  ".join(
+        f"{name} {'-' if value is None else f'{value:.6g}' if isinstance(value, float) else value}"
+        for name, value in stats.items()
+    )
+
+
+def print_elements(array, start, stop):
+    """Print elements start..stop of an array in C order, one per line with its index"""
+    values = array.flat[start:stop]
+    width = len(str(array.shape))
+    for offset, value in zip(range(start, stop), values):
+        index = tuple(int(i) for i in numpy.unravel_index(offset, array.shape))
+        print(f"  {str(index):<{width}} {value!s}")
+
+
+def select(array, expression):
+    """array[expression] of a --slice expression, ValueError if it does not apply"""
+    try:
+        return array[parse_slice(expression)]
+    except (IndexError, ValueError) as e:
+        raise ValueError(f"--slice {expression}: {e}") from None
+
+
+def inspect(path, args):
+    array = numpy.load(path, mmap_mode="r")
+    selected = select(array, args.slice) if args.slice else array
+    print(describe(path, array, args.slice))
+    array = numpy.asanyarray(selected)
+    if args.inspect:
+        print(format_stats(array_stats(array, args.chunk_size)))
+
+    paging = args.head is not None or args.tail is not None
+    if not paging and not args.inspect:
+        with numpy.printoptions(threshold=numpy.inf):
+            print(numpy.array(array))
+        return
+    if not paging:
+        return
+    if array.ndim == 0:
+        print(f"  () {array[()]!s}")
+        return
+
+    # --skip offsets the head from the start and the tail from the end
+    size, skip = array.size, args.skip
+    ranges = []
+    if args.head is not None:
+        ranges.append((min(skip, size), min(skip + args.head, size)))
+    if args.tail is not None:
+        start, stop = max(size - skip - args.tail, 0), max(size - skip, 0)
+        if ranges:
+            start = max(start, ranges[0][1])
+        ranges.append((start, max(start, stop)))
+    shown = 0
+    for start, stop in ranges:
+        if start > shown:
+            print(f"  ... {start - shown} elements")
+        print_elements(array, start, stop)
+        shown = max(shown, stop)
+    if shown < size:
+        print(f"  ... {size - shown} elements")
+
 
 def parse_arguments():
     parser = argparse.ArgumentParser()
     parser.add_argument("files", metavar="file", nargs="+", help="NumPy data file")
+    parser.add_argument(
+        "-i",
+        "--inspect",
+        action="store_true",
+        help="Print shape, dtype and min/max/mean/NaN/Inf statistics instead of the data",
+    )
+    parser.add_argument(
+        "--slice",
+        help="Basic-indexing expression selecting part of the array, e.g. '[0, :10, :10, 0]'",
+    )
+    parser.add_argument(
+        "--head", type=int, help="Print the first N selected elements with their index"
+    )
+    parser.add_argument(
+        "--tail", type=int, help="Print the last N selected elements with their index"
+    )
+    parser.add_argument(
+        "--skip",
+        type=int,
+        default=0,
+        help="Number of elements skipped before --head (after --tail), for paging",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Number of elements read at a time when computing statistics",
+    )
     if argcomplete:
         argcomplete.autocomplete(parser)
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.slice:
+        try:
+            parse_slice(args.slice)
+        except ValueError as e:
+            parser.error(str(e))
+    for name in ("head", "tail", "skip"):
+        value = getattr(args, name)
+        if value is not None and value < 0:
+            parser.error(f"--{name} must not be negative")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    return args
 
 
 def main():
     args = parse_arguments()
-    with numpy.printoptions(threshold=numpy.inf):
-        for f in args.files:
-            print(numpy.load(f))
+    if not (
+        args.inspect or args.slice or args.head is not None or args.tail is not None
+    ):
+        with numpy.printoptions(threshold=numpy.inf):
+            for f in args.files:
+                print(numpy.load(f))
+        return
+
+    for f in args.files:
+        try:
+            inspect(f, args)
+        except ValueError as e:
+            sys.exit(f"{f}: {e}")
 
 
 if __name__ == "__main__":
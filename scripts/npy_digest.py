@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: Copyright 2025 Arm Limited and/or its affiliates <open-source-office@arm.com>
+# SPDX-License-Identifier: Apache-2.0
+#
+import hashlib
+import json
+import os
+import pathlib
+
+import numpy
+from numpy.lib import format as npy_format
+
+DIGEST_FORMAT = 1
+DIGEST_CHUNK_SIZE = 1 << 20
+DEFAULT_DIGEST_CACHE_DIR = (
+    pathlib.Path(os.environ.get("XDG_CACHE_HOME", pathlib.Path.home() / ".cache"))
+    / "ml-sdk-for-vulkan"
+    / "npy-digests"
+)
+
+
+def _read_header(f):
+    version = npy_format.read_magic(f)
+    if version == (1, 0):
+        return npy_format.read_array_header_1_0(f)
+    return npy_format.read_array_header_2_0(f)
+
+
+def array_digest(path):
+    """
+    Digest of the array stored in a .npy file.
+
+    The hash covers the dtype, shape, memory order and data payload, read in
+    fixed-size chunks; the header text and its padding are not part of it, so
+    files written by different NumPy versions hash alike.
+
+    Returns
+    -------
+    'dict'
+        sha256 of the array and whether it holds any NaN.
+    """
+    with open(path, "rb") as f:
+        shape, fortran_order, dtype = _read_header(f)
+        if dtype.hasobject:
+            raise ValueError(f"{path}: object arrays cannot be digested")
+        digest = hashlib.sha256()
+        digest.update(
+            f"format:{DIGEST_FORMAT}\ndtype:{dtype.descr}\nshape:{list(shape)}\n"
+            f"order:{'F' if fortran_order else 'C'}\n".encode()
+        )
+        floating = dtype.kind in "fc"
+        chunk_size = max(DIGEST_CHUNK_SIZE // dtype.itemsize, 1) * dtype.itemsize
+        has_nan = False
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+            if floating and not has_nan:
+                has_nan = bool(numpy.isnan(numpy.frombuffer(chunk, dtype)).any())
+    return {"sha256": digest.hexdigest(), "nan": has_nan}
+
+
+class DigestIndex:
+    """
+    Array digests of .npy files, cached in a cache directory.
+
+    Each directory of digested files gets an index in the cache directory,
+    keyed by file name and stamped with the file's size and mtime, so a file
+    is only read again after it changes. The digested directories are never
+    written to. When the cache directory cannot be written to, files are
+    hashed every time.
+
+    Parameters
+    ----------
+    cache_dir : 'pathlib.Path'
+        Directory holding the indexes.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_DIGEST_CACHE_DIR) -> None:
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.indexes = {}
+        self.dirty = set()
+
+    def _index_path(self, directory):
+        name = hashlib.sha256(str(directory).encode()).hexdigest()[:32]
+        return self.cache_dir / f"{name}.json"
+
+    def _index(self, directory):
+        if directory not in self.indexes:
+            try:
+                self.indexes[directory] = json.loads(
+                    self._index_path(directory).read_text()
+                )
+            except (OSError, json.JSONDecodeError):
+                self.indexes[directory] = {}
+        return self.indexes[directory]
+
+    def _locate(self, path):
+        path = pathlib.Path(path).absolute()
+        stat = os.stat(path)
+        return self._index(path.parent), path.name, [stat.st_size, stat.st_mtime_ns]
+
+    def cached_digest(self, path):
+        """The cached digest of a file, or None when it has to be hashed"""
+        index, name, stamp = self._locate(path)
+        entry = index.get(name)
+        if entry is not None and entry["stamp"] == stamp:
+            return entry
+        return None
+
+    def update(self, path, digest):
+        """Record a digest computed by array_digest()"""
+        index, name, stamp = self._locate(path)
+        index[name] = dict(digest, stamp=stamp)
+        self.dirty.add(pathlib.Path(path).absolute().parent)
+
+    def save(self):
+        """Write back the indexes of directories with new digests"""
+        for directory in self.dirty:
+            path = self._index_path(directory)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                tmp.write_text(json.dumps(self.indexes[directory]))
+                os.replace(tmp, path)
+            except OSError:
+                tmp.unlink(missing_ok=True)
+        self.dirty.clear()
@@ -4,9 +4,17 @@
 # SPDX-License-Identifier: Apache-2.0
 #
 import argparse
+import concurrent.futures
+import copy
+import json
+import os
 import pathlib
-import shutil
 import subprocess
+import time
+
+from conversion_cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE_MB, ConversionCache
+from staging import STAGING_METHODS, Stager
+from tracing import NullTracer, Tracer
 
 try:
     import argcomplete
@@ -15,12 +23,17 @@ except:
 
 SDK_DIR = pathlib.Path(__file__).resolve().parent / ".."
 SDK_COMPONENTS_DIR = SDK_DIR / ".."
+MODEL_CONVERTER_FLAGS = ["--require-static-shape"]
 
 
 class ModelRunner:
     """
     A class that runs the input model end-to-end using ML SDK for Vulkan®.
 
+    With tracing enabled, every stage is timed as a span and each run writes
+    trace.json (Chrome trace_event) and trace_summary.json to the output
+    directory.
+
     Parameters
     ----------
     args : 'dict'
@@ -33,66 +46,186 @@ class ModelRunner:
         self.inputs = args.inputs
         self.outputs = args.outputs
         self.shaders = args.shaders
-        self.shape_override = args.shape_override
         self.scenario_runner_path = args.scenario_runner_path
         self.model_converter_path = args.model_converter_path
         self.vgf_dump_path = args.vgf_dump_path
+        self.log_path = getattr(args, "log", None)
+        self.tracer = Tracer() if getattr(args, "trace", False) else NullTracer()
+        if args.staging == "auto":
+            self.stager = Stager()
+        else:
+            self.stager = Stager(dict.fromkeys([args.staging, "copy"]))
+        self.cache = None
+        self.cache_hit = False
+        if not args.no_cache:
+            self.cache = ConversionCache(args.cache_dir, args.cache_size << 20)
+        model_name = pathlib.Path(self.model_filename).name
+        self.vgf_filename = self.out_dir.joinpath(model_name).with_suffix(".vgf")
+        self.scenario_filename = self.out_dir.joinpath(model_name).with_suffix(".json")
 
     def run(self):
         """Runs the steps to convert the TOSA model to VGF and execute the ML SDK Scenario Runner"""
         try:
-            self.out_dir.mkdir(parents=True, exist_ok=True)
-            for file in [self.model_filename] + self.inputs + self.shaders:
-                shutil.copy(file, self.out_dir)
-
-            self.run_model_converter()
-            self.generate_scenario_json()
-            self.run_scenario_runner()
+            with self.tracer.span("run", model=str(self.model_filename)):
+                self.prepare()
+                self.execute()
 
         except Exception as e:
             print(f"An error occurred during execution: {e}")
             return 1
 
+        finally:
+            self.write_trace()
+
         return 0
 
+    def prepare(self):
+        """Stage the input files and produce the VGF and scenario JSON (host-only work)"""
+        with self.tracer.span("prepare"):
+            files = [self.model_filename] + self.inputs + self.shaders
+            with self.tracer.span("stage_inputs", files=len(files)) as span:
+                self.stager.stage(files, self.out_dir)
+                if span:
+                    span.set(
+                        bytes_moved=self.stager.report["bytes_moved"],
+                        bytes_linked=self.stager.report["bytes_linked"],
+                    )
+            self._note(self.stager.summary())
+
+            self.cache_hit = self.restore_cached_conversion()
+            if not self.cache_hit:
+                self.run_model_converter()
+                self.generate_scenario_json()
+                with self.tracer.span("cache_store"):
+                    self.store_cached_conversion()
+
+    def execute(self):
+        """Run the prepared scenario on the device"""
+        self.run_scenario_runner()
+
+    def write_trace(self):
+        """Write the trace of this runner's spans, when tracing is enabled"""
+        if not self.tracer.enabled or not self.tracer.spans:
+            return
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.tracer.write(
+            self.out_dir / "trace.json", self.out_dir / "trace_summary.json"
+        )
+        totals = self.tracer.summary()["by_name"]
+        self._note(
+            "Stage times: "
+            + ", ".join(f"{name} {t['total_ms']:.1f} ms" for name, t in totals.items())
+        )
+
+    def _note(self, message):
+        if self.log_path is None:
+            print(message)
+        else:
+            with open(self.log_path, "a") as log:
+                log.write(message + "\n")
+
+    def _run_tool(self, cmd, **kwargs):
+        """Run a tool, sending its output to the log file when one is set"""
+        if self.log_path is None:
+            return subprocess.run(cmd, check=True, **kwargs)
+        with open(self.log_path, "a") as log:
+            return subprocess.run(
+                cmd, check=True, stdout=log, stderr=subprocess.STDOUT, **kwargs
+            )
+
+    def conversion_key(self):
+        """Cache key of the model, converter flags and tool binaries"""
+        return self.cache.key(
+            self.model_filename,
+            MODEL_CONVERTER_FLAGS,
+            [self.model_converter_path, self.vgf_dump_path],
+        )
+
+    def restore_cached_conversion(self):
+        """Reuse the VGF and scenario template of an identical earlier conversion"""
+        if self.cache is None:
+            return False
+        with self.tracer.span("cache_lookup") as span:
+            self.cache_key = self.conversion_key()
+            entry = self.cache.lookup(self.cache_key)
+            if span:
+                span.set(hit=entry is not None)
+        if entry is None:
+            self._note(f"Conversion cache miss ({self.cache_key[:12]})")
+            return False
+
+        self._note(f"Conversion cache hit ({self.cache_key[:12]})")
+        # Never symlink into the entry: LRU eviction would leave a dangling link
+        self.stager.stage_file(
+            entry / "model.vgf",
+            self.vgf_filename,
+            methods=[m for m in self.stager.methods if m != "symlink"],
+        )
+        self.generate_scenario_json(
+            template=(entry / "scenario_template.json").read_text()
+        )
+        return True
+
+    def store_cached_conversion(self):
+        """Save the conversion artifacts under the key computed before converting"""
+        if self.cache is None:
+            return
+        self.cache.store(
+            self.cache_key,
+            {
+                "model.vgf": self.vgf_filename,
+                "scenario_template.json": self.template_filename,
+            },
+        )
+
     def run_model_converter(self):
         """Run ML SDK Model Converter to convert Tosa MLIR to VGF"""
-        self.vgf_filename = self.out_dir.joinpath(self.model_filename).with_suffix(
-            ".vgf"
-        )
+        # A VGF staged from the cache may be a hardlink to the cache entry
+        self.vgf_filename.unlink(missing_ok=True)
         cmd = [
             self.model_converter_path,
             "--input",
             self.model_filename,
             "--output",
             self.vgf_filename,
-            "--require-static-shape",
-        ]
+        ] + MODEL_CONVERTER_FLAGS
         try:
-            subprocess.run(cmd, check=True)
+            with self.tracer.span("model_converter") as span:
+                self._run_tool(cmd)
+                if span:
+                    span.set(
+                        input_bytes=_file_size(self.model_filename),
+                        output_bytes=_file_size(self.vgf_filename),
+                    )
         except subprocess.CalledProcessError as e:
             raise RuntimeError(f"Command '{cmd}' failed with error: {e}")
 
     def run_scenario_runner(self):
         """Execute ML SDK Scenario Runner"""
         try:
-            subprocess.run(
-                [
-                    self.scenario_runner_path,
-                    "--scenario",
-                    self.scenario_filename.name,
-                ],
-                cwd=self.out_dir,
-                check=True,
-            )
+            with self.tracer.span(
+                "scenario_runner", scenario=self.scenario_filename.name
+            ) as span:
+                self._run_tool(
+                    [
+                        self.scenario_runner_path,
+                        "--scenario",
+                        self.scenario_filename.name,
+                    ],
+                    cwd=self.out_dir,
+                )
+                if span:
+                    span.set(
+                        output_bytes=sum(
+                            _file_size(self.out_dir / name) for name in self.outputs
+                        )
+                    )
         except subprocess.CalledProcessError as e:
             raise RuntimeError(f"Scenario Runner execution failed with error: {e}")
 
-    def generate_scenario_json(self):
+    def generate_scenario_json(self, template=None):
         """Create scenario JSON template using vgf_dump and replace template names with actual scenario files"""
-        self.scenario_filename = self.out_dir.joinpath(self.model_filename).with_suffix(
-            ".json"
-        )
+        self.template_filename = self.scenario_filename.with_suffix(".template.json")
 
         template_replacements = []
         for i, input_name in enumerate(self.inputs):
@@ -115,20 +248,205 @@ class ModelRunner:
             "--input",
             self.vgf_filename,
             "--output",
-            self.scenario_filename,
+            self.template_filename,
             "--scenario-template",
         ]
         try:
-            subprocess.run(cmd, check=True)
-            scenario = self.scenario_filename.read_text()
-            for (old, new) in template_replacements:
-                scenario = scenario.replace(old, new)
-            self.scenario_filename.write_text(scenario)
+            if template is None:
+                with self.tracer.span("vgf_dump") as span:
+                    self._run_tool(cmd)
+                    template = self.template_filename.read_text()
+                    if span:
+                        span.set(
+                            input_bytes=_file_size(self.vgf_filename),
+                            output_bytes=len(template),
+                        )
+            with self.tracer.span(
+                "template_substitution", replacements=len(template_replacements)
+            ) as span:
+                scenario = template
+                for (old, new) in template_replacements:
+                    scenario = scenario.replace(old, new)
+                self.scenario_filename.write_text(scenario)
+                if span:
+                    span.set(output_bytes=len(scenario))
 
         except subprocess.CalledProcessError as e:
             raise RuntimeError(f"Failed to generate JSON scenario with error: {e}")
 
 
+def _file_size(path):
+    """Size of a file in bytes, 0 when it does not exist"""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _prepare_model(runner):
+    """Process pool task: host-side preparation of one model"""
+    start = time.perf_counter()
+    try:
+        runner.prepare()
+        error = None
+    except Exception as e:
+        error = str(e)
+    return runner, time.perf_counter() - start, error
+
+
+def load_manifest(path):
+    """
+    Read a batch manifest.
+
+    The manifest is a JSON file of the form
+    {"models": [{"model": ..., "inputs": [...], "outputs": [...],
+    "shaders": [...], "name": ...}, ...]} (or just the list). Model, input
+    and shader paths are relative to the manifest; outputs are file names
+    inside the model's output directory; name defaults to the model stem.
+    """
+    path = pathlib.Path(path)
+    manifest = json.loads(path.read_text())
+    entries = manifest["models"] if isinstance(manifest, dict) else manifest
+
+    def resolve(file):
+        return str((path.parent / file).resolve())
+
+    models = []
+    names = set()
+    for entry in entries:
+        name = entry.get("name") or pathlib.Path(entry["model"]).stem
+        unique, n = name, 1
+        while unique in names:
+            unique, n = f"{name}_{n}", n + 1
+        names.add(unique)
+        models.append(
+            {
+                "name": unique,
+                "model": resolve(entry["model"]),
+                "inputs": [resolve(f) for f in entry.get("inputs", [])],
+                "outputs": list(entry.get("outputs", [])),
+                "shaders": [resolve(f) for f in entry.get("shaders", [])],
+            }
+        )
+    return models
+
+
+class BatchRunner:
+    """
+    Runs the models of a manifest end-to-end.
+
+    Conversion and scenario generation of different models run in a process
+    pool; scenario execution happens in this process, one model at a time,
+    as soon as each model is prepared. Every model gets its own output
+    directory with a log of its tool output, and status updates are printed
+    and appended to batch_status.jsonl as they happen.
+
+    Parameters
+    ----------
+    args : 'argparse.Namespace'
+        Command line arguments; per-model fields are taken from the manifest.
+    models : 'list'
+        Entries from load_manifest().
+    """
+
+    def __init__(self, args, models) -> None:
+        self.args = args
+        self.models = models
+        self.out_dir = pathlib.Path(args.out_dir)
+        self.jobs = args.jobs or os.cpu_count()
+        self.status_path = self.out_dir / "batch_status.jsonl"
+        self.results = {}
+        self.cache = None
+        if not args.no_cache:
+            self.cache = ConversionCache(args.cache_dir, args.cache_size << 20)
+
+    def _runner(self, entry):
+        args = copy.copy(self.args)
+        args.model = entry["model"]
+        args.inputs = entry["inputs"]
+        args.outputs = entry["outputs"]
+        args.shaders = entry["shaders"]
+        args.out_dir = self.out_dir / entry["name"]
+        args.log = args.out_dir / "log.txt"
+        args.out_dir.mkdir(parents=True, exist_ok=True)
+        args.log.unlink(missing_ok=True)
+        return ModelRunner(args)
+
+    def _report(self, name, stage, **fields):
+        result = self.results.setdefault(name, {"name": name})
+        result.update(fields, stage=stage)
+        event = dict(fields, name=name, stage=stage, time=time.time())
+        with open(self.status_path, "a") as f:
+            f.write(json.dumps(event) + "\n")
+
+        done = sum(r["stage"] in ("done", "failed") for r in self.results.values())
+        timing = " ".join(
+            f"{k}={fields[k]:.2f}s" for k in ("prepare_s", "execute_s") if k in fields
+        )
+        detail = f" ({fields['error']})" if fields.get("error") else ""
+        print(
+            f"[{done}/{len(self.models)}] {name}: {stage} {timing}{detail}", flush=True
+        )
+
+    def run(self):
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.status_path.unlink(missing_ok=True)
+        start = time.perf_counter()
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            futures = {
+                pool.submit(_prepare_model, self._runner(entry)): entry["name"]
+                for entry in self.models
+            }
+            for name in futures.values():
+                self._report(name, "queued")
+
+            for future in concurrent.futures.as_completed(futures):
+                name = futures[future]
+                runner, prepare_s, error = future.result()
+                if error:
+                    self._report(name, "failed", prepare_s=prepare_s, error=error)
+                    continue
+                self._report(
+                    name,
+                    "prepared",
+                    prepare_s=prepare_s,
+                    cache_hit=runner.cache_hit,
+                    bytes_moved=runner.stager.report["bytes_moved"],
+                )
+
+                # The device stage stays serial
+                execute_start = time.perf_counter()
+                try:
+                    runner.execute()
+                    error = None
+                except Exception as e:
+                    error = str(e)
+                execute_s = time.perf_counter() - execute_start
+                runner.write_trace()
+                self._report(
+                    name,
+                    "failed" if error else "done",
+                    execute_s=execute_s,
+                    error=error,
+                )
+
+        failed = [r["name"] for r in self.results.values() if r["stage"] == "failed"]
+        summary = {
+            "models": len(self.models),
+            "succeeded": len(self.models) - len(failed),
+            "failed": failed,
+            "wall_s": time.perf_counter() - start,
+            "results": list(self.results.values()),
+        }
+        (self.out_dir / "batch_summary.json").write_text(json.dumps(summary, indent=2))
+        print(
+            f"Batch finished: {summary['succeeded']}/{summary['models']} succeeded "
+            f"in {summary['wall_s']:.2f}s"
+        )
+        return 1 if failed else 0
+
+
 def parse_arguments():
     parser = argparse.ArgumentParser()
 
@@ -136,21 +454,29 @@ def parse_arguments():
         "--model",
         help="Path to the TOSA model file",
         type=str,
-        required=True,
     )
     parser.add_argument(
         "--inputs",
         help="Space separated list of model input files",
         type=str,
         nargs="+",
-        required=True,
     )
     parser.add_argument(
         "--outputs",
         help="Space separated list of model output files",
         type=str,
         nargs="+",
-        required=True,
+    )
+    parser.add_argument(
+        "--manifest",
+        help="JSON manifest of models to run in batch mode instead of --model",
+        type=str,
+    )
+    parser.add_argument(
+        "--jobs",
+        help="Number of models converted in parallel in batch mode (default: CPU count)",
+        type=int,
+        default=None,
     )
     parser.add_argument(
         "--shaders",
@@ -183,12 +509,66 @@ def parse_arguments():
         type=str,
         default=f"{SDK_COMPONENTS_DIR / 'ml-sdk-vgf-lib' /'build' / 'vgf_dump' / 'vgf_dump'}",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--staging",
+        help="How input files are placed in the output directory; auto tries "
+        "hardlink, reflink and symlink before copying",
+        choices=("auto",) + STAGING_METHODS,
+        default="auto",
+    )
+    parser.add_argument(
+        "--no-cache",
+        help="Always run the model converter and vgf_dump",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory of the conversion cache",
+        type=str,
+        default=str(DEFAULT_CACHE_DIR),
+    )
+    parser.add_argument(
+        "--cache-size",
+        help="Size bound of the conversion cache in MB",
+        type=int,
+        default=DEFAULT_CACHE_SIZE_MB,
+    )
+    parser.add_argument(
+        "--trace",
+        help="Time every stage and write trace.json (Chrome trace_event format) "
+        "and trace_summary.json to the output directory",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cache-stats",
+        help="Print conversion cache statistics after the run",
+        action="store_true",
+    )
+    args = parser.parse_args()
+    if not args.manifest and not (args.model and args.inputs and args.outputs):
+        parser.error("--model, --inputs and --outputs are required without --manifest")
+    return args
+
+
+def print_cache_stats(cache):
+    stats = cache.stats()
+    print(
+        f"Conversion cache: {stats['hits']} hits, {stats['misses']} misses "
+        f"({stats['hit_rate']:.0%}), {stats['evictions']} evictions, "
+        f"{stats['entries']} entries, {stats['bytes'] / (1 << 20):.1f} MB"
+    )
 
 
 def main():
-    runner = ModelRunner(parse_arguments())
-    exit(runner.run())
+    args = parse_arguments()
+    if args.manifest:
+        runner = BatchRunner(args, load_manifest(args.manifest))
+    else:
+        runner = ModelRunner(args)
+    status = runner.run()
+    if args.cache_stats and runner.cache is not None:
+        print_cache_stats(runner.cache)
+    exit(status)
 
 
 if __name__ == "__main__":
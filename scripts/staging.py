@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: Copyright 2025 Arm Limited and/or its affiliates <open-source-office@arm.com>
+# SPDX-License-Identifier: Apache-2.0
+#
+import ctypes
+import ctypes.util
+import errno
+import fcntl
+import json
+import os
+import pathlib
+import shutil
+import sys
+
+from conversion_cache import hash_file
+
+# ioctl(dst_fd, FICLONE, src_fd) shares the extents of src with dst
+FICLONE = 0x40049409
+STAGING_METHODS = ("hardlink", "reflink", "symlink", "copy")
+HASH_INDEX_NAME = ".staging_hashes.json"
+
+_libc = None
+
+
+def _reflink(src, dst):
+    """Copy-on-write clone of src to dst, raising OSError when unsupported"""
+    global _libc
+    if sys.platform == "darwin":
+        if _libc is None:
+            _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if _libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) != 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(dst))
+        return
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.unlink(dst)
+            raise
+
+
+def _link(method, src, dst):
+    if method == "hardlink":
+        os.link(src, dst)
+    elif method == "reflink":
+        _reflink(src, dst)
+    elif method == "symlink":
+        os.symlink(os.path.abspath(src), dst)
+    else:
+        shutil.copy2(src, dst)
+
+
+class Stager:
+    """
+    Places input files into an output directory without copying them.
+
+    Each file is hardlinked, reflinked or symlinked in that order, and only
+    copied when no link is possible. Files already present with the same
+    size, mtime and content are left alone. Content hashes are remembered
+    per directory, keyed by path, size and mtime, so unchanged files are
+    only hashed once.
+
+    Parameters
+    ----------
+    methods : 'tuple'
+        Staging methods to try, in order.
+    """
+
+    def __init__(self, methods=STAGING_METHODS) -> None:
+        self.methods = tuple(methods)
+        self.report = {
+            "files": 0,
+            "skipped": 0,
+            "bytes_moved": 0,
+            "bytes_linked": 0,
+            "methods": {},
+        }
+
+    def _load_hashes(self, directory):
+        try:
+            return json.loads((directory / HASH_INDEX_NAME).read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _hash(self, path, hashes):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        entry = hashes.get(key)
+        if entry is None or entry["stamp"] != stamp:
+            entry = hashes[key] = {"stamp": stamp, "sha256": hash_file(path)}
+        return entry["sha256"]
+
+    def _up_to_date(self, src, dst, hashes):
+        if not os.path.lexists(dst):
+            return False
+        if os.path.islink(dst):
+            return os.readlink(dst) == os.path.abspath(src)
+        src_stat, dst_stat = os.stat(src), os.stat(dst)
+        if (src_stat.st_dev, src_stat.st_ino) == (dst_stat.st_dev, dst_stat.st_ino):
+            return True
+        if (src_stat.st_size, src_stat.st_mtime_ns) != (
+            dst_stat.st_size,
+            dst_stat.st_mtime_ns,
+        ):
+            return False
+        return self._hash(src, hashes) == self._hash(dst, hashes)
+
+    def stage(self, files, directory):
+        """
+        Make every file available in a directory under its own name.
+
+        Returns
+        -------
+        'list'
+            Paths of the staged files.
+        """
+        directory = pathlib.Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        hashes = self._load_hashes(directory)
+        staged = []
+        for src in files:
+            dst = directory / pathlib.Path(src).name
+            staged.append(dst)
+            self.stage_file(src, dst, hashes)
+        (directory / HASH_INDEX_NAME).write_text(json.dumps(hashes))
+        return staged
+
+    def stage_file(self, src, dst, hashes=None, methods=None):
+        """
+        Place src at dst, returning the method used or "skipped".
+
+        `methods` overrides the staging methods for this file, e.g. to avoid
+        symlinks to a source that may be deleted.
+        """
+        hashes = {} if hashes is None else hashes
+        methods = self.methods if methods is None else tuple(methods)
+        self.report["files"] += 1
+        # A symlink left by an earlier run is replaced when symlinks are not allowed
+        reuse = "symlink" in methods or not os.path.islink(dst)
+        if reuse and self._up_to_date(src, dst, hashes):
+            self.report["skipped"] += 1
+            return "skipped"
+
+        if os.path.lexists(dst):
+            os.unlink(dst)
+        size = os.path.getsize(src)
+        for method in methods:
+            try:
+                _link(method, src, dst)
+            except OSError as e:
+                # EXDEV: other device, EPERM/ENOTSUP/EOPNOTSUPP/EINVAL: not supported here
+                if method == methods[-1] or e.errno not in (
+                    errno.EXDEV,
+                    errno.EPERM,
+                    errno.ENOTSUP,
+                    errno.EOPNOTSUPP,
+                    errno.EINVAL,
+                    errno.EMLINK,
+                    errno.ENOTTY,
+                ):
+                    raise
+                continue
+            break
+
+        methods = self.report["methods"]
+        methods[method] = methods.get(method, 0) + 1
+        if method == "copy":
+            self.report["bytes_moved"] += size
+        else:
+            self.report["bytes_linked"] += size
+        return method
+
+    def summary(self):
+        report = self.report
+        methods = ", ".join(f"{n} {m}" for m, n in sorted(report["methods"].items()))
+        return (
+            f"Staged {report['files']} files ({methods or 'none changed'}, "
+            f"{report['skipped']} up to date): {report['bytes_moved'] / (1 << 20):.1f} MB "
+            f"copied, {report['bytes_linked'] / (1 << 20):.1f} MB linked"
+        )
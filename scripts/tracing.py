@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: Copyright 2025 Arm Limited and/or its affiliates <open-source-office@arm.com>
+# SPDX-License-Identifier: Apache-2.0
+#
+import json
+import os
+import threading
+import time
+
+
+class Span:
+    """A recorded span; use Tracer.span() to create one"""
+
+    __slots__ = (
+        "tracer",
+        "name",
+        "attributes",
+        "start_ns",
+        "end_ns",
+        "depth",
+        "parent",
+    )
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = None
+        self.end_ns = None
+        self.depth = 0
+        self.parent = None
+
+    def __bool__(self):
+        return True
+
+    def set(self, **attributes):
+        """Add attributes to the span"""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        if stack:
+            self.parent = stack[-1]
+            self.depth = len(stack)
+        stack.append(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.perf_counter_ns()
+        self.tracer._stack().pop()
+        if exc_type is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer._finish(self)
+        return False
+
+
+class _NullSpan:
+    """Span of a disabled tracer: records nothing"""
+
+    __slots__ = ()
+
+    def __bool__(self):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class NullTracer:
+    """Tracer API that records nothing"""
+
+    enabled = False
+    spans = ()
+
+    def span(self, name, **attributes):
+        return NULL_SPAN
+
+
+class Tracer:
+    """
+    Records nested spans with monotonic nanosecond timestamps and attributes.
+
+        tracer = Tracer()
+        with tracer.span("convert", model=path) as span:
+            ...
+            if span:
+                span.set(output_bytes=os.path.getsize(vgf))
+
+    The trace is written as Chrome trace_event JSON (chrome://tracing,
+    Perfetto) or as a JSON summary with per-name totals. NullTracer has the
+    same API but hands out one shared do-nothing span, so disabled tracing
+    costs one method call per span; spans are falsy when not recording, so
+    attribute work can be skipped with "if span:".
+
+    Spans nest per thread. A tracer can be pickled with its finished spans,
+    e.g. to collect spans recorded in a worker process. The timestamps come
+    from time.perf_counter_ns(), which is system-wide on Linux and macOS, so
+    spans of different processes on one machine line up.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.spans = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"spans": self.spans}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.spans = state["spans"]
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _finish(self, span):
+        record = {
+            "name": span.name,
+            "start_ns": span.start_ns,
+            "end_ns": span.end_ns,
+            "depth": span.depth,
+            "parent": span.parent.name if span.parent is not None else None,
+            "pid": os.getpid(),
+            "tid": threading.get_native_id(),
+            "attributes": span.attributes,
+        }
+        with self._lock:
+            self.spans.append(record)
+
+    def span(self, name, **attributes):
+        """
+        Context manager timing a block.
+
+        Parameters
+        ----------
+        name : 'str'
+            Span name; spans of the same name are totalled in the summary.
+        attributes : 'dict'
+            JSON-serializable values attached to the span.
+        """
+        return Span(self, name, attributes)
+
+    def _origin_ns(self):
+        return min(span["start_ns"] for span in self.spans)
+
+    def chrome_trace(self):
+        """The spans as a Chrome trace_event document"""
+        origin = self._origin_ns() if self.spans else 0
+        events = [
+            {
+                "ph": "X",
+                "name": span["name"],
+                "pid": span["pid"],
+                "tid": span["tid"],
+                "ts": (span["start_ns"] - origin) / 1e3,
+                "dur": (span["end_ns"] - span["start_ns"]) / 1e3,
+                "args": span["attributes"],
+            }
+            for span in self.spans
+        ]
+        return {"displayTimeUnit": "ms", "traceEvents": events}
+
+    def summary(self):
+        """
+        Spans in start order with times in ms relative to the first span,
+        and the count and total time per span name.
+        """
+        if not self.spans:
+            return {"total_ms": 0.0, "spans": [], "by_name": {}}
+        origin = self._origin_ns()
+        spans = sorted(self.spans, key=lambda span: (span["start_ns"], span["depth"]))
+        by_name = {}
+        for span in spans:
+            duration_ms = (span["end_ns"] - span["start_ns"]) / 1e6
+            totals = by_name.setdefault(span["name"], {"count": 0, "total_ms": 0.0})
+            totals["count"] += 1
+            totals["total_ms"] += duration_ms
+        return {
+            "total_ms": (max(span["end_ns"] for span in spans) - origin) / 1e6,
+            "spans": [
+                {
+                    "name": span["name"],
+                    "parent": span["parent"],
+                    "depth": span["depth"],
+                    "start_ms": (span["start_ns"] - origin) / 1e6,
+                    "duration_ms": (span["end_ns"] - span["start_ns"]) / 1e6,
+                    "attributes": span["attributes"],
+                }
+                for span in spans
+            ],
+            "by_name": by_name,
+        }
+
+    def write(self, trace_path=None, summary_path=None):
+        """Write the Chrome trace and/or the JSON summary"""
+        if trace_path is not None:
+            with open(trace_path, "w") as f:
+                json.dump(self.chrome_trace(), f)
+        if summary_path is not None:
+            with open(summary_path, "w") as f:
+                json.dump(self.summary(), f, indent=2)
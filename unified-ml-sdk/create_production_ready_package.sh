@@ -34,6 +34,7 @@ cp "$SDK_ROOT/models/"*.tflite "$PACKAGE_DIR/models/" 2>/dev/null || true
 
 # 4. Create production tools
 echo "Creating production tools..."
+cp "$SDK_ROOT/tools/memory_planner.py" "$PACKAGE_DIR/tools/"
 
 # Production ML pipeline runner
 cat > "$PACKAGE_DIR/tools/run_ml_inference.py" << 'EOF'
@@ -50,10 +51,15 @@ import numpy as np
 import subprocess
 from pathlib import Path
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from memory_planner import plan_memory, print_report
+
 class MLInferenceRunner:
     def __init__(self, sdk_root=None):
         self.sdk_root = sdk_root or Path(__file__).parent.parent
-        self.scenario_runner = self.sdk_root / "bin" / "scenario-runner"
+        self.scenario_runner = Path(os.environ.get(
+            "SCENARIO_RUNNER", self.sdk_root / "bin" / "scenario-runner"
+        ))
         
         # Check environment
         if not self.scenario_runner.exists():
@@ -138,6 +144,7 @@ class MLInferenceRunner:
             ("relu2", "relu.spv", [16384])
         ]
         
+        current = "input"
         for i, (name, shader, dispatch) in enumerate(stages):
             # Add shader resource
             scenario["resources"].append({
@@ -149,28 +156,33 @@ class MLInferenceRunner:
                 }
             })
             
+            # Add stage output buffer
+            scenario["resources"].append({
+                "buffer": {
+                    "uid": f"stage_{i}_output",
+                    "shader_access": "readwrite",
+                    "size": 4 * int(np.prod(dispatch))  # float32
+                }
+            })
+            
             # Add dispatch command
             scenario["commands"].append({
                 "dispatch_compute": {
                     "shader_ref": f"{name}_shader",
                     "rangeND": dispatch,
-                    "bindings": [{
-                        "id": 0,
-                        "set": 0,
-                        "resource_ref": "input" if i == 0 else f"stage_{i-1}_output"
-                    }]
+                    "bindings": [
+                        {"id": 0, "set": 0, "resource_ref": current},
+                        {"id": 1, "set": 0, "resource_ref": f"stage_{i}_output"}
+                    ]
                 }
             })
-            
-            # Add intermediate buffers
-            if i < len(stages) - 1:
-                scenario["resources"].append({
-                    "buffer": {
-                        "uid": f"stage_{i}_output",
-                        "shader_access": "readwrite",
-                        "size": 4 * np.prod(dispatch)  # float32
-                    }
-                })
+            current = f"stage_{i}_output"
+        
+        # Reuse stage buffers once their consumer has run
+        planned, memory_report = plan_memory(scenario, outputs=[current])
+        scenario["resources"] = planned["resources"]
+        scenario["commands"] = planned["commands"]
+        print_report(memory_report)
     
     def _add_generic_pipeline(self, scenario):
         """Add generic ML pipeline"""
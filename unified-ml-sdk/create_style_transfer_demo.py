@@ -6,8 +6,12 @@ Create a style transfer demo using the unified ML SDK
 import numpy as np
 import json
 import os
+import sys
 from PIL import Image
 
+sys.path.append(os.path.join(os.path.dirname(__file__), 'tools'))
+from memory_planner import plan_memory, print_report
+
 class StyleTransferDemo:
     def __init__(self, model_path):
         self.model_path = model_path
@@ -87,7 +91,7 @@ class StyleTransferDemo:
         })
         
         # Create buffers and operations
-        buffer_id = 0
+        current = "input_image"
         for i, op in enumerate(operations):
             if op["type"] == "conv2d":
                 # Add convolution shader
@@ -125,7 +129,7 @@ class StyleTransferDemo:
                 scenario["commands"].append({
                     "dispatch_compute": {
                         "bindings": [
-                            {"id": 0, "set": 0, "resource_ref": "input_image" if i == 0 else f"{operations[i-1]['name']}_output"},
+                            {"id": 0, "set": 0, "resource_ref": current},
                             {"id": 1, "set": 0, "resource_ref": f"{op['name']}_weights"},
                             {"id": 2, "set": 0, "resource_ref": f"{op['name']}_output"}
                         ],
@@ -133,6 +137,7 @@ class StyleTransferDemo:
                         "shader_ref": f"{op['name']}_shader"
                     }
                 })
+                current = f"{op['name']}_output"
                 
             elif op["type"] == "relu":
                 # Add ReLU shader
@@ -149,13 +154,17 @@ class StyleTransferDemo:
                 scenario["commands"].append({
                     "dispatch_compute": {
                         "bindings": [
-                            {"id": 0, "set": 0, "resource_ref": f"{operations[i-1]['name']}_output"}
+                            {"id": 0, "set": 0, "resource_ref": current}
                         ],
-                        "rangeND": [np.prod(op["shape"])],
+                        "rangeND": [int(np.prod(op["shape"]))],
                         "shader_ref": f"{op['name']}_shader"
                     }
                 })
         
+        # Share intermediate buffers whose lifetimes do not overlap
+        scenario, memory_report = plan_memory(scenario, outputs=[current])
+        print_report(memory_report)
+        
         # Save scenario
         with open(f"scenarios/style_transfer_{self.model_name}.json", 'w') as f:
             json.dump(scenario, f, indent=2)
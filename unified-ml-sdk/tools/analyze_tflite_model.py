@@ -5,9 +5,12 @@ Analyze TensorFlow Lite models and extract operation information
 
 import numpy as np
 import json
-import struct
 import os
 import sys
+import time
+
+from op_fusion import fuse_operations, print_report
+from tflite_reader import TFLITE_IDENTIFIER, TFLiteModel
 
 class TFLiteModelAnalyzer:
     def __init__(self, model_path):
@@ -26,61 +29,37 @@ class TFLiteModelAnalyzer:
         print(f"Model: {self.model_path}")
         print(f"Size: {self.model_info['size'] / 1024 / 1024:.2f} MB")
         
-        # Parse TFLite format (simplified for demo)
-        with open(self.model_path, 'rb') as f:
-            # TFLite uses FlatBuffers format
-            data = f.read()
-            
-            # Check TFLite identifier
-            if data[4:8] == b'TFL3':
-                print("Valid TFLite v3 model detected")
-            else:
-                print("Warning: Unknown TFLite version")
+        start = time.perf_counter()
+        self.model = TFLiteModel(self.model_path)
         
-        # Simulate model structure for style transfer models
-        if "la_muse" in self.model_path or "style" in self.model_path.lower():
-            self._analyze_style_transfer_model()
+        # Check TFLite identifier
+        if self.model.identifier == TFLITE_IDENTIFIER:
+            print("Valid TFLite v3 model detected")
         else:
-            self._analyze_generic_model()
+            print("Warning: Unknown TFLite version")
         
-        return self.model_info
-    
-    def _analyze_style_transfer_model(self):
-        """Analyze style transfer model structure"""
-        print("\nDetected style transfer model architecture:")
-        
-        # Typical style transfer operations
-        operations = [
-            {"type": "CONV_2D", "name": "conv1", "params": {"filters": 32, "kernel": [9, 9], "stride": 1}},
-            {"type": "INSTANCE_NORM", "name": "norm1"},
-            {"type": "RELU", "name": "relu1"},
-            {"type": "CONV_2D", "name": "conv2", "params": {"filters": 64, "kernel": [3, 3], "stride": 2}},
-            {"type": "INSTANCE_NORM", "name": "norm2"},
-            {"type": "RELU", "name": "relu2"},
-            {"type": "CONV_2D", "name": "conv3", "params": {"filters": 128, "kernel": [3, 3], "stride": 2}},
-            {"type": "INSTANCE_NORM", "name": "norm3"},
-            {"type": "RELU", "name": "relu3"},
-            # Residual blocks
-            {"type": "RESIDUAL_BLOCK", "name": "res1", "params": {"filters": 128}},
-            {"type": "RESIDUAL_BLOCK", "name": "res2", "params": {"filters": 128}},
-            {"type": "RESIDUAL_BLOCK", "name": "res3", "params": {"filters": 128}},
-            {"type": "RESIDUAL_BLOCK", "name": "res4", "params": {"filters": 128}},
-            {"type": "RESIDUAL_BLOCK", "name": "res5", "params": {"filters": 128}},
-            # Upsampling
-            {"type": "CONV_TRANSPOSE_2D", "name": "deconv1", "params": {"filters": 64, "kernel": [3, 3], "stride": 2}},
-            {"type": "INSTANCE_NORM", "name": "norm4"},
-            {"type": "RELU", "name": "relu4"},
-            {"type": "CONV_TRANSPOSE_2D", "name": "deconv2", "params": {"filters": 32, "kernel": [3, 3], "stride": 2}},
-            {"type": "INSTANCE_NORM", "name": "norm5"},
-            {"type": "RELU", "name": "relu5"},
-            {"type": "CONV_2D", "name": "conv_out", "params": {"filters": 3, "kernel": [9, 9], "stride": 1}},
-            {"type": "TANH", "name": "output_activation"}
-        ]
-        
-        self.model_info["operations"] = operations
+        # Only the main subgraph is lowered to a Vulkan pipeline
+        subgraph = self.model.subgraphs[0]
+        self.model_info["description"] = self.model.description
+        self.model_info["subgraphs"] = len(self.model.subgraphs)
+        self.model_info["inputs"] = subgraph["inputs"]
+        self.model_info["outputs"] = subgraph["outputs"]
+        self.model_info["operations"] = subgraph["operators"]
+        self.model_info["tensors"] = [self._describe_tensor(t) for t in subgraph["tensors"]]
+        self.model_info["buffers"] = []
+        for i in range(len(self.model._buffers)):
+            offset, size = self.model.buffer_extent(i)
+            self.model_info["buffers"].append({"index": i, "offset": offset, "size": size})
+        
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"Decoded in {elapsed_ms:.2f} ms")
         
         # Print summary
+        operations = self.model_info["operations"]
+        weight_bytes = sum(b["size"] for b in self.model_info["buffers"])
         print(f"\nTotal operations: {len(operations)}")
+        print(f"Total tensors: {len(self.model_info['tensors'])}")
+        print(f"Constant data: {weight_bytes / 1024 / 1024:.2f} MB")
         op_types = {}
         for op in operations:
             op_type = op["type"]
@@ -89,18 +68,31 @@ class TFLiteModelAnalyzer:
         print("\nOperation breakdown:")
         for op_type, count in sorted(op_types.items()):
             print(f"  {op_type}: {count}")
+        
+        return self.model_info
+    
+    def _describe_tensor(self, tensor):
+        """JSON-friendly tensor summary (quantization vectors stay in the mmap)"""
+        info = {k: v for k, v in tensor.items() if k != "quantization"}
+        quant = tensor.get("quantization")
+        if quant is not None:
+            if len(quant["scale"]) == 1:
+                info["quantization"] = {
+                    "scale": float(quant["scale"][0]),
+                    "zero_point": int(quant["zero_point"][0]) if len(quant["zero_point"]) else 0
+                }
+            else:
+                info["quantization"] = {
+                    "channels": len(quant["scale"]),
+                    "quantized_dimension": quant["quantized_dimension"]
+                }
+        return info
     
-    def _analyze_generic_model(self):
-        """Analyze generic model structure"""
-        print("\nAnalyzing generic model...")
-        # Add basic operations for generic models
-        self.model_info["operations"] = [
-            {"type": "CONV_2D", "name": "conv1"},
-            {"type": "RELU", "name": "relu1"},
-            {"type": "FULLY_CONNECTED", "name": "fc1"}
-        ]
+    def weights(self, tensor_index):
+        """Constant data of a tensor as a NumPy view over the mapped model"""
+        return self.model.tensor_data(tensor_index)
     
-    def generate_vulkan_pipeline(self, output_dir):
+    def generate_vulkan_pipeline(self, output_dir, fuse=True):
         """Generate Vulkan pipeline from model analysis"""
         print(f"\n=== Generating Vulkan Pipeline ===")
         
@@ -111,8 +103,13 @@ class TFLiteModelAnalyzer:
             "shaders": []
         }
         
+        operations = self.model_info["operations"]
+        if fuse:
+            operations, pipeline["fusion"] = self.fuse_operations()
+            print_report(pipeline["fusion"])
+        
         # Convert operations to Vulkan stages
-        for i, op in enumerate(self.model_info["operations"]):
+        for i, op in enumerate(operations):
             stage = self._convert_op_to_vulkan_stage(op, i)
             if stage:
                 pipeline["stages"].append(stage)
@@ -127,40 +124,104 @@ class TFLiteModelAnalyzer:
         
         return pipeline
     
+    def fuse_operations(self):
+        """Fuse producer/consumer op patterns, returning (operations, report)"""
+        buffers = self.model_info["buffers"]
+        constants = {
+            t["index"] for t in self.model_info["tensors"]
+            if 0 < t["buffer"] < len(buffers) and buffers[t["buffer"]]["size"]
+        }
+        return fuse_operations(
+            self.model_info["operations"],
+            self.model_info["tensors"],
+            constants,
+            self.model_info["outputs"]
+        )
+    
     def _convert_op_to_vulkan_stage(self, op, index):
         """Convert TFLite operation to Vulkan compute stage"""
         stage = {
             "name": op["name"],
             "type": op["type"],
             "shader": None,
-            "dispatch": None
+            "dispatch": None,
+            "inputs": op.get("inputs", []),
+            "outputs": op.get("outputs", []),
+            "params": op.get("params", {})
         }
+        if "fused" in op:
+            stage["fused"] = op["fused"]
         
         # Map operations to shaders
         shader_map = {
             "CONV_2D": "conv2d.spv",
-            "CONV_TRANSPOSE_2D": "conv_transpose2d.spv",
+            "DEPTHWISE_CONV_2D": "depthwise_conv2d.spv",
+            "TRANSPOSE_CONV": "transpose_conv2d.spv",
+            "CONV_3D": "conv3d.spv",
+            "FULLY_CONNECTED": "matmul.spv",
+            "BATCH_MATMUL": "matmul.spv",
+            "MAX_POOL_2D": "maxpool2d.spv",
+            "AVERAGE_POOL_2D": "avgpool2d.spv",
             "RELU": "relu.spv",
-            "TANH": "tanh.spv",
-            "INSTANCE_NORM": "instance_norm.spv",
-            "RESIDUAL_BLOCK": "residual_block.spv",
-            "FULLY_CONNECTED": "matmul.spv"
+            "LOGISTIC": "sigmoid.spv",
+            "RELU6": "elementwise_unary.spv",
+            "TANH": "elementwise_unary.spv",
+            "ABS": "elementwise_unary.spv",
+            "NEG": "negate.spv",
+            "EXP": "elementwise_unary.spv",
+            "ADD": "elementwise_binary.spv",
+            "SUB": "elementwise_binary.spv",
+            "MUL": "elementwise_binary.spv",
+            "DIV": "elementwise_binary.spv",
+            "ELEMENTWISE_BINARY": "elementwise_binary.spv",
+            "ELEMENTWISE_UNARY": "elementwise_unary.spv",
+            "MAXIMUM": "elementwise_binary.spv",
+            "MINIMUM": "elementwise_binary.spv",
+            "SQUARED_DIFFERENCE": "elementwise_binary.spv",
+            "CONCATENATION": "concat.spv",
+            "PAD": "pad.spv",
+            "MIRROR_PAD": "pad.spv",
+            "RESHAPE": "reshape.spv",
+            "SQUEEZE": "reshape.spv",
+            "TRANSPOSE": "transpose.spv",
+            "RESIZE_BILINEAR": "resize.spv",
+            "RESIZE_NEAREST_NEIGHBOR": "resize.spv",
+            "MEAN": "reduce.spv",
+            "SUM": "reduce.spv",
+            "REDUCE_MAX": "reduce.spv",
+            "GATHER": "gather.spv",
+            "SLICE": "slice.spv",
+            "STRIDED_SLICE": "slice.spv",
+            "TILE": "tile.spv",
+            "CAST": "cast.spv",
+            "QUANTIZE": "rescale.spv",
+            "DEQUANTIZE": "rescale.spv",
+            "ARG_MAX": "argmax.spv",
+            "SELECT": "select.spv",
+            "SELECT_V2": "select.spv"
         }
         
         if op["type"] in shader_map:
             stage["shader"] = shader_map[op["type"]]
             
-            # Set dispatch dimensions based on operation type
-            if op["type"] in ["CONV_2D", "CONV_TRANSPOSE_2D"]:
-                stage["dispatch"] = {"x": 256, "y": 256, "z": 1}
-            elif op["type"] == "FULLY_CONNECTED":
-                stage["dispatch"] = {"x": 1024, "y": 1, "z": 1}
+            # Dispatch over the output tensor: (W, H, C) for NHWC feature
+            # maps, one invocation per element otherwise
+            shape = self._output_shape(op)
+            if len(shape) == 4:
+                stage["dispatch"] = {"x": shape[2], "y": shape[1], "z": shape[3]}
             else:
-                stage["dispatch"] = {"x": 65536, "y": 1, "z": 1}
+                stage["dispatch"] = {"x": int(np.prod(shape)) if shape else 1, "y": 1, "z": 1}
             
             return stage
         
         return None
+    
+    def _output_shape(self, op):
+        """Shape of the first output tensor of an operation"""
+        outputs = op.get("outputs", [])
+        if not outputs or outputs[0] < 0 or outputs[0] >= len(self.model_info["tensors"]):
+            return []
+        return self.model_info["tensors"][outputs[0]]["shape"]
 
 def main():
     import argparse
@@ -168,6 +229,7 @@ def main():
     parser.add_argument("model", help="Path to TFLite model")
     parser.add_argument("--output-dir", default=".", help="Output directory for pipeline")
     parser.add_argument("--verbose", action="store_true", help="Verbose output")
+    parser.add_argument("--no-fusion", action="store_true", help="Map every op to its own stage")
     
     args = parser.parse_args()
     
@@ -183,7 +245,7 @@ def main():
         print(json.dumps(model_info, indent=2))
     
     # Generate Vulkan pipeline
-    analyzer.generate_vulkan_pipeline(args.output_dir)
+    analyzer.generate_vulkan_pipeline(args.output_dir, fuse=not args.no_fusion)
     
     return 0
 
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Vectorized NumPy reference implementations of the convolution shaders
+
+All feature maps are channels-last (NWC, NHWC, NDHWC). The generic `conv`
+works on weights laid out as [*kernel, C_in / groups, C_out] (HWIO for 2D);
+the shader-named wrappers take the weight layouts of the matching shaders in
+unified-ml-sdk/shaders and convert to it.
+
+Small kernels go through an im2col formulation (sliding_window_view +
+tensordot/einsum) and large kernels, such as the 9x9 style-transfer convs,
+through FFT-based correlation.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Kernels with at least this many taps use the FFT path in method="auto"
+FFT_MIN_TAPS = 49
+
+
+def _tuple(value, rank):
+    if np.isscalar(value):
+        return (int(value),) * rank
+    value = tuple(int(v) for v in value)
+    if len(value) != rank:
+        raise ValueError(f"Expected {rank} values, got {value}")
+    return value
+
+
+def resolve_padding(padding, sizes, kernel_sizes, strides, dilations):
+    """
+    Resolve padding to a (before, after) pair per spatial axis.
+
+    Accepts "SAME"/"VALID" (TFLite semantics), a single int, one int or pair
+    per axis, or the flat [before0, after0, before1, after1, ...] layout used
+    by the shader push constants.
+    """
+    rank = len(sizes)
+    if isinstance(padding, str):
+        if padding.upper() == "VALID":
+            return [(0, 0)] * rank
+        if padding.upper() != "SAME":
+            raise ValueError(f"Unknown padding '{padding}'")
+        pads = []
+        for size, k, s, d in zip(sizes, kernel_sizes, strides, dilations):
+            effective = (k - 1) * d + 1
+            total = max((-(-size // s) - 1) * s + effective - size, 0)
+            pads.append((total // 2, total - total // 2))
+        return pads
+    if np.isscalar(padding):
+        return [(int(padding), int(padding))] * rank
+    padding = list(padding)
+    if len(padding) == rank:
+        return [(p, p) if np.isscalar(p) else tuple(p) for p in padding]
+    if len(padding) == 2 * rank:
+        return [(padding[2 * i], padding[2 * i + 1]) for i in range(rank)]
+    raise ValueError(f"Cannot interpret padding {padding} for {rank} spatial axes")
+
+
+def _pad(x, pads):
+    """Zero-pad (or crop, for negative amounts) the spatial axes of x"""
+    crop = [slice(None)] * x.ndim
+    widths = [(0, 0)] * x.ndim
+    for axis, (before, after) in enumerate(pads, start=1):
+        widths[axis] = (max(before, 0), max(after, 0))
+        crop[axis] = slice(max(-before, 0), x.shape[axis] + min(after, 0))
+    x = x[tuple(crop)]
+    return np.pad(x, widths) if any(w != (0, 0) for w in widths) else x
+
+
+def _conv_im2col(x, weights, strides, dilations, groups):
+    rank = x.ndim - 2
+    kernel = weights.shape[:rank]
+    effective = tuple((k - 1) * d + 1 for k, d in zip(kernel, dilations))
+    windows = sliding_window_view(x, effective, axis=tuple(range(1, rank + 1)))
+    windows = windows[
+        (slice(None),)
+        + tuple(slice(None, None, s) for s in strides)
+        + (slice(None),)
+        + tuple(slice(None, None, d) for d in dilations)
+    ]
+    # windows: N, *out, C_in, *kernel
+
+    if groups == 1:
+        window_axes = [rank + 1] + list(range(rank + 2, 2 * rank + 2))
+        weight_axes = [rank] + list(range(rank))
+        return np.tensordot(windows, weights, axes=(window_axes, weight_axes))
+
+    c_group = weights.shape[rank]
+    out_group = weights.shape[-1] // groups
+    windows = windows.reshape(windows.shape[: rank + 1] + (groups, c_group) + kernel)
+    weights = weights.reshape(kernel + (c_group, groups, out_group))
+    out_letters, kernel_letters = "xyz"[:rank], "abc"[:rank]
+    expr = f"n{out_letters}gi{kernel_letters},{kernel_letters}igo->n{out_letters}go"
+    out = np.einsum(expr, windows, weights, optimize=True)
+    return out.reshape(out.shape[: rank + 1] + (groups * out_group,))
+
+
+def _conv_fft(x, weights, strides, dilations):
+    rank = x.ndim - 2
+    kernel = weights.shape[:rank]
+    if any(d > 1 for d in dilations):
+        effective = tuple((k - 1) * d + 1 for k, d in zip(kernel, dilations))
+        dilated = np.zeros(effective + weights.shape[rank:], dtype=weights.dtype)
+        dilated[tuple(slice(None, None, d) for d in dilations)] = weights
+        weights, kernel = dilated, effective
+
+    # Correlation is convolution with the flipped kernel; circular wrap-around
+    # only touches the first k - 1 outputs per axis, which VALID discards
+    size = x.shape[1 : rank + 1]
+    axes = tuple(range(1, rank + 1))
+    flipped = weights[tuple(slice(None, None, -1) for _ in kernel)]
+    x_f = np.fft.rfftn(x, s=size, axes=axes)
+    w_f = np.fft.rfftn(flipped, s=size, axes=tuple(range(rank)))
+
+    # Per frequency bin: [N, C_in] @ [C_in, C_out]
+    n, c_in, c_out = x.shape[0], x.shape[-1], weights.shape[-1]
+    bins = x_f.shape[1:-1]
+    x_f = x_f.reshape(n, -1, c_in).transpose(1, 0, 2)
+    w_f = w_f.reshape(-1, c_in, c_out)
+    out_f = np.matmul(x_f, w_f).transpose(1, 0, 2).reshape((n,) + bins + (c_out,))
+    out = np.fft.irfftn(out_f, s=size, axes=axes)
+
+    valid = tuple(slice(k - 1, None, s) for k, s in zip(kernel, strides))
+    return out[(slice(None),) + valid]
+
+
+def conv(
+    x,
+    weights,
+    bias=None,
+    stride=1,
+    padding=0,
+    dilation=1,
+    groups=1,
+    method="auto",
+):
+    """
+    N-dimensional channels-last convolution (cross-correlation).
+
+    Parameters
+    ----------
+    x : 'numpy.ndarray'
+        Input of shape [N, *spatial, C_in].
+    weights : 'numpy.ndarray'
+        Weights of shape [*kernel, C_in / groups, C_out].
+    bias : 'numpy.ndarray'
+        Optional per-output-channel bias.
+    stride, dilation : 'int' or 'tuple'
+        Per spatial axis, or one value for all axes.
+    padding : 'str', 'int' or 'list'
+        See `resolve_padding`.
+    groups : 'int'
+        Number of channel groups; groups == C_in is a depthwise convolution.
+    method : 'str'
+        "im2col", "fft" or "auto" (FFT for kernels of FFT_MIN_TAPS taps or
+        more when groups == 1).
+    """
+    rank = x.ndim - 2
+    kernel = weights.shape[:rank]
+    strides = _tuple(stride, rank)
+    dilations = _tuple(dilation, rank)
+    if x.shape[-1] != weights.shape[rank] * groups:
+        raise ValueError(
+            f"Input has {x.shape[-1]} channels, weights expect "
+            f"{weights.shape[rank]} x {groups} groups"
+        )
+
+    pads = resolve_padding(padding, x.shape[1:-1], kernel, strides, dilations)
+    dtype = np.result_type(x, weights, np.float32)
+    x = _pad(x.astype(dtype, copy=False), pads)
+
+    if method == "auto":
+        method = "fft" if groups == 1 and np.prod(kernel) >= FFT_MIN_TAPS else "im2col"
+    if method == "fft":
+        if groups != 1:
+            raise ValueError("The FFT path only supports groups=1")
+        out = _conv_fft(x, weights.astype(dtype, copy=False), strides, dilations)
+    elif method == "im2col":
+        out = _conv_im2col(
+            x, weights.astype(dtype, copy=False), strides, dilations, groups
+        )
+    else:
+        raise ValueError(f"Unknown convolution method '{method}'")
+
+    if bias is not None:
+        out = out + np.asarray(bias, dtype=dtype).reshape(-1)
+    return out.astype(dtype, copy=False)
+
+
+def conv1d(x, kernel):
+    """conv1d.comp: valid 1D correlation of flat buffers"""
+    x, kernel = np.ravel(x), np.ravel(kernel)
+    return sliding_window_view(x, kernel.size) @ kernel
+
+
+def conv2d(x, weights, bias=None, stride=1, padding=0, dilation=1, groups=1):
+    """conv2d.comp: NHWC input, [OC, KH, KW, IC] weights"""
+    return conv(
+        x, np.transpose(weights, (1, 2, 3, 0)), bias, stride, padding, dilation, groups
+    )
+
+
+def depthwise_conv2d(x, weights, bias=None, stride=1, padding=0, dilation=1):
+    """depthwise_conv2d.comp: NHWC input, [KH, KW, C, M] weights"""
+    kh, kw, channels, multiplier = weights.shape
+    return conv(
+        x,
+        weights.reshape(kh, kw, 1, channels * multiplier),
+        bias,
+        stride,
+        padding,
+        dilation,
+        groups=channels,
+    )
+
+
+def conv3d(x, weights, bias=None, stride=1, padding=0, dilation=1):
+    """conv3d.comp: NDHWC input, [OC, KD, KH, KW, IC] weights"""
+    return conv(
+        x, np.transpose(weights, (1, 2, 3, 4, 0)), bias, stride, padding, dilation
+    )
+
+
+def transpose_conv2d(x, weights, bias=None, stride=1, out_pad=0, out_shape=None):
+    """
+    transpose_conv2d.comp: NHWC input, [OC, KH, KW, IC] weights.
+
+    `out_pad` is [top, bottom, left, right] as in the shader and may be
+    negative to crop; `out_shape` (H, W) overrides the derived output size.
+    """
+    n, in_h, in_w, _ = x.shape
+    out_c, kh, kw, _ = weights.shape
+    sy, sx = _tuple(stride, 2)
+    pads = resolve_padding(out_pad, (in_h, in_w), (kh, kw), (sy, sx), (1, 1))
+
+    dtype = np.result_type(x, weights, np.float32)
+    # One GEMM for every (input pixel, kernel tap) product, then scatter each
+    # tap into its strided position of the full output
+    products = np.tensordot(
+        x.astype(dtype, copy=False), weights.astype(dtype, copy=False), axes=([3], [3])
+    )  # N, IH, IW, OC, KH, KW
+    full = np.zeros((n, (in_h - 1) * sy + kh, (in_w - 1) * sx + kw, out_c), dtype=dtype)
+    for ky in range(kh):
+        for kx in range(kw):
+            full[
+                :,
+                ky : ky + (in_h - 1) * sy + 1 : sy,
+                kx : kx + (in_w - 1) * sx + 1 : sx,
+            ] += products[..., ky, kx]
+
+    out = _pad(full, pads)
+    if out_shape is not None:
+        out_h, out_w = out_shape
+        out = _pad(out, [(0, out_h - out.shape[1]), (0, out_w - out.shape[2])])
+    if bias is not None:
+        out = out + np.asarray(bias, dtype=dtype).reshape(-1)
+    return out
@@ -8,9 +8,16 @@ import json
 import os
 import sys
 
+from analyze_tflite_model import TFLiteModelAnalyzer
+from cost_model import RooflineModel, load_profile, option_variants, rank_by_type, tensor_bytes
+
 class OptimizedModelConverter:
-    def __init__(self, target_device="apple_silicon"):
+    def __init__(self, target_device="apple_silicon", profile=None):
         self.target_device = target_device
+        self.profile = profile or load_profile(target_device)
+        self.cost_model = RooflineModel(self.profile)
+        self.operations = []
+        self.tensors = []
         self.optimizations = {
             "apple_silicon": {
                 "use_fp16": True,
@@ -35,6 +42,12 @@ class OptimizedModelConverter:
         model_name = os.path.basename(model_path).replace('.tflite', '')
         opts = self.optimizations[self.target_device]
         
+        # Cost estimates work on the fused op graph that gets generated
+        analyzer = TFLiteModelAnalyzer(model_path)
+        analyzer.analyze()
+        self.operations, _ = analyzer.fuse_operations()
+        self.tensors = analyzer.model_info["tensors"]
+        
         # Create optimized scenario
         scenario = {
             "name": f"{model_name}_optimized",
@@ -105,41 +118,73 @@ class OptimizedModelConverter:
             }
         })
     
-    def _generate_optimization_report(self, model_name, opts, output_dir):
+    def _generate_optimization_report(self, model_name, opts, output_dir, top=10):
         """Generate optimization report"""
+        estimates = {
+            name: self.cost_model.estimate(self.operations, self.tensors, variant)
+            for name, variant in option_variants(opts).items()
+        }
+        baseline_ms = estimates["baseline"]["total_ms"]
+        applied = estimates["all"]
+        
         report = {
             "model": model_name,
             "target": self.target_device,
+            "device_profile": self.profile,
             "optimizations_applied": opts,
             "estimated_speedup": self._estimate_speedup(opts),
-            "memory_savings": self._estimate_memory_savings(opts)
+            "memory_savings": self._estimate_memory_savings(opts),
+            "options": {
+                name: {
+                    "total_ms": round(est["total_ms"], 4),
+                    "speedup": round(baseline_ms / est["total_ms"], 2) if est["total_ms"] else 1.0,
+                    "gflop": round(est["flops"] / 1e9, 4),
+                    "traffic_mb": round(est["bytes"] / 1024 / 1024, 3),
+                    "compute_bound_ops": est["compute_bound"],
+                    "bandwidth_bound_ops": est["bandwidth_bound"]
+                }
+                for name, est in estimates.items()
+            },
+            "time_by_op_type": rank_by_type(applied["layers"]),
+            "hotspots": sorted(applied["layers"], key=lambda l: -l["time_ms"])[:top],
+            "layers": applied["layers"]
         }
         
         report_path = os.path.join(output_dir, f"{model_name}_optimization_report.json")
         with open(report_path, 'w') as f:
             json.dump(report, f, indent=2)
         
-        print(f"\nOptimization Report:")
+        print(f"\nOptimization Report ({self.profile['name']}):")
+        print(f"  {'Option':<16} {'Latency':>10} {'Speedup':>8} {'Compute':>8} {'Memory':>8}")
+        for name, option in report["options"].items():
+            print(f"  {name:<16} {option['total_ms']:>8.3f}ms {option['speedup']:>7.2f}x "
+                  f"{option['compute_bound_ops']:>8} {option['bandwidth_bound_ops']:>8}")
         print(f"  Estimated speedup: {report['estimated_speedup']}x")
         print(f"  Memory savings: {report['memory_savings']}%")
+        
+        print(f"\nWhere the time goes:")
+        for entry in report["time_by_op_type"]:
+            share = entry["time_ms"] / applied["total_ms"] * 100 if applied["total_ms"] else 0
+            print(f"  {entry['type']:<20} {entry['count']:>4} ops {entry['time_ms']:>8.3f}ms {share:>5.1f}%")
+        print(f"\nHottest layers:")
+        for layer in report["hotspots"]:
+            print(f"  {layer['name'][:48]:<48} {layer['time_ms']:>7.3f}ms "
+                  f"{layer['bound']:>9}-bound ({layer['intensity']:.1f} FLOP/B)")
     
     def _estimate_speedup(self, opts):
-        """Estimate performance speedup from optimizations"""
-        speedup = 1.0
-        if opts.get("use_fp16"):
-            speedup *= 1.8  # FP16 typically gives 1.8x speedup
-        if opts.get("use_simdgroup"):
-            speedup *= 1.5  # SIMD groups add additional speedup
-        if opts.get("use_shared_memory"):
-            speedup *= 1.2  # Shared memory reduces global memory access
-        return round(speedup, 2)
+        """Estimate performance speedup from optimizations with the roofline model"""
+        variants = option_variants(opts)
+        baseline = self.cost_model.estimate(self.operations, self.tensors, variants["baseline"])
+        optimized = self.cost_model.estimate(self.operations, self.tensors, opts)
+        if not optimized["total_ms"]:
+            return 1.0
+        return round(baseline["total_ms"] / optimized["total_ms"], 2)
     
     def _estimate_memory_savings(self, opts):
-        """Estimate memory savings from optimizations"""
-        savings = 0
-        if opts.get("use_fp16"):
-            savings += 50  # FP16 uses half the memory
-        return savings
+        """Estimate tensor storage saved by the optimizations, in percent"""
+        before = sum(tensor_bytes(t) for t in self.tensors)
+        after = sum(tensor_bytes(t, opts.get("use_fp16", False)) for t in self.tensors)
+        return round((1 - after / before) * 100, 1) if before else 0
 
 def main():
     import argparse
@@ -148,12 +193,20 @@ def main():
     parser.add_argument("--target", choices=["apple_silicon", "generic"], 
                        default="apple_silicon", help="Target device")
     parser.add_argument("--output-dir", default="scenarios", help="Output directory")
+    parser.add_argument("--device-profile", help="Device profile name or JSON file (default: target)")
+    parser.add_argument("--peak-gflops", type=float, help="Override the profile's peak GFLOPS")
+    parser.add_argument("--bandwidth-gbs", type=float, help="Override the profile's bandwidth in GB/s")
     
     args = parser.parse_args()
     
     os.makedirs(args.output_dir, exist_ok=True)
     
-    converter = OptimizedModelConverter(args.target)
+    profile = load_profile(
+        args.device_profile or args.target,
+        peak_gflops=args.peak_gflops,
+        bandwidth_gbs=args.bandwidth_gbs
+    )
+    converter = OptimizedModelConverter(args.target, profile)
     converter.convert_tflite_to_vulkan(args.model, args.output_dir)
 
 if __name__ == "__main__":
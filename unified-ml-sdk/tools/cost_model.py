@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Roofline cost model for analyzer op lists
+
+Every op gets a FLOP count and the bytes it moves through device memory,
+both derived from the real tensor shapes. The time estimate for an op is
+the larger of its compute time at the attainable FLOP rate and its transfer
+time at the attainable bandwidth, plus a fixed dispatch overhead; an op is
+compute-bound when its arithmetic intensity (FLOPs per byte) is above the
+device's ridge point.
+
+Optimization options change the inputs of the model rather than applying
+fixed multipliers:
+
+- use_fp16 stores float tensors in 2 bytes and computes at fp16_rate x peak
+- use_simdgroup raises the attainable efficiency of GEMM-like ops
+- use_shared_memory tiles GEMM-like ops by tile_size, so operands larger
+  than the cache are re-read once per tile instead of once per cache_tile
+"""
+
+import json
+import math
+
+import numpy as np
+
+DEVICE_PROFILES = {
+    "apple_silicon": {
+        "name": "Apple M-series GPU (10 core)",
+        "peak_gflops": 3600.0,
+        "bandwidth_gbs": 100.0,
+        "fp16_rate": 1.0,
+        "compute_efficiency": 0.35,
+        "simdgroup_efficiency": 0.75,
+        "bandwidth_efficiency": 0.8,
+        "cache_bytes": 8 * 1024 * 1024,
+        "cache_tile": 4,
+        "dispatch_overhead_us": 10.0,
+    },
+    "generic": {
+        "name": "Generic discrete GPU",
+        "peak_gflops": 5000.0,
+        "bandwidth_gbs": 250.0,
+        "fp16_rate": 2.0,
+        "compute_efficiency": 0.35,
+        "simdgroup_efficiency": 0.6,
+        "bandwidth_efficiency": 0.75,
+        "cache_bytes": 4 * 1024 * 1024,
+        "cache_tile": 4,
+        "dispatch_overhead_us": 5.0,
+    },
+}
+
+GEMM_OPS = {"CONV_2D", "CONV_3D", "TRANSPOSE_CONV", "FULLY_CONNECTED", "BATCH_MATMUL"}
+
+
+def load_profile(name_or_path, **overrides):
+    """Device profile by name or from a JSON file, with selected fields overridden"""
+    if name_or_path in DEVICE_PROFILES:
+        profile = dict(DEVICE_PROFILES[name_or_path])
+    else:
+        with open(name_or_path) as f:
+            profile = dict(DEVICE_PROFILES["generic"], **json.load(f))
+    profile.update({k: v for k, v in overrides.items() if v is not None})
+    return profile
+
+
+def _elements(tensor):
+    return int(np.prod(tensor.get("shape") or [1]))
+
+
+def _element_size(tensor, use_fp16):
+    if not tensor.get("dtype"):
+        return 2 if use_fp16 else 4
+    if use_fp16 and tensor["dtype"].startswith("float"):
+        return 2
+    return np.dtype(tensor["dtype"]).itemsize
+
+
+def tensor_bytes(tensor, use_fp16=False):
+    return _elements(tensor) * _element_size(tensor, use_fp16)
+
+
+def op_work(op, tensors):
+    """
+    Work of one op from its tensor shapes.
+
+    Returns
+    -------
+    'dict'
+        flops (2 per multiply-accumulate), and for GEMM-like ops the
+        GEMM view (m, n, activation and weight tensor ids) used to model
+        operand re-reads.
+    """
+    inputs = [t for t in op.get("inputs", []) if t >= 0]
+    outputs = [t for t in op.get("outputs", []) if t >= 0]
+    out = tensors[outputs[0]] if outputs else {"shape": []}
+    out_shape = out.get("shape") or [1]
+    out_elements = _elements(out)
+    params = op.get("params", {})
+    op_type = op["type"]
+    work = {"flops": out_elements, "gemm": None}
+
+    if op_type in ("CONV_2D", "DEPTHWISE_CONV_2D") and len(inputs) >= 2:
+        _, kh, kw, cin = tensors[inputs[1]]["shape"]
+        if op_type == "CONV_2D":
+            macs = out_elements * kh * kw * cin
+            work["gemm"] = (
+                out_elements // out_shape[-1],
+                out_shape[-1],
+                inputs[0],
+                inputs[1],
+            )
+        else:
+            macs = out_elements * kh * kw
+        work["flops"] = 2 * macs
+    elif op_type == "CONV_3D" and len(inputs) >= 2:
+        kd, kh, kw, cin, _ = tensors[inputs[1]]["shape"]
+        work["flops"] = 2 * out_elements * kd * kh * kw * cin
+        work["gemm"] = (
+            out_elements // out_shape[-1],
+            out_shape[-1],
+            inputs[0],
+            inputs[1],
+        )
+    elif op_type == "TRANSPOSE_CONV" and len(inputs) >= 3:
+        # inputs: output_shape, weights [Cout, KH, KW, Cin], activation
+        cout, kh, kw, _ = tensors[inputs[1]]["shape"]
+        work["flops"] = 2 * _elements(tensors[inputs[2]]) * kh * kw * cout
+        work["gemm"] = (
+            _elements(tensors[inputs[2]]) // tensors[inputs[2]]["shape"][-1],
+            cout * kh * kw,
+            inputs[2],
+            inputs[1],
+        )
+    elif op_type == "FULLY_CONNECTED" and len(inputs) >= 2:
+        units, depth = tensors[inputs[1]]["shape"][-2:]
+        work["flops"] = 2 * out_elements * depth
+        work["gemm"] = (out_elements // units, units, inputs[0], inputs[1])
+    elif op_type == "BATCH_MATMUL" and len(inputs) >= 2:
+        depth = tensors[inputs[0]]["shape"][-1]
+        work["flops"] = 2 * out_elements * depth
+        work["gemm"] = (
+            out_elements // out_shape[-1],
+            out_shape[-1],
+            inputs[0],
+            inputs[1],
+        )
+    elif op_type in ("MAX_POOL_2D", "AVERAGE_POOL_2D", "L2_POOL_2D"):
+        work["flops"] = (
+            out_elements
+            * params.get("filter_width", 1)
+            * params.get("filter_height", 1)
+        )
+    elif op_type in ("MEAN", "SUM", "REDUCE_MAX", "REDUCE_MIN", "REDUCE_PROD"):
+        work["flops"] = _elements(tensors[inputs[0]]) if inputs else out_elements
+    elif op_type == "SOFTMAX":
+        work["flops"] = 5 * out_elements
+    elif op_type in ("RESHAPE", "SQUEEZE", "EXPAND_DIMS"):
+        work["flops"] = 0
+    elif op_type in ("ELEMENTWISE_BINARY", "ELEMENTWISE_UNARY"):
+        work["flops"] = out_elements * len(params.get("chain", [None]))
+
+    # Epilogues folded in by operator fusion
+    for epilogue in ("bias_add", "residual"):
+        if epilogue in params:
+            work["flops"] += out_elements
+    if params.get("fused_activation_function", "NONE") != "NONE":
+        work["flops"] += out_elements
+    return work
+
+
+class RooflineModel:
+    """
+    Per-op latency estimates against a device profile.
+
+    Parameters
+    ----------
+    profile : 'dict'
+        See DEVICE_PROFILES.
+    """
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    def op_bytes(self, op, tensors, work, opts):
+        """Device memory traffic of an op: compulsory traffic plus operand re-reads"""
+        use_fp16 = opts.get("use_fp16", False)
+        ids = {t for t in op.get("inputs", []) + op.get("outputs", []) if t >= 0}
+        total = sum(tensor_bytes(tensors[t], use_fp16) for t in ids)
+        if work["gemm"] is None:
+            return total
+
+        # Tiled GEMM: the activation is re-read once per column tile and the
+        # weights once per row tile, unless they stay resident in cache
+        m, n, activation, weights = work["gemm"]
+        tile = (
+            opts.get("tile_size", 1)
+            if opts.get("use_shared_memory")
+            else self.profile["cache_tile"]
+        )
+        for operand, tiles in (
+            (activation, math.ceil(n / tile)),
+            (weights, math.ceil(m / tile)),
+        ):
+            size = tensor_bytes(tensors[operand], use_fp16)
+            if size > self.profile["cache_bytes"] and tiles > 1:
+                total += size * (tiles - 1)
+        return total
+
+    def estimate_op(self, op, tensors, opts):
+        profile = self.profile
+        work = op_work(op, tensors)
+        nbytes = self.op_bytes(op, tensors, work, opts)
+
+        efficiency = profile["compute_efficiency"]
+        if opts.get("use_simdgroup") and work["gemm"] is not None:
+            efficiency = profile["simdgroup_efficiency"]
+        gflops = profile["peak_gflops"] * efficiency
+        if opts.get("use_fp16"):
+            gflops *= profile["fp16_rate"]
+        bandwidth = profile["bandwidth_gbs"] * profile["bandwidth_efficiency"]
+
+        compute_ms = work["flops"] / (gflops * 1e6)
+        memory_ms = nbytes / (bandwidth * 1e6)
+        intensity = work["flops"] / nbytes if nbytes else float("inf")
+        return {
+            "name": op["name"],
+            "type": op["type"],
+            "flops": int(work["flops"]),
+            "bytes": int(nbytes),
+            "intensity": round(intensity, 3),
+            "bound": "compute" if intensity > gflops / bandwidth else "bandwidth",
+            "compute_ms": compute_ms,
+            "memory_ms": memory_ms,
+            "time_ms": max(compute_ms, memory_ms)
+            + profile["dispatch_overhead_us"] / 1000,
+        }
+
+    def estimate(self, operations, tensors, opts):
+        """Per-layer estimates and totals for one optimization option"""
+        layers = [self.estimate_op(op, tensors, opts) for op in operations]
+        total_ms = sum(layer["time_ms"] for layer in layers)
+        for layer in layers:
+            layer["share"] = layer["time_ms"] / total_ms if total_ms else 0.0
+        return {
+            "total_ms": total_ms,
+            "flops": sum(layer["flops"] for layer in layers),
+            "bytes": sum(layer["bytes"] for layer in layers),
+            "compute_bound": sum(layer["bound"] == "compute" for layer in layers),
+            "bandwidth_bound": sum(layer["bound"] == "bandwidth" for layer in layers),
+            "layers": layers,
+        }
+
+
+def option_variants(opts):
+    """The baseline, each optimization on its own and the full target config"""
+    baseline = dict(opts, use_fp16=False, use_simdgroup=False, use_shared_memory=False)
+    variants = {"baseline": baseline}
+    for flag in ("use_fp16", "use_simdgroup", "use_shared_memory"):
+        if opts.get(flag):
+            variants[flag[len("use_") :]] = dict(baseline, **{flag: True})
+    variants["all"] = dict(opts)
+    return variants
+
+
+def rank_by_type(layers):
+    """Estimated time per op type, most expensive first"""
+    by_type = {}
+    for layer in layers:
+        entry = by_type.setdefault(
+            layer["type"], {"type": layer["type"], "count": 0, "time_ms": 0.0}
+        )
+        entry["count"] += 1
+        entry["time_ms"] += layer["time_ms"]
+    return sorted(by_type.values(), key=lambda e: -e["time_ms"])
@@ -9,6 +9,8 @@ import json
 import struct
 import os
 
+from memory_planner import plan_memory, print_report
+
 class MLPipelineBuilder:
     def __init__(self):
         self.operations = []
@@ -28,18 +30,26 @@ class MLPipelineBuilder:
     
     def add_conv2d_operation(self, input_shape, filter_shape, output_shape):
         """Add convolution operation"""
+        # Chain onto the previous operation when it produces our input
+        if self.operations and tuple(
+            self.tensors[self.operations[-1]["output_tensor"]]["shape"]
+        ) == tuple(input_shape):
+            input_tensor = self.operations[-1]["output_tensor"]
+        else:
+            input_tensor = len(self.tensors)
+            self.tensors.append({"shape": input_shape, "dtype": "float32"})
+        
         op = {
             "type": "conv2d",
-            "input_tensor": len(self.tensors),
-            "filter_tensor": len(self.tensors) + 1,
-            "output_tensor": len(self.tensors) + 2,
+            "input_tensor": input_tensor,
+            "filter_tensor": len(self.tensors),
+            "output_tensor": len(self.tensors) + 1,
             "stride": [1, 1],
             "padding": "SAME"
         }
         
         # Add tensors
         self.tensors.extend([
-            {"shape": input_shape, "dtype": "float32"},
             {"shape": filter_shape, "dtype": "float32"},
             {"shape": output_shape, "dtype": "float32"}
         ])
@@ -64,28 +74,41 @@ class MLPipelineBuilder:
         })
         
         # Add buffer resources for tensors
+        filters = {op["filter_tensor"] for op in self.operations}
         for i, tensor in enumerate(self.tensors):
             size = np.prod(tensor["shape"]) * 4  # float32
             scenario["resources"].append({
                 "buffer": {
-                    "shader_access": "readwrite",
+                    "shader_access": "readonly" if i in filters else "readwrite",
                     "size": int(size),
                     "uid": f"tensor_{i}"
                 }
             })
         
-        # Add compute dispatch
-        scenario["commands"].append({
-            "dispatch_compute": {
-                "bindings": [
-                    {"id": 0, "set": 0, "resource_ref": "tensor_0"},
-                    {"id": 1, "set": 0, "resource_ref": "tensor_1"},
-                    {"id": 2, "set": 0, "resource_ref": "tensor_2"}
-                ],
-                "rangeND": [224, 224, 1],  # Output dimensions
-                "shader_ref": "conv2d_shader"
-            }
-        })
+        # Add compute dispatches
+        for op in self.operations:
+            output_shape = self.tensors[op["output_tensor"]]["shape"]
+            scenario["commands"].append({
+                "dispatch_compute": {
+                    "bindings": [
+                        {"id": 0, "set": 0, "resource_ref": f"tensor_{op['input_tensor']}"},
+                        {"id": 1, "set": 0, "resource_ref": f"tensor_{op['filter_tensor']}"},
+                        {"id": 2, "set": 0, "resource_ref": f"tensor_{op['output_tensor']}"}
+                    ],
+                    "rangeND": [output_shape[2], output_shape[1], 1],  # Output dimensions
+                    "shader_ref": "conv2d_shader"
+                }
+            })
+        
+        # Share buffers between intermediates whose lifetimes do not overlap
+        produced = {op["output_tensor"] for op in self.operations}
+        consumed = {op["input_tensor"] for op in self.operations}
+        scenario, memory_report = plan_memory(
+            scenario,
+            inputs=[f"tensor_{i}" for i in consumed - produced],
+            outputs=[f"tensor_{i}" for i in produced - consumed],
+        )
+        print_report(memory_report)
         
         with open(output_path, 'w') as f:
             json.dump(scenario, f, indent=2)
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Open-loop load generator for Vulkan ML workloads
+
+Requests arrive on a schedule that does not depend on completions: a Poisson
+process at a target rate, or the timestamps of a recorded trace. A pool of
+runner sessions serves them. Every request records its intended start (the
+arrival), its actual start (when a session was free) and its completion.
+Latency is measured from the intended start, so time spent queued behind
+slow requests is counted rather than hidden (no coordinated omission).
+
+Each offered rate reports achieved throughput, the latency, service time
+and queueing delay percentiles, and whether the latency SLO holds. Sweeping
+rates gives latency-vs-offered-load curves.
+
+Trace files hold one arrival timestamp in seconds per line (the first
+column of CSV/whitespace separated lines; lines starting with # are
+skipped). Timestamps are taken relative to the first one.
+"""
+
+import argparse
+import json
+import threading
+import time
+
+import numpy as np
+
+from realtime_performance_monitor import VulkanPerformanceMonitor
+from streaming_stats import DEFAULT_QUANTILES, DDSketch, quantile_label
+
+
+def poisson_arrivals(rate, duration, seed=0):
+    """Arrival offsets in seconds of a Poisson process, generated lazily"""
+    rng = np.random.default_rng(seed)
+    offset = 0.0
+    while True:
+        for gap in rng.exponential(1 / rate, 1024):
+            offset += float(gap)
+            if offset >= duration:
+                return
+            yield offset
+
+
+def load_trace(path):
+    """Arrival offsets in seconds of a trace file, relative to its first timestamp"""
+    stamps = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                stamps.append(float(line.replace(",", " ").split()[0]))
+    if not stamps:
+        raise ValueError(f"No timestamps in trace {path}")
+    stamps.sort()
+    return [t - stamps[0] for t in stamps]
+
+
+class OpenLoopLoadGenerator(VulkanPerformanceMonitor):
+    """
+    Drives scenario runs at offered rates independent of completions.
+
+    Parameters
+    ----------
+    workers : 'int'
+        Number of runner sessions serving requests, the maximum concurrency.
+    slo_ms : 'float'
+        Latency objective in ms.
+    slo_quantile : 'float'
+        Quantile of the latency that must stay within slo_ms, e.g. 0.99.
+    drain_timeout : 'float'
+        Seconds after the last arrival to finish queued requests. Requests
+        still waiting then are dropped and count as SLO violations.
+    """
+
+    def __init__(
+        self,
+        workers=4,
+        slo_ms=100.0,
+        slo_quantile=0.99,
+        drain_timeout=10.0,
+        relative_accuracy=0.01,
+    ):
+        super().__init__(relative_accuracy=relative_accuracy)
+        self.workers = workers
+        self.slo_ms = slo_ms
+        self.slo_quantile = slo_quantile
+        self.drain_timeout = drain_timeout
+
+    def run_load(
+        self, scenario_path, schedules, report_path="load_report.json", plot_path=None
+    ):
+        """
+        Run every schedule in turn.
+
+        Parameters
+        ----------
+        schedules : 'list'
+            (offered rate in requests/s, arrival offsets in s, span in s) tuples.
+        """
+        print(f"=== Open-loop Load ===")
+        print(f"Scenario: {scenario_path}")
+        print(
+            f"Workers: {self.workers}, SLO: {quantile_label(self.slo_quantile)} <= {self.slo_ms} ms\n"
+        )
+
+        levels = []
+        self.monitoring = True
+        try:
+            with self._open_sessions(scenario_path, self.workers) as sessions:
+                print(
+                    "Offered (req/s) | Achieved (req/s) | p50 (ms) | p99 (ms) | p999 (ms) | "
+                    "Queue p99 (ms) | Dropped | SLO"
+                )
+                print(
+                    "----------------|------------------|----------|----------|-----------|"
+                    "----------------|---------|-----"
+                )
+                for offered, arrivals, span in schedules:
+                    level = self._run_schedule(sessions, arrivals, span)
+                    level["offered_rps"] = offered
+                    levels.append(level)
+                    latency, queueing = level["latency_ms"], level["queue_delay_ms"]
+                    cells = [
+                        f"{value:{width}.2f}"
+                        if value is not None
+                        else f"{'-':>{width}}"
+                        for value, width in (
+                            (latency["p50"], 8),
+                            (latency["p99"], 8),
+                            (latency["p999"], 9),
+                            (queueing["p99"], 14),
+                        )
+                    ]
+                    print(
+                        f"{offered:15.1f} | {level['achieved_rps']:16.1f} | {' | '.join(cells)} | "
+                        f"{level['dropped']:7d} | {'pass' if level['slo_pass'] else 'FAIL'}"
+                    )
+                    if not self.monitoring:
+                        break
+        except KeyboardInterrupt:
+            print("\nStopping load...")
+        finally:
+            self.monitoring = False
+
+        passing = [level["offered_rps"] for level in levels if level["slo_pass"]]
+        if passing:
+            print(f"\nHighest offered rate meeting the SLO: {max(passing):.1f} req/s")
+        else:
+            print("\nNo offered rate met the SLO")
+
+        with open(report_path, "w") as f:
+            json.dump(
+                {
+                    "scenario": scenario_path,
+                    "workers": self.workers,
+                    "slo": {"quantile": self.slo_quantile, "latency_ms": self.slo_ms},
+                    "levels": levels,
+                },
+                f,
+                indent=2,
+            )
+        print(f"Load report saved to: {report_path}")
+
+        if plot_path and levels:
+            self._plot(levels, plot_path)
+        return levels
+
+    def _run_schedule(self, sessions, arrivals, span):
+        """Serve one arrival schedule with the session pool"""
+        arrivals = iter(arrivals)
+        sketches = {
+            name: DDSketch(self.latency.relative_accuracy)
+            for name in ("latency", "service", "queue_delay")
+        }
+        counts = {"completed": 0, "failed": 0, "dropped": 0, "last_end": None}
+        # Small lead so every worker is waiting before the first arrival
+        origin = time.perf_counter() + 0.05
+        cutoff = origin + span + self.drain_timeout
+
+        def worker(session, handle):
+            while self.monitoring:
+                with self.lock:
+                    offset = next(arrivals, None)
+                if offset is None:
+                    return
+                intended = origin + offset
+                now = time.perf_counter()
+                if now < intended:
+                    time.sleep(intended - now)
+                elif now > cutoff:
+                    # Never served: its latency is at least the time it waited
+                    with self.lock:
+                        counts["dropped"] += 1
+                        sketches["latency"].add((now - intended) * 1000)
+                    continue
+                start = time.perf_counter()
+                run = session.run(handle)[0]
+                end = time.perf_counter()
+                with self.lock:
+                    counts["last_end"] = max(counts["last_end"] or end, end)
+                    counts["completed" if run["success"] else "failed"] += 1
+                    sketches["latency"].add((end - intended) * 1000)
+                    sketches["service"].add((end - start) * 1000)
+                    sketches["queue_delay"].add((start - intended) * 1000)
+
+        threads = [threading.Thread(target=worker, args=pair) for pair in sessions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        elapsed = max((counts["last_end"] or origin) - origin, span)
+        level = {
+            "completed": counts["completed"],
+            "failed": counts["failed"],
+            "dropped": counts["dropped"],
+            "elapsed_s": elapsed,
+            "achieved_rps": counts["completed"] / elapsed if elapsed > 0 else 0,
+        }
+        for name, sketch in sketches.items():
+            level[f"{name}_ms"] = dict(
+                zip(
+                    (quantile_label(q) for q in DEFAULT_QUANTILES),
+                    sketch.quantiles(DEFAULT_QUANTILES),
+                )
+            )
+        slo_latency = sketches["latency"].quantile(self.slo_quantile)
+        level["slo_latency_ms"] = slo_latency
+        level["slo_pass"] = (
+            slo_latency is not None
+            and slo_latency <= self.slo_ms
+            and counts["failed"] == 0
+            and counts["dropped"] == 0
+        )
+        return level
+
+    def _plot(self, levels, path):
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+
+        offered = [level["offered_rps"] for level in levels]
+        plt.figure(figsize=(10, 6))
+        for name in ("p50", "p99", "p999"):
+            plt.plot(
+                offered,
+                [level["latency_ms"][name] for level in levels],
+                marker="o",
+                label=name,
+            )
+        plt.axhline(
+            self.slo_ms,
+            color="red",
+            linestyle="--",
+            label=f"SLO {quantile_label(self.slo_quantile)} {self.slo_ms} ms",
+        )
+        plt.xlabel("Offered load (req/s)")
+        plt.ylabel("Latency from intended start (ms)")
+        plt.yscale("log")
+        plt.title("Latency vs offered load")
+        plt.legend()
+        plt.tight_layout()
+        plt.savefig(path)
+        print(f"Latency curve saved to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Open-loop load generator with latency SLO reporting"
+    )
+    parser.add_argument("scenario", help="Path to scenario file")
+    parser.add_argument(
+        "--rates",
+        default="10,20,50,100",
+        help="Comma-separated Poisson arrival rates in requests/s",
+    )
+    parser.add_argument(
+        "--trace", help="Replay arrival timestamps from this file instead"
+    )
+    parser.add_argument(
+        "--speeds", default="1", help="Comma-separated replay speed factors for --trace"
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=10,
+        help="Seconds of Poisson arrivals per rate",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=4, help="Number of runner sessions"
+    )
+    parser.add_argument(
+        "--slo-ms", type=float, default=100.0, help="Latency objective in ms"
+    )
+    parser.add_argument(
+        "--slo-percentile",
+        type=float,
+        default=99.0,
+        help="Percentile of the latency that must meet the objective",
+    )
+    parser.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=10.0,
+        help="Seconds after the last arrival before queued requests are dropped",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the Poisson arrivals"
+    )
+    parser.add_argument("--report", default="load_report.json", help="JSON report path")
+    parser.add_argument(
+        "--plot", help="Save the latency-vs-offered-load curve to this file"
+    )
+    args = parser.parse_args()
+
+    if args.trace:
+        offsets = load_trace(args.trace)
+        span = offsets[-1] or 1.0
+        schedules = []
+        for speed in (float(s) for s in args.speeds.split(",")):
+            scaled = [t / speed for t in offsets]
+            schedules.append((len(offsets) * speed / span, scaled, span / speed))
+    else:
+        schedules = [
+            (rate, poisson_arrivals(rate, args.duration, args.seed + i), args.duration)
+            for i, rate in enumerate(float(r) for r in args.rates.split(","))
+        ]
+
+    generator = OpenLoopLoadGenerator(
+        args.workers, args.slo_ms, args.slo_percentile / 100, args.drain_timeout
+    )
+    generator.run_load(args.scenario, schedules, args.report, args.plot)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Buffer liveness analysis and memory planning for generated scenarios
+
+Scenario generators allocate one buffer per intermediate tensor, so device
+memory grows with network depth even though only a few activations are live
+at any point. The planner walks the command list, computes the first and last
+command that references each intermediate buffer and packs buffers whose
+lifetimes do not overlap into shared slots (greedy interval-graph coloring,
+best-fit by size). The scenario is rewritten to the reduced resource list.
+
+Buffers with a src or dst, readonly buffers (weights, constants), tensor
+alias targets and images keep their own allocation.
+"""
+
+import copy
+import json
+
+SLOT_PREFIX = "slot_"
+
+
+def _resource(entry):
+    kind = next(iter(entry))
+    return kind, entry[kind]
+
+
+def _references(node, uids, found):
+    """Collect every uid referenced anywhere inside a command"""
+    if isinstance(node, dict):
+        for value in node.values():
+            _references(value, uids, found)
+    elif isinstance(node, list):
+        for value in node:
+            _references(value, uids, found)
+    elif isinstance(node, str) and node in uids:
+        found.add(node)
+    return found
+
+
+def plannable_buffers(scenario):
+    """Buffers the planner may share: intermediates with no host-visible data"""
+    aliased = set()
+    for entry in scenario.get("resources", []):
+        _, desc = _resource(entry)
+        if "alias_target" in desc:
+            aliased.add(desc["alias_target"].get("resource_ref"))
+
+    buffers = {}
+    for entry in scenario.get("resources", []):
+        kind, desc = _resource(entry)
+        if (
+            kind == "buffer"
+            and "src" not in desc
+            and "dst" not in desc
+            and desc.get("shader_access") != "readonly"
+            and desc["uid"] not in aliased
+        ):
+            buffers[desc["uid"]] = desc
+    return buffers
+
+
+def analyze_liveness(scenario, inputs=(), outputs=()):
+    """
+    Compute the live interval of every plannable buffer.
+
+    Parameters
+    ----------
+    scenario : 'dict'
+        Scenario with "resources" and "commands".
+    inputs : 'list'
+        uids filled before the first command. They are live for the whole
+        scenario, since every repeated run reads them again, so no other
+        buffer ever shares their memory.
+    outputs : 'list'
+        uids read after the last command; they are live until the end.
+
+    Returns
+    -------
+    'dict'
+        uid -> (first, last) command index, inclusive. Buffers that no
+        command references are left out.
+    """
+    buffers = plannable_buffers(scenario)
+    commands = scenario.get("commands", [])
+    intervals = {}
+    for index, command in enumerate(commands):
+        for uid in _references(command, buffers, set()):
+            first, _ = intervals.get(uid, (index, index))
+            intervals[uid] = (first, index)
+
+    for uid in inputs:
+        if uid in intervals:
+            intervals[uid] = (-1, len(commands))
+    for uid in outputs:
+        if uid in intervals:
+            intervals[uid] = (intervals[uid][0], len(commands))
+    return intervals
+
+
+def _peak_live_bytes(intervals, sizes):
+    events = []
+    for uid, (first, last) in intervals.items():
+        events.append((first, 0, sizes[uid]))
+        events.append((last, 1, -sizes[uid]))
+    # Allocations at a command are counted before releases at the same one
+    peak = live = 0
+    for _, _, delta in sorted(events):
+        live += delta
+        peak = max(peak, live)
+    return peak
+
+
+def assign_slots(intervals, sizes):
+    """
+    Pack live intervals into reusable slots.
+
+    Intervals are visited in order of first use; a buffer takes the free slot
+    with the smallest size that fits it, or grows the largest free slot when
+    none fits, and opens a new slot only when no slot is free. Visiting by
+    start time uses the minimum number of slots (the maximum number of
+    simultaneously live buffers).
+
+    Returns
+    -------
+    'list'
+        One {"size", "members"} dict per slot, members in order of first use.
+    """
+    slots = []
+    for uid in sorted(intervals, key=lambda u: (intervals[u][0], -sizes[u], u)):
+        first, last = intervals[uid]
+        free = [slot for slot in slots if slot["free_after"] < first]
+        fitting = [slot for slot in free if slot["size"] >= sizes[uid]]
+        if fitting:
+            slot = min(fitting, key=lambda s: s["size"])
+        elif free:
+            slot = max(free, key=lambda s: s["size"])
+        else:
+            slot = {"size": 0, "members": []}
+            slots.append(slot)
+        slot["size"] = max(slot["size"], sizes[uid])
+        slot["members"].append(uid)
+        slot["free_after"] = last
+
+    for slot in slots:
+        del slot["free_after"]
+    return slots
+
+
+def plan_memory(scenario, inputs=(), outputs=()):
+    """
+    Rewrite a scenario so intermediates with disjoint lifetimes share buffers.
+
+    Slots holding a single buffer keep its uid, shared slots holding one of
+    the `outputs` take that uid so it stays addressable, and the other shared
+    slots are named slot_<n>. `inputs` always keep a buffer of their own.
+    Every resource_ref to a member of a shared slot is rewritten to the slot.
+
+    Returns
+    -------
+    'tuple'
+        (planned scenario, report). The input scenario is not modified.
+    """
+    buffers = plannable_buffers(scenario)
+    intervals = analyze_liveness(scenario, inputs, outputs)
+    sizes = {uid: int(buffers[uid]["size"]) for uid in intervals}
+    slots = assign_slots(intervals, sizes)
+
+    taken = {_resource(entry)[1].get("uid") for entry in scenario.get("resources", [])}
+    renames = {}
+    shared = 0
+    for slot in slots:
+        named = [uid for uid in outputs if uid in slot["members"]]
+        if len(slot["members"]) == 1 or named:
+            slot["uid"] = (named or slot["members"])[0]
+        else:
+            while f"{SLOT_PREFIX}{shared}" in taken:
+                shared += 1
+            slot["uid"] = f"{SLOT_PREFIX}{shared}"
+            taken.add(slot["uid"])
+        for uid in slot["members"]:
+            renames[uid] = slot["uid"]
+
+    planned = copy.deepcopy(scenario)
+    slot_of = {uid: slot for slot in slots for uid in slot["members"]}
+    resources = []
+    for entry in planned.get("resources", []):
+        kind, desc = _resource(entry)
+        uid = desc.get("uid")
+        if uid not in slot_of:
+            resources.append(entry)
+            continue
+        slot = slot_of[uid]
+        if slot["members"][0] != uid:
+            continue  # Folded into the slot emitted for its first member
+        desc = dict(desc, uid=slot["uid"], size=slot["size"])
+        accesses = {buffers[m].get("shader_access") for m in slot["members"]}
+        if len(accesses) > 1:
+            desc["shader_access"] = "readwrite"
+        resources.append({kind: desc})
+    planned["resources"] = resources
+    planned["commands"] = _rename_refs(planned.get("commands", []), renames)
+
+    pinned = sum(
+        int(desc.get("size", 0))
+        for kind, desc in map(_resource, scenario.get("resources", []))
+        if kind == "buffer" and desc["uid"] not in intervals
+    )
+    report = {
+        "planned_buffers": len(intervals),
+        "slots": len(slots),
+        "naive_bytes": sum(sizes.values()),
+        "planned_bytes": sum(slot["size"] for slot in slots),
+        "peak_live_bytes": _peak_live_bytes(intervals, sizes),
+        "pinned_bytes": pinned,
+        "intervals": {uid: list(interval) for uid, interval in intervals.items()},
+        "assignment": {uid: slot["uid"] for uid, slot in slot_of.items()},
+    }
+    return planned, report
+
+
+def _rename_refs(node, renames):
+    if isinstance(node, dict):
+        return {key: _rename_refs(value, renames) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_rename_refs(value, renames) for value in node]
+    if isinstance(node, str):
+        return renames.get(node, node)
+    return node
+
+
+def print_report(report):
+    """Print the peak versus naive memory of a plan"""
+    mb = 1024 * 1024
+    naive, planned = report["naive_bytes"], report["planned_bytes"]
+    print("Memory plan:")
+    print(
+        f"  Intermediate buffers: {report['planned_buffers']} -> {report['slots']} slots"
+    )
+    print(f"  Naive allocation:     {naive / mb:.2f} MB")
+    print(f"  Planned allocation:   {planned / mb:.2f} MB")
+    print(f"  Peak live (bound):    {report['peak_live_bytes'] / mb:.2f} MB")
+    print(f"  Pinned buffers:       {report['pinned_bytes'] / mb:.2f} MB")
+    if naive:
+        print(f"  Saved:                {(1 - planned / naive) * 100:.1f}%")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Scenario memory planner")
+    parser.add_argument("scenario", help="Scenario JSON to plan")
+    parser.add_argument("--output", help="Write the planned scenario here")
+    parser.add_argument(
+        "--inputs", nargs="*", default=[], help="Buffers filled before execution"
+    )
+    parser.add_argument(
+        "--outputs", nargs="*", default=[], help="Buffers read after execution"
+    )
+    parser.add_argument("--report", help="Save the plan report as JSON")
+    args = parser.parse_args()
+
+    with open(args.scenario) as f:
+        scenario = json.load(f)
+    planned, report = plan_memory(scenario, args.inputs, args.outputs)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(planned, f, indent=2)
+        print(f"Planned scenario: {args.output}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+"""
+CPU stand-in for scenario-runner that executes scenarios with NumPy kernels
+
+Loads a scenario JSON (buffer/tensor/image/shader resources plus a command
+list) and runs every dispatch_compute through a vectorized NumPy kernel looked
+up by shader name. It accepts the same --scenario/--output flags as
+scenario-runner, so the tools can be pointed at it (SCENARIO_RUNNER=...) on
+machines without a Vulkan device.
+
+Binding convention: bindings are ordered by (set, id). The output is the one
+bound resource declared writeonly; without exactly one, it is the binding the
+shader writes, which is registered per shader name: the first (set 0) for
+the tensor shaders of the TOSA operators, the last for the buffer shaders.
+The other bindings are the kernel inputs, in order. A dispatch with only as
+many bindings as the kernel has required inputs runs in place. Shader
+parameters that would normally come from push constants can be given as a
+"params" object on the dispatch_compute command. A dispatch whose rangeND has
+a zero extent does no work, like vkCmdDispatch(0, 0, 0).
+"""
+
+import argparse
+import inspect
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import conv_reference
+from conv_reference import resolve_padding
+
+# Vulkan formats used by tensor/image resources
+VK_FORMATS = {
+    "VK_FORMAT_R8_SINT": np.int8,
+    "VK_FORMAT_R8_UINT": np.uint8,
+    "VK_FORMAT_R8_BOOL_ARM": np.bool_,
+    "VK_FORMAT_R16_SINT": np.int16,
+    "VK_FORMAT_R16_UINT": np.uint16,
+    "VK_FORMAT_R16_SFLOAT": np.float16,
+    "VK_FORMAT_R32_SINT": np.int32,
+    "VK_FORMAT_R32_UINT": np.uint32,
+    "VK_FORMAT_R32_SFLOAT": np.float32,
+    "VK_FORMAT_R64_SINT": np.int64,
+    "VK_FORMAT_R16G16_SFLOAT": np.float16,
+    "VK_FORMAT_R16G16B16A16_SFLOAT": np.float16,
+    "VK_FORMAT_R32G32B32A32_SFLOAT": np.float32,
+    "VK_FORMAT_R8G8B8A8_UNORM": np.uint8,
+}
+
+# Commands that only order work on a real device
+NO_OP_COMMANDS = {"mark_boundary", "memory_barrier", "dispatch_barrier"}
+
+# Version of the scenario_session protocol served by --session
+SESSION_PROTOCOL = 1
+
+KERNELS = {}
+# Position of the output among the (set, id) ordered bindings, per shader name
+OUTPUT_BINDINGS = {}
+
+
+def kernel(*names, output=-1):
+    """
+    Register a NumPy kernel under one or more shader names, whose shaders
+    write the binding at position `output`
+    """
+
+    def register(fn):
+        for name in names:
+            KERNELS[name] = fn
+            OUTPUT_BINDINGS[name] = output
+        return fn
+
+    return register
+
+
+def _required_inputs(fn):
+    return sum(
+        1
+        for p in inspect.signature(fn).parameters.values()
+        if p.kind == p.POSITIONAL_OR_KEYWORD and p.default is p.empty
+    )
+
+
+def _pair(value):
+    return (value, value) if np.isscalar(value) else tuple(value)
+
+
+@kernel("add", "add_vectors", "add_shader")
+def add(a, b):
+    return a + b
+
+
+@kernel("sub", "sub_shader")
+def sub(a, b):
+    return a - b
+
+
+@kernel("mul", output=0)
+@kernel("multiply")
+def mul(a, b):
+    return a * b
+
+
+@kernel("negate", output=0)
+def negate(x):
+    return -x
+
+
+@kernel("relu")
+def relu(x):
+    return np.maximum(x, 0)
+
+
+@kernel("sigmoid")
+def sigmoid(x):
+    # tanh form avoids overflow in exp for large negative inputs
+    return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+
+@kernel("tanh")
+def tanh(x):
+    return np.tanh(x)
+
+
+@kernel("clamp", output=0)
+def clamp(x, min_value=0.0, max_value=6.0):
+    return np.clip(x, min_value, max_value)
+
+
+@kernel("add_one")
+def add_one(x):
+    return x + x.dtype.type(1)
+
+
+@kernel("plus_ten_tensor")
+def plus_ten(x):
+    return x + x.dtype.type(10)
+
+
+@kernel("memory_bandwidth", "copy_tensor_shader")
+def copy(x):
+    return x.copy()
+
+
+@kernel("vector_ops")
+def vector_ops(x, operation=0, size=None):
+    x = x.reshape(-1)[:size]
+    if operation == 0:
+        return x + 1.0
+    if operation == 1:
+        return x * 2.0
+    if operation == 2:
+        return x * 2.0 + 1.0
+    return np.sqrt(np.abs(np.sin(x) * np.cos(x * 2.0))) + np.exp(-x * x)
+
+
+@kernel("matmul", output=0)
+@kernel("matrix_multiply", "matrix_mult_naive", "matrix_mult_tiled")
+def matmul(a, b, M=None, N=None, K=None):
+    if M is not None:
+        a = a.reshape(-1)[: M * K].reshape(M, K)
+        b = b.reshape(-1)[: K * N].reshape(K, N)
+    return np.matmul(a, b)
+
+
+@kernel("conv2d", output=0)
+@kernel("optimized_conv2d")
+def conv2d(x, weights, bias=None, stride=1, padding="VALID", dilation=1, groups=1):
+    return conv_reference.conv2d(x, weights, bias, stride, padding, dilation, groups)
+
+
+@kernel("depthwise_conv2d", output=0)
+def depthwise_conv2d(x, weights, bias=None, stride=1, padding="VALID", dilation=1):
+    return conv_reference.depthwise_conv2d(x, weights, bias, stride, padding, dilation)
+
+
+@kernel("conv3d", output=0)
+def conv3d(x, weights, bias=None, stride=1, padding="VALID", dilation=1):
+    return conv_reference.conv3d(x, weights, bias, stride, padding, dilation)
+
+
+@kernel("transpose_conv2d", output=0)
+def transpose_conv2d(x, weights, bias=None, stride=1, out_pad=0, out_shape=None):
+    return conv_reference.transpose_conv2d(x, weights, bias, stride, out_pad, out_shape)
+
+
+@kernel("conv1d", "conv1d_fixed")
+def conv1d(x, kernel, input_size=None, kernel_size=None):
+    return conv_reference.conv1d(
+        np.ravel(x)[:input_size], np.ravel(kernel)[:kernel_size]
+    )
+
+
+def _pool(x, reduce, kernel_size, stride, padding, fill):
+    kernel_size = _pair(kernel_size)
+    stride = _pair(stride) if stride is not None else kernel_size
+    pads = resolve_padding(padding, x.shape[1:3], kernel_size, stride, (1, 1))
+    x = np.pad(x, [(0, 0)] + pads + [(0, 0)], constant_values=fill)
+    windows = sliding_window_view(x, kernel_size, axis=(1, 2))
+    return reduce(windows[:, :: stride[0], :: stride[1]], axis=(-2, -1))
+
+
+@kernel("maxpool2d", output=0)
+def maxpool2d(x, kernel_size=2, stride=None, padding="VALID"):
+    if np.issubdtype(x.dtype, np.floating):
+        lowest = -np.inf
+    else:
+        lowest = np.iinfo(x.dtype).min
+    return _pool(x, np.max, kernel_size, stride, padding, lowest)
+
+
+@kernel("avgpool2d", output=0)
+def avgpool2d(x, kernel_size=2, stride=None, padding="VALID"):
+    # Padded positions are excluded from the average like in the shader
+    acc = x.astype(np.result_type(x.dtype, np.float32), copy=False)
+    summed = _pool(acc, np.nansum, kernel_size, stride, padding, np.nan)
+    counts = _pool(
+        np.ones(x.shape[:3] + (1,), acc.dtype),
+        np.nansum,
+        kernel_size,
+        stride,
+        padding,
+        np.nan,
+    )
+    return (summed / counts).astype(x.dtype, copy=False)
+
+
+@kernel("transpose", output=0)
+def transpose(x, perm=None):
+    return np.transpose(x, perm)
+
+
+@kernel("reshape", output=0)
+def reshape(x, shape=(-1,)):
+    return x.reshape(shape)
+
+
+class ScenarioEngine:
+    """
+    Executes a scenario file on the CPU.
+
+    Parameters
+    ----------
+    scenario_path : 'str'
+        Path to the scenario JSON file; relative src/dst paths are resolved
+        against its directory.
+    output_dir : 'str'
+        Folder where write-only resources without a dst are saved as
+        <uid>.npy, like the --output folder of scenario-runner.
+    """
+
+    def __init__(self, scenario_path, output_dir=None):
+        self.scenario_path = scenario_path
+        self.base_dir = os.path.dirname(os.path.abspath(scenario_path))
+        self.output_dir = output_dir
+        with open(scenario_path) as f:
+            self.scenario = json.load(f)
+
+        self.shaders = {}
+        self.resources = {}
+        self.data = {}
+        for entry in self.scenario.get("resources", []):
+            kind, desc = next(iter(entry.items()))
+            if kind == "shader":
+                self.shaders[desc["uid"]] = self._resolve_kernel(desc)
+            else:
+                self.resources[desc["uid"]] = dict(desc, kind=kind)
+
+    def _path(self, path):
+        return path if os.path.isabs(path) else os.path.join(self.base_dir, path)
+
+    @staticmethod
+    def _resolve_kernel(desc):
+        name = os.path.splitext(os.path.basename(desc.get("src", "")))[0]
+        for candidate in (name, desc["uid"]):
+            if candidate in KERNELS:
+                return candidate
+        raise KeyError(f"No NumPy kernel registered for shader '{name or desc['uid']}'")
+
+    def load_inputs(self, overrides=None):
+        """Load every resource, reading src files (or `overrides[uid]`)"""
+        overrides = overrides or {}
+        for uid, desc in self.resources.items():
+            src = overrides.get(uid, desc.get("src"))
+            if src is not None:
+                self.data[uid] = self._read(uid, self._path(src), desc)
+            elif desc["kind"] == "buffer":
+                self.data[uid] = np.zeros(desc.get("size", 0) // 4, dtype=np.float32)
+            else:
+                dtype = VK_FORMATS.get(desc.get("format"), np.float32)
+                self.data[uid] = np.zeros(desc.get("dims", [0]), dtype=dtype)
+
+    def reload_inputs(self, overrides):
+        """Replace the data of the resources in `overrides` with new src files"""
+        for uid, src in overrides.items():
+            if uid not in self.resources:
+                raise KeyError(f"Unknown resource '{uid}'")
+            self.data[uid] = self._read(uid, self._path(src), self.resources[uid])
+
+    @staticmethod
+    def _read(uid, path, desc):
+        if not path.endswith(".npy"):
+            raise ValueError(
+                f"Resource '{uid}': only .npy sources are supported, got {path}"
+            )
+        data = np.load(path)
+        if desc["kind"] in ("tensor", "image") and "dims" in desc:
+            data = data.reshape(desc["dims"])
+        return data
+
+    def run(self):
+        """Execute all commands, returning per-command wall times in ms"""
+        timings = []
+        for index, command in enumerate(self.scenario.get("commands", [])):
+            kind, desc = next(iter(command.items()))
+            if kind in NO_OP_COMMANDS:
+                continue
+            if kind != "dispatch_compute":
+                raise NotImplementedError(
+                    f"Command '{kind}' is not supported on the CPU"
+                )
+            start = time.perf_counter_ns()
+            if all(desc.get("rangeND", [1])):
+                self.dispatch(desc)
+            end = time.perf_counter_ns()
+            timings.append(
+                {
+                    "index": index,
+                    "shader": desc["shader_ref"],
+                    "time_ms": (end - start) / 1e6,
+                    "start_ns": start,
+                    "end_ns": end,
+                }
+            )
+        return timings
+
+    def dispatch(self, desc):
+        """Run one dispatch_compute command through its NumPy kernel"""
+        name = self.shaders[desc["shader_ref"]]
+        fn = KERNELS[name]
+        bindings = sorted(
+            desc.get("bindings", []), key=lambda b: (b.get("set", 0), b["id"])
+        )
+        refs = [b["resource_ref"] for b in bindings]
+        if not refs:
+            raise ValueError(f"Dispatch of '{desc['shader_ref']}' has no bindings")
+        if len(refs) <= _required_inputs(fn):
+            inputs, output = refs, refs[-1]
+        else:
+            writeonly = [
+                index
+                for index, ref in enumerate(refs)
+                if self.resources[ref].get("shader_access") == "writeonly"
+            ]
+            index = writeonly[0] if len(writeonly) == 1 else OUTPUT_BINDINGS[name]
+            index %= len(refs)
+            output = refs[index]
+            inputs = refs[:index] + refs[index + 1 :]
+        result = fn(*(self.data[r] for r in inputs), **desc.get("params", {}))
+        self._store(output, np.asarray(result))
+
+    def _store(self, uid, result):
+        desc = self.resources[uid]
+        if desc["kind"] == "buffer":
+            if result.nbytes > desc.get("size", result.nbytes):
+                raise ValueError(
+                    f"Dispatch writes {result.nbytes} bytes into buffer '{uid}' of {desc['size']} bytes"
+                )
+        elif "dims" in desc:
+            dtype = VK_FORMATS.get(desc.get("format"), result.dtype)
+            result = result.reshape(desc["dims"]).astype(dtype, copy=False)
+        self.data[uid] = result
+
+    def save_outputs(self):
+        """Write resources with a dst, and unnamed write-only ones to output_dir"""
+        written = []
+        for uid, desc in self.resources.items():
+            if "dst" in desc:
+                path = self._path(desc["dst"])
+            elif self.output_dir and desc.get("shader_access") == "writeonly":
+                path = os.path.join(self.output_dir, f"{uid}.npy")
+            else:
+                continue
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            np.save(path, self.data[uid])
+            written.append(path)
+        return written
+
+
+def serve_session(requests=sys.stdin, replies=sys.stdout):
+    """
+    Serve the scenario_session JSON-lines protocol until "close" or EOF.
+
+    Scenarios are parsed and their inputs loaded once per "load"; every
+    "run" starts again from those inputs, optionally swapping some of them
+    for new files, and reports per-run and per-dispatch timings.
+    """
+
+    def reply(message):
+        replies.write(json.dumps(message) + "\n")
+        replies.flush()
+
+    reply({"ready": True, "protocol": SESSION_PROTOCOL})
+    loaded = []
+    for line in requests:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            op = request.get("op")
+            if op == "close":
+                reply({"ok": True})
+                break
+            elif op == "load":
+                engine = ScenarioEngine(request["scenario"], request.get("output"))
+                engine.load_inputs()
+                loaded.append((engine, dict(engine.data)))
+                reply({"ok": True, "handle": len(loaded) - 1})
+            elif op == "run":
+                engine, initial = loaded[request["handle"]]
+                runs = [
+                    _session_run(engine, initial, request.get("inputs"))
+                    for _ in range(request.get("iterations", 1))
+                ]
+                reply({"ok": True, "runs": runs})
+            else:
+                reply({"ok": False, "error": f"Unknown op '{op}'"})
+        except (ValueError, OSError, KeyError, IndexError, NotImplementedError) as e:
+            reply({"ok": False, "error": str(e)})
+
+
+def _session_run(engine, initial, inputs):
+    start = time.perf_counter()
+    # Kernels never write into their inputs, so a shallow copy resets state
+    engine.data = dict(initial)
+    if inputs:
+        engine.reload_inputs(inputs)
+    compute_start = time.perf_counter()
+    dispatches = engine.run()
+    compute_end = time.perf_counter()
+    engine.save_outputs()
+    return {
+        "time_ms": (compute_end - compute_start) * 1000,
+        "total_ms": (time.perf_counter() - start) * 1000,
+        "dispatches": dispatches,
+    }
+
+
+def write_profiling_dump(path, timings):
+    """Per-dispatch timestamps in the canonical profiling_dump.py layout"""
+    commands = [
+        {
+            "index": t["index"],
+            "type": "dispatch_compute",
+            "name": t["shader"],
+            "start_ns": t["start_ns"],
+            "end_ns": t["end_ns"],
+        }
+        for t in timings
+    ]
+    with open(path, "w") as f:
+        json.dump({"version": 1, "unit": "ns", "commands": commands}, f)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="NumPy CPU scenario runner")
+    parser.add_argument("--scenario", help="Path to scenario file")
+    parser.add_argument("--output", help="Output folder")
+    parser.add_argument("--quiet", action="store_true", help="Only report errors")
+    parser.add_argument(
+        "--profiling-dump-path",
+        help="Write per-dispatch timestamps as JSON (see profiling_dump.py)",
+    )
+    parser.add_argument(
+        "--session",
+        action="store_true",
+        help="Serve the scenario_session protocol on stdin/stdout",
+    )
+    args = parser.parse_args()
+    if not args.session and not args.scenario:
+        parser.error("--scenario is required")
+    return args
+
+
+def main():
+    args = parse_arguments()
+    if args.session:
+        serve_session()
+        return 0
+
+    try:
+        engine = ScenarioEngine(args.scenario, args.output)
+        engine.load_inputs()
+        timings = engine.run()
+        written = engine.save_outputs()
+        if args.profiling_dump_path:
+            write_profiling_dump(args.profiling_dump_path, timings)
+    except (OSError, ValueError, KeyError, NotImplementedError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if not args.quiet:
+        for t in timings:
+            print(f"dispatch {t['index']}: {t['shader']} {t['time_ms']:.3f} ms")
+        for path in written:
+            print(f"Saved {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Operator fusion over analyzer op lists
+
+Mapping every TFLite operator to its own compute stage costs one dispatch per
+op and a full write and read of every intermediate tensor. This pass rewrites
+the op list before stage generation:
+
+- convolution + bias add + residual add + activation -> one convolution with
+  "bias_add", "residual" and "fused_activation_function" params
+- normalization + activation -> one normalization
+- chains of elementwise ops -> one ELEMENTWISE_BINARY / ELEMENTWISE_UNARY op
+  whose "chain" param lists the steps for elementwise_binary/unary.comp
+
+An op is only absorbed into its producer when it is the sole consumer of the
+producer's output and that output is not a graph output.
+"""
+
+import numpy as np
+
+CONV_OPS = {
+    "CONV_2D",
+    "DEPTHWISE_CONV_2D",
+    "TRANSPOSE_CONV",
+    "CONV_3D",
+    "FULLY_CONNECTED",
+}
+# Builtin normalizations plus the custom-op names converters emit
+NORM_OPS = {
+    "L2_NORMALIZATION",
+    "LOCAL_RESPONSE_NORMALIZATION",
+    "INSTANCE_NORM",
+    "LAYER_NORM",
+    "BATCH_NORM",
+}
+# Standalone ops expressible as a fused_activation_function value
+ACTIVATION_OPS = {"RELU", "RELU6", "RELU_N1_TO_1", "TANH"}
+UNARY_OPS = ACTIVATION_OPS | {
+    "ABS",
+    "CEIL",
+    "EXP",
+    "FLOOR",
+    "HARD_SWISH",
+    "LEAKY_RELU",
+    "LOG",
+    "LOGISTIC",
+    "NEG",
+    "RSQRT",
+    "SIN",
+    "SQRT",
+    "SQUARE",
+}
+BINARY_OPS = {
+    "ADD",
+    "SUB",
+    "MUL",
+    "DIV",
+    "MAXIMUM",
+    "MINIMUM",
+    "POW",
+    "SQUARED_DIFFERENCE",
+}
+
+
+def tensor_bytes(tensor):
+    """Size of a tensor in bytes (float32 when the type is unknown)"""
+    itemsize = np.dtype(tensor["dtype"]).itemsize if tensor.get("dtype") else 4
+    return int(np.prod(tensor.get("shape") or [1])) * itemsize
+
+
+class _Graph:
+    def __init__(self, operations, tensors, constants, graph_outputs):
+        self.operations = operations
+        self.tensors = tensors
+        self.constants = set(constants)
+        self.graph_outputs = set(graph_outputs)
+        self.consumers = {}
+        for position, op in enumerate(operations):
+            for tensor in op.get("inputs", []):
+                if tensor >= 0:
+                    self.consumers.setdefault(tensor, []).append(position)
+
+    def sole_consumer(self, tensor, absorbed):
+        """Position of the only op reading `tensor`, if it may be fused into its producer"""
+        consumers = set(self.consumers.get(tensor, []))
+        if len(consumers) != 1 or tensor in self.graph_outputs:
+            return None
+        position = consumers.pop()
+        return None if position in absorbed else position
+
+    def same_shape(self, a, b):
+        return list(self.tensors[a].get("shape", [])) == list(
+            self.tensors[b].get("shape", [])
+        )
+
+
+def _other_input(op, tensor):
+    """The operand of a binary op that is not `tensor`, or None"""
+    inputs = [t for t in op.get("inputs", []) if t >= 0]
+    if len(inputs) != 2 or tensor not in inputs or inputs[0] == inputs[1]:
+        return None
+    return inputs[1] if inputs[0] == tensor else inputs[0]
+
+
+def _activation(op):
+    return op.get("params", {}).get("fused_activation_function", "NONE")
+
+
+def _fuse_conv(graph, position, absorbed):
+    """Grow conv -> [bias add] -> [residual add] -> [activation]"""
+    op = graph.operations[position]
+    fused = dict(op, params=dict(op.get("params", {})), inputs=list(op["inputs"]))
+    members = [position]
+    output = op["outputs"][0]
+    while _activation(fused) == "NONE":
+        consumer = graph.sole_consumer(output, absorbed)
+        if consumer is None:
+            break
+        nxt = graph.operations[consumer]
+        other = _other_input(nxt, output) if nxt["type"] == "ADD" else None
+        if (
+            other is not None
+            and other in graph.constants
+            and "bias_add" not in fused["params"]
+        ):
+            fused["params"]["bias_add"] = other
+        elif (
+            other is not None
+            and other not in graph.constants
+            and "residual" not in fused["params"]
+            and graph.same_shape(other, nxt["outputs"][0])
+        ):
+            fused["params"]["residual"] = other
+        elif nxt["type"] in ACTIVATION_OPS:
+            pass
+        else:
+            break
+        if other is not None:
+            fused["inputs"].append(other)
+            activation = _activation(nxt)
+        else:
+            activation = nxt["type"]
+        fused["params"]["fused_activation_function"] = activation
+        members.append(consumer)
+        output = nxt["outputs"][0]
+    return fused, members
+
+
+def _fuse_norm(graph, position, absorbed):
+    op = graph.operations[position]
+    fused = dict(op, params=dict(op.get("params", {})))
+    members = [position]
+    output = op["outputs"][0]
+    consumer = graph.sole_consumer(output, absorbed)
+    if (
+        consumer is not None
+        and _activation(fused) == "NONE"
+        and graph.operations[consumer]["type"] in ACTIVATION_OPS
+    ):
+        fused["params"]["fused_activation_function"] = graph.operations[consumer][
+            "type"
+        ]
+        members.append(consumer)
+    return fused, members
+
+
+def _fuse_elementwise(graph, position, absorbed):
+    op = graph.operations[position]
+    members = [position]
+    inputs = [t for t in op.get("inputs", []) if t >= 0]
+    chain = [{"op": op["type"], "fused_activation_function": _activation(op)}]
+    output = op["outputs"][0]
+    while True:
+        consumer = graph.sole_consumer(output, absorbed)
+        if consumer is None:
+            break
+        nxt = graph.operations[consumer]
+        if nxt["type"] in UNARY_OPS:
+            step = {"op": nxt["type"]}
+        elif nxt["type"] in BINARY_OPS:
+            other = _other_input(nxt, output)
+            if other is None:
+                break
+            # The running value is operand 0 unless it is the right-hand side
+            step = {
+                "op": nxt["type"],
+                "operand": other,
+                "swap": nxt["inputs"][0] == other,
+            }
+            inputs.append(other)
+        else:
+            break
+        step["fused_activation_function"] = _activation(nxt)
+        chain.append(step)
+        members.append(consumer)
+        output = nxt["outputs"][0]
+
+    if len(members) == 1:
+        return op, members
+    binary = any(graph.operations[m]["type"] in BINARY_OPS for m in members)
+    fused = {
+        "index": op["index"],
+        "type": "ELEMENTWISE_BINARY" if binary else "ELEMENTWISE_UNARY",
+        "name": graph.operations[members[-1]]["name"],
+        "inputs": inputs,
+        "outputs": [output],
+        "params": {"chain": chain},
+    }
+    return fused, members
+
+
+def fuse_operations(operations, tensors, constants=(), graph_outputs=()):
+    """
+    Rewrite an op list with fused operators.
+
+    Parameters
+    ----------
+    operations : 'list'
+        Analyzer op dicts (type, name, inputs, outputs, params) in
+        topological order.
+    tensors : 'list'
+        Tensor dicts with shape and dtype, indexed by tensor id.
+    constants : 'set'
+        Tensor ids backed by constant data (weights, biases).
+    graph_outputs : 'list'
+        Tensor ids read after the graph, never fused away.
+
+    Returns
+    -------
+    'tuple'
+        (fused op list, report). Fused ops carry a "fused" list with the
+        names of the ops they replace and are placed at the position of the
+        last of them, so operands produced in between stay available.
+    """
+    graph = _Graph(operations, tensors, constants, graph_outputs)
+    absorbed = set()
+    groups = {}
+    saved_bytes = 0
+    patterns = {}
+
+    for position, op in enumerate(operations):
+        if position in absorbed:
+            continue
+        if op["type"] in CONV_OPS and op.get("outputs"):
+            fused, members = _fuse_conv(graph, position, absorbed)
+        elif op["type"] in NORM_OPS and op.get("outputs"):
+            fused, members = _fuse_norm(graph, position, absorbed)
+        elif op["type"] in UNARY_OPS | BINARY_OPS and op.get("outputs"):
+            fused, members = _fuse_elementwise(graph, position, absorbed)
+        else:
+            continue
+        if len(members) == 1:
+            continue
+
+        fused["outputs"] = list(operations[members[-1]]["outputs"])
+        fused["name"] = operations[members[-1]]["name"]
+        fused["fused"] = [operations[m]["name"] for m in members]
+        absorbed.update(members)
+        groups[members[-1]] = fused
+        for member in members[:-1]:
+            saved_bytes += 2 * tensor_bytes(tensors[operations[member]["outputs"][0]])
+        pattern = "+".join(operations[m]["type"] for m in members)
+        patterns[pattern] = patterns.get(pattern, 0) + 1
+
+    fused_ops = []
+    for position, op in enumerate(operations):
+        if position in groups:
+            fused_ops.append(groups[position])
+        elif position not in absorbed:
+            fused_ops.append(op)
+
+    report = {
+        "operations_before": len(operations),
+        "operations_after": len(fused_ops),
+        "dispatches_saved": len(operations) - len(fused_ops),
+        "intermediate_bytes_saved": saved_bytes,
+        "patterns": patterns,
+    }
+    return fused_ops, report
+
+
+def print_report(report):
+    """Print the dispatches and intermediate traffic removed by fusion"""
+    print("Operator fusion:")
+    print(
+        f"  Operations: {report['operations_before']} -> {report['operations_after']}"
+        f" ({report['dispatches_saved']} dispatches saved)"
+    )
+    print(
+        f"  Intermediate traffic saved: "
+        f"{report['intermediate_bytes_saved'] / 1024 / 1024:.2f} MB per inference"
+    )
+    for pattern, count in sorted(report["patterns"].items()):
+        print(f"  {pattern}: {count}")
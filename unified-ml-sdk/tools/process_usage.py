@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Host-side resource accounting of scenario-runner processes
+
+run_measured() runs a command to completion and returns its resource usage
+from os.wait4(): user/sys CPU time, peak RSS, major/minor page faults and
+voluntary/involuntary context switches. On Linux it also returns the bytes
+read and written from /proc/<pid>/io. The child is waited for with
+WNOWAIT first, so its io counters can still be read before it is reaped.
+
+Long-lived session processes never exit between runs. For these,
+ProcessSampler takes the difference of the same counters in /proc before and
+after a run. CPU times then have clock-tick resolution (usually 10 ms),
+and peak RSS is the peak of the process so far. Outside Linux,
+ProcessSampler returns no usage.
+
+Usage dicts use the keys of USAGE_FIELDS; fields the platform cannot
+provide are left out.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+
+USAGE_FIELDS = (
+    "user_cpu_ms",
+    "sys_cpu_ms",
+    "max_rss_mb",
+    "major_faults",
+    "minor_faults",
+    "voluntary_switches",
+    "involuntary_switches",
+    "read_bytes",
+    "write_bytes",
+    "rchar",
+    "wchar",
+)
+# Fields that are not summed over runs
+PEAK_FIELDS = ("max_rss_mb",)
+_IO_FIELDS = ("read_bytes", "write_bytes", "rchar", "wchar")
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def _read_proc_io(pid):
+    """Counters of /proc/<pid>/io, or {} where unavailable"""
+    try:
+        with open(f"/proc/{pid}/io") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return {}
+    return {name: int(fields[name]) for name in _IO_FIELDS if name in fields}
+
+
+def rusage_usage(rusage):
+    """Usage dict of a resource.struct_rusage"""
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    rss_scale = 1 / (1 << 20) if sys.platform == "darwin" else 1 / (1 << 10)
+    return {
+        "user_cpu_ms": rusage.ru_utime * 1000,
+        "sys_cpu_ms": rusage.ru_stime * 1000,
+        "max_rss_mb": rusage.ru_maxrss * rss_scale,
+        "major_faults": rusage.ru_majflt,
+        "minor_faults": rusage.ru_minflt,
+        "voluntary_switches": rusage.ru_nvcsw,
+        "involuntary_switches": rusage.ru_nivcsw,
+    }
+
+
+def run_measured(cmd, env=None, preexec_fn=None, text=True):
+    """
+    Run a command like subprocess.run(cmd, capture_output=True), measuring
+    the child's resource usage.
+
+    Returns
+    -------
+    'tuple'
+        (subprocess.CompletedProcess, usage dict)
+    """
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env,
+        text=text,
+        preexec_fn=preexec_fn,
+    )
+    output = {}
+
+    def drain(name, stream):
+        output[name] = stream.read()
+        stream.close()
+
+    readers = [
+        threading.Thread(target=drain, args=("stdout", process.stdout)),
+        threading.Thread(target=drain, args=("stderr", process.stderr)),
+    ]
+    for reader in readers:
+        reader.start()
+
+    io = {}
+    if hasattr(os, "waitid"):
+        # Wait without reaping, so /proc/<pid>/io is still there
+        os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+        io = _read_proc_io(process.pid)
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    for reader in readers:
+        reader.join()
+
+    usage = rusage_usage(rusage)
+    usage.update(io)
+    return (
+        subprocess.CompletedProcess(
+            cmd, process.returncode, output["stdout"], output["stderr"]
+        ),
+        usage,
+    )
+
+
+class ProcessSampler:
+    """
+    Resource usage of a running process between two points in time.
+
+    Parameters
+    ----------
+    pid : 'int'
+        Process to sample.
+    """
+
+    def __init__(self, pid):
+        self.pid = pid
+
+    def snapshot(self):
+        """Cumulative counters of the process, {} where /proc is unavailable"""
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                # The command name may contain spaces, fields follow its ")"
+                stat = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{self.pid}/status") as f:
+                status = dict(line.split(":", 1) for line in f if ":" in line)
+        except OSError:
+            return {}
+        counters = {
+            "minor_faults": int(stat[7]),
+            "major_faults": int(stat[9]),
+            "user_cpu_ms": int(stat[11]) * 1000 / _CLOCK_TICKS,
+            "sys_cpu_ms": int(stat[12]) * 1000 / _CLOCK_TICKS,
+            "voluntary_switches": int(status["voluntary_ctxt_switches"]),
+            "involuntary_switches": int(status["nonvoluntary_ctxt_switches"]),
+        }
+        if "VmHWM" in status:
+            counters["max_rss_mb"] = int(status["VmHWM"].split()[0]) / 1024
+        counters.update(_read_proc_io(self.pid))
+        return counters
+
+    @staticmethod
+    def delta(before, after):
+        """Usage between two snapshots"""
+        usage = {}
+        for name, value in after.items():
+            if name in PEAK_FIELDS:
+                usage[name] = value
+            elif name in before:
+                usage[name] = value - before[name]
+        return usage
+
+
+def split_usage(usage, runs):
+    """Per-run share of the usage of several runs; peak fields are kept"""
+    if not usage or runs <= 1:
+        return dict(usage)
+    return {
+        name: value if name in PEAK_FIELDS else value / runs
+        for name, value in usage.items()
+    }
+
+
+def mean_usage(usages):
+    """Mean usage per run of several usage dicts; the peak of peak fields"""
+    usages = [usage for usage in usages if usage]
+    if not usages:
+        return {}
+    summary = {}
+    for name in USAGE_FIELDS:
+        values = [usage[name] for usage in usages if name in usage]
+        if values:
+            summary[name] = (
+                max(values) if name in PEAK_FIELDS else sum(values) / len(values)
+            )
+    return summary
@@ -1,45 +1,287 @@
 #!/usr/bin/env python3
-"""Performance profiler for ML operations"""
+"""Performance profiler for ML operations
 
-import subprocess
-import time
+Every run passes --profiling-dump-path to the scenario runner and streams the
+dump into a per-command timeline: dispatch, barrier and transfer time per
+run, per-shader statistics across runs and the N hottest dispatches. The
+timeline can be exported as Chrome trace_event JSON for Perfetto or
+chrome://tracing. Dumps are never loaded whole, so long recordings work.
+Each run also records the runner's host resource usage (see
+process_usage.py).
+"""
+
+import argparse
+import heapq
 import json
-import matplotlib.pyplot as plt
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(__file__))
+from process_usage import run_measured
+from profiling_dump import command_category, iter_dump
+
+SCENARIO_RUNNER = os.environ.get("SCENARIO_RUNNER", "../bin/scenario-runner")
+CATEGORIES = ("dispatch", "barrier", "transfer", "other")
+
+
+class ChromeTraceWriter:
+    """
+    Streams complete ("X") trace events into a Chrome trace_event file.
+
+    Each operation is a process and each command category a thread, so
+    Perfetto shows one track per category. Successive runs are laid out one
+    after the other on the time axis.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "w")
+        self.file.write('{"displayTimeUnit": "ns", "traceEvents": [\n')
+        self.first = True
+        self.processes = {}
+        self.offset_us = 0.0
+
+    def _write(self, event):
+        if not self.first:
+            self.file.write(",\n")
+        self.first = False
+        self.file.write(json.dumps(event))
+
+    def _pid(self, operation):
+        if operation not in self.processes:
+            pid = self.processes[operation] = len(self.processes) + 1
+            self._write({"ph": "M", "name": "process_name", "pid": pid, "tid": 0,
+                         "args": {"name": operation}})
+            for tid, category in enumerate(CATEGORIES):
+                self._write({"ph": "M", "name": "thread_name", "pid": pid, "tid": tid,
+                             "args": {"name": category}})
+        return self.processes[operation]
+
+    def add_run(self, operation, run, records):
+        """Write the records of one run; returns nothing, records are consumed"""
+        pid = self._pid(operation)
+        base = None
+        end_us = self.offset_us
+        for record in records:
+            base = record["start_ns"] if base is None else base
+            ts = self.offset_us + (record["start_ns"] - base) / 1e3
+            dur = (record["end_ns"] - record["start_ns"]) / 1e3
+            self._write({
+                "ph": "X", "name": record["name"], "cat": record["category"],
+                "pid": pid, "tid": CATEGORIES.index(record["category"]),
+                "ts": ts, "dur": dur,
+                "args": {"run": run, "index": record["index"], "type": record["type"]},
+            })
+            end_us = max(end_us, ts + dur)
+        # Leave a gap between runs
+        self.offset_us = end_us + 100.0
+
+    def close(self):
+        self.file.write("\n]}\n")
+        self.file.close()
+
+
+class DumpAggregator:
+    """
+    Per-shader statistics over any number of dumps, plus the top-N
+    longest dispatches. Memory does not grow with the dump
+    size: records are folded into running sums and a bounded heap.
+
+    Parameters
+    ----------
+    top : 'int'
+        Number of hottest dispatches to keep.
+    """
+
+    def __init__(self, top=10):
+        self.top = top
+        self.shaders = {}
+        self.hottest = []
+        self._sequence = 0
+
+    def add(self, operation, run, record):
+        if record["category"] == "dispatch":
+            stats = self.shaders.setdefault(record["name"], {
+                "shader": record["name"], "count": 0, "total_ms": 0.0,
+                "min_ms": float("inf"), "max_ms": 0.0, "operations": set(),
+            })
+            stats["count"] += 1
+            stats["total_ms"] += record["time_ms"]
+            stats["min_ms"] = min(stats["min_ms"], record["time_ms"])
+            stats["max_ms"] = max(stats["max_ms"], record["time_ms"])
+            stats["operations"].add(operation)
+
+            self._sequence += 1
+            entry = (record["time_ms"], self._sequence,
+                     {"operation": operation, "run": run, "index": record["index"],
+                      "shader": record["name"], "time_ms": record["time_ms"]})
+            if len(self.hottest) < self.top:
+                heapq.heappush(self.hottest, entry)
+            elif entry[0] > self.hottest[0][0]:
+                heapq.heapreplace(self.hottest, entry)
+
+    def shader_table(self):
+        rows = []
+        for stats in self.shaders.values():
+            rows.append(dict(stats, mean_ms=stats["total_ms"] / stats["count"],
+                             operations=sorted(stats["operations"])))
+        return sorted(rows, key=lambda r: -r["total_ms"])
+
+    def hottest_dispatches(self):
+        return [entry for _, _, entry in sorted(self.hottest, key=lambda e: (-e[0], e[1]))]
+
+
+def timeline(dump_path):
+    """Stream a dump as records with a "category" field, see command_category()"""
+    for record in iter_dump(dump_path):
+        record["category"] = command_category(record)
+        yield record
+
 
 class VulkanProfiler:
-    def __init__(self):
+    """
+    Profiles scenarios through their profiling dumps.
+
+    Parameters
+    ----------
+    runner : 'str'
+        Path to the scenario runner.
+    output_dir : 'str'
+        Folder for outputs and profiling dumps.
+    top : 'int'
+        Number of hottest dispatches to report.
+    trace_path : 'str'
+        Chrome trace_event file to write, or None.
+    """
+
+    def __init__(self, runner=SCENARIO_RUNNER, output_dir=".", top=10, trace_path=None):
+        self.runner = runner
+        self.output_dir = output_dir
         self.metrics = []
-    
-    def profile_operation(self, scenario_path, name):
-        """Profile a single operation"""
-        start = time.perf_counter()
-        
-        # Run scenario
-        result = subprocess.run([
-            "../bin/scenario-runner",
-            "--scenario", scenario_path,
-            "--output", ".",
-            "--profiling-dump-path", f"profile_{name}.json"
-        ], capture_output=True, env={"DYLD_LIBRARY_PATH": "/usr/local/lib"})
-        
-        end = time.perf_counter()
-        
-        self.metrics.append({
-            "name": name,
-            "time_ms": (end - start) * 1000,
-            "status": "success" if result.returncode == 0 else "failed"
-        })
-    
-    def generate_report(self):
+        self.aggregator = DumpAggregator(top)
+        self.trace = ChromeTraceWriter(trace_path) if trace_path else None
+
+    def profile_operation(self, scenario_path, name, runs=1):
+        """Profile a single operation over one or more runs"""
+        for run in range(runs):
+            dump = os.path.join(self.output_dir, f"profile_{name}_{run}.json")
+            if os.path.exists(dump):
+                os.unlink(dump)
+            start = time.perf_counter()
+
+            # Run scenario
+            result, usage = run_measured([
+                self.runner,
+                "--scenario", scenario_path,
+                "--output", self.output_dir,
+                "--profiling-dump-path", dump
+            ], env=dict(os.environ, DYLD_LIBRARY_PATH="/usr/local/lib"))
+
+            end = time.perf_counter()
+
+            metric = {
+                "name": name,
+                "run": run,
+                "time_ms": (end - start) * 1000,
+                "status": "success" if result.returncode == 0 else "failed",
+                "usage": usage,
+            }
+            if result.returncode == 0 and os.path.exists(dump):
+                metric.update(self.ingest_dump(dump, name, run))
+            self.metrics.append(metric)
+
+    def ingest_dump(self, dump_path, name, run=0):
+        """
+        Fold one dump into the per-shader statistics and the trace.
+
+        Returns
+        -------
+        'dict'
+            Number of records, time per category and the device span (first
+            start to last end) of the run, in ms.
+        """
+        summary = {"records": 0, "span_ms": 0.0}
+        summary.update({f"{c}_ms": 0.0 for c in CATEGORIES})
+        first = last = None
+
+        def fold(records):
+            nonlocal first, last
+            for record in records:
+                summary["records"] += 1
+                summary[f"{record['category']}_ms"] += record["time_ms"]
+                first = record["start_ns"] if first is None else min(first, record["start_ns"])
+                last = record["end_ns"] if last is None else max(last, record["end_ns"])
+                self.aggregator.add(name, run, record)
+                yield record
+
+        records = fold(timeline(dump_path))
+        if self.trace:
+            self.trace.add_run(name, run, records)
+        else:
+            for _ in records:
+                pass
+        if first is not None:
+            summary["span_ms"] = (last - first) / 1e6
+        return summary
+
+    def close(self):
+        if self.trace:
+            self.trace.close()
+
+    def generate_report(self, plot_path=None):
         """Generate performance report"""
         print("\n=== Performance Report ===")
+        print(f"{'Operation':<16} {'Run':>3} {'Wall ms':>9} {'Span ms':>9} "
+              f"{'Dispatch':>9} {'Barrier':>9} {'Transfer':>9}  Status")
         for metric in self.metrics:
-            print(f"{metric['name']}: {metric['time_ms']:.2f} ms ({metric['status']})")
-        
+            device = "".join(f" {metric[f'{c}_ms']:>9.3f}" for c in ("span", "dispatch", "barrier", "transfer")
+                             ) if "records" in metric else f" {'-':>9}" * 4
+            wall = f"{metric['time_ms']:>9.2f}" if metric["time_ms"] is not None else f"{'-':>9}"
+            print(f"{metric['name']:<16} {metric['run']:>3} {wall}{device}  "
+                  f"{metric['status']}")
+
+        measured = [metric for metric in self.metrics if metric.get("usage")]
+        if measured:
+            print("\n=== Host usage per run ===")
+            print(f"{'Operation':<16} {'Run':>3} {'User ms':>9} {'Sys ms':>9} {'RSS MB':>8} "
+                  f"{'Faults':>8} {'Ctx sw':>7} {'Read KB':>9} {'Write KB':>9}")
+            for metric in measured:
+                usage = metric["usage"]
+                io = [f"{usage[k] / 1024:>9.1f}" if k in usage else f"{'-':>9}"
+                      for k in ("rchar", "wchar")]
+                print(f"{metric['name']:<16} {metric['run']:>3} {usage['user_cpu_ms']:>9.1f} "
+                      f"{usage['sys_cpu_ms']:>9.1f} {usage['max_rss_mb']:>8.1f} "
+                      f"{usage['major_faults'] + usage['minor_faults']:>8d} "
+                      f"{usage['voluntary_switches'] + usage['involuntary_switches']:>7d} {' '.join(io)}")
+
+        shaders = self.aggregator.shader_table()
+        if shaders:
+            print("\n=== Dispatch time per shader ===")
+            print(f"{'Shader':<28} {'Count':>6} {'Total ms':>10} {'Mean ms':>9} {'Min ms':>9} {'Max ms':>9}")
+            for row in shaders:
+                print(f"{row['shader']:<28} {row['count']:>6} {row['total_ms']:>10.3f} "
+                      f"{row['mean_ms']:>9.3f} {row['min_ms']:>9.3f} {row['max_ms']:>9.3f}")
+
+        hottest = self.aggregator.hottest_dispatches()
+        if hottest:
+            print(f"\n=== Top {len(hottest)} hottest dispatches ===")
+            for rank, entry in enumerate(hottest, 1):
+                print(f"{rank:>3}. {entry['time_ms']:>9.3f} ms  {entry['shader']:<28} "
+                      f"{entry['operation']} run {entry['run']} command {entry['index']}")
+
+        if plot_path:
+            self.plot(plot_path)
+
+    def plot(self, path):
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+
         # Create visualization
-        names = [m['name'] for m in self.metrics if m['status'] == 'success']
-        times = [m['time_ms'] for m in self.metrics if m['status'] == 'success']
-        
+        measured = [m for m in self.metrics if m['status'] == 'success']
+        names = [f"{m['name']}#{m['run']}" for m in measured]
+        times = [m['time_ms'] for m in measured]
+
         if names:
             plt.figure(figsize=(10, 6))
             plt.bar(names, times)
@@ -48,21 +290,54 @@ class VulkanProfiler:
             plt.title('ML Operation Performance on Apple Silicon')
             plt.xticks(rotation=45)
             plt.tight_layout()
-            plt.savefig('performance_report.png')
-            print("\nVisualization saved to performance_report.png")
+            plt.savefig(path)
+            print(f"\nVisualization saved to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile scenarios through their profiling dumps")
+    parser.add_argument("--scenario", action="append", metavar="NAME=PATH",
+                        help="Scenario to profile (repeatable); defaults to the ML op test scenarios")
+    parser.add_argument("--dump", action="append", metavar="[NAME=]PATH",
+                        help="Analyze an existing profiling dump instead of running (repeatable)")
+    parser.add_argument("--runs", type=int, default=1, help="Runs per scenario")
+    parser.add_argument("--top", type=int, default=10, help="Number of hottest dispatches to list")
+    parser.add_argument("--trace", help="Write a Chrome trace_event JSON file")
+    parser.add_argument("--output-dir", default=".", help="Folder for outputs and dumps")
+    parser.add_argument("--runner", default=SCENARIO_RUNNER, help="Scenario runner binary")
+    parser.add_argument("--plot", help="Save a bar chart of the wall times")
+    args = parser.parse_args()
+
+    profiler = VulkanProfiler(args.runner, args.output_dir, args.top, args.trace)
+    try:
+        if args.dump:
+            for run, spec in enumerate(args.dump):
+                name, _, path = spec.rpartition("=")
+                summary = profiler.ingest_dump(path, name or os.path.basename(path), run)
+                profiler.metrics.append(dict(summary, name=name or os.path.basename(path),
+                                             run=run, time_ms=None, status="dump"))
+        else:
+            # Profile different operations
+            operations = [
+                ("conv2d", "../scenarios/conv2d_test.json"),
+                ("matmul", "../scenarios/matmul_test.json"),
+                ("pooling", "../scenarios/pooling_test.json")
+            ]
+            if args.scenario:
+                operations = [tuple(spec.split("=", 1)) for spec in args.scenario]
+
+            for name, scenario in operations:
+                if os.path.exists(scenario):
+                    profiler.profile_operation(scenario, name, args.runs)
+                else:
+                    print(f"Skipping {name}: {scenario} not found")
+    finally:
+        profiler.close()
+
+    profiler.generate_report(args.plot)
+    if args.trace:
+        print(f"\nChrome trace written to {args.trace} (open in https://ui.perfetto.dev)")
+
 
 if __name__ == "__main__":
-    profiler = VulkanProfiler()
-    
-    # Profile different operations
-    operations = [
-        ("conv2d", "../scenarios/conv2d_test.json"),
-        ("matmul", "../scenarios/matmul_test.json"),
-        ("pooling", "../scenarios/pooling_test.json")
-    ]
-    
-    for name, scenario in operations:
-        if os.path.exists(scenario):
-            profiler.profile_operation(scenario, name)
-    
-    profiler.generate_report()
+    main()
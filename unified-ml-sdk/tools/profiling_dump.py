@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Reader for scenario-runner profiling dumps (--profiling-dump-path)
+
+The dump holds one timestamped record per recorded command. Records are
+normalized to:
+
+    {"index": <command index>, "type": "dispatch_compute" | ..., "name": <shader
+     or command name>, "start_ns": .., "end_ns": .., "time_ms": ..}
+
+Accepted layouts are a JSON object with the record list under "commands",
+"timestamps", "events", "dispatches" or "traceEvents", a bare JSON list, or
+JSON lines. Record times may be given as start/end pairs (nanoseconds unless
+the dump declares "unit"), a "timestamps" pair, Chrome trace "ts"/"dur"
+(microseconds) or a duration field (duration_ns, duration_us, duration_ms,
+time_ms). Dumps are streamed: only one read chunk and one record are held in
+memory at a time, so a "unit" field has to precede the record list.
+numpy_scenario_runner.py writes the canonical form:
+
+    {"version": 1, "unit": "ns", "commands": [{"index": 0,
+     "type": "dispatch_compute", "name": "matmul", "start_ns": .., "end_ns": ..}]}
+"""
+
+import json
+import re
+
+RECORD_LISTS = ("commands", "timestamps", "events", "dispatches", "traceEvents")
+READ_CHUNK = 1 << 20
+_RECORD_LIST_START = re.compile(r'"(%s)"\s*:\s*\[' % "|".join(RECORD_LISTS))
+_UNIT = re.compile(r'"unit"\s*:\s*"(\w+)"')
+UNIT_NS = {"ns": 1, "us": 1e3, "ms": 1e6, "s": 1e9}
+DURATION_FIELDS = {
+    "duration_ns": 1,
+    "duration_us": 1e3,
+    "duration_ms": 1e6,
+    "time_ms": 1e6,
+}
+
+
+def _records(document):
+    """The record list and time unit of a parsed dump"""
+    if isinstance(document, list):
+        return document, "ns"
+    unit = document.get("unit", "ns")
+    for key in RECORD_LISTS:
+        if isinstance(document.get(key), list):
+            return document[key], "us" if key == "traceEvents" else unit
+    return [document], unit
+
+
+def normalize_record(record, index, unit="ns"):
+    """One dump record in the normalized form, or None when it has no timing"""
+    scale = UNIT_NS.get(unit, 1)
+    kind = (
+        record.get("type")
+        or record.get("command")
+        or record.get("cat")
+        or record.get("kind")
+    )
+    name = (
+        record.get("name") or record.get("shader") or record.get("shader_ref") or kind
+    )
+    start = end = None
+    if "start_ns" in record and "end_ns" in record:
+        start, end = record["start_ns"], record["end_ns"]
+    elif "start" in record and "end" in record:
+        start, end = record["start"] * scale, record["end"] * scale
+    elif isinstance(record.get("timestamps"), list) and len(record["timestamps"]) == 2:
+        start, end = (t * scale for t in record["timestamps"])
+    elif "ts" in record and "dur" in record:
+        # Chrome trace event, microseconds
+        start = record["ts"] * 1e3
+        end = start + record["dur"] * 1e3
+    else:
+        for field, field_scale in DURATION_FIELDS.items():
+            if field in record:
+                start, end = 0, record[field] * field_scale
+                break
+    if start is None:
+        return None
+    return {
+        "index": record.get("index", index),
+        "type": kind or "command",
+        "name": name or "command",
+        "start_ns": start,
+        "end_ns": end,
+        "time_ms": (end - start) / 1e6,
+    }
+
+
+def _array_items(f, buf, pos):
+    """Yield the elements of the JSON array whose "[" ends at buf[pos - 1]"""
+    decoder = json.JSONDecoder()
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos == len(buf):
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                raise ValueError("Unterminated record list")
+            buf, pos = chunk, 0
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # Record cut by the chunk boundary
+            chunk = f.read(READ_CHUNK)
+            if not chunk:
+                raise
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield item
+        pos = end
+
+
+def _raw_records(f):
+    """Yield (record, unit) pairs of a dump file without loading it whole"""
+    head = f.read(READ_CHUNK)
+    stripped = head.lstrip()
+    if stripped.startswith("["):
+        yield from ((item, "ns") for item in _array_items(f, head, head.index("[") + 1))
+        return
+
+    # JSON lines: every line a record, or a document of its own
+    first_line = head.split("\n", 1)[0]
+    try:
+        first = json.loads(first_line)
+    except json.JSONDecodeError:
+        first = None
+    if isinstance(first, dict) and "\n" in head.strip():
+        f.seek(0)
+        for line in f:
+            if line.strip():
+                document = json.loads(line)
+                entries, unit = _records(document)
+                yield from ((entry, unit) for entry in entries)
+        return
+
+    # One JSON object: find the record list, keeping only the text before it
+    buf = head
+    while True:
+        match = _RECORD_LIST_START.search(buf)
+        if match:
+            break
+        chunk = f.read(READ_CHUNK)
+        if not chunk:
+            # No record list: the document is a single record
+            entries, unit = _records(json.loads(buf))
+            yield from ((entry, unit) for entry in entries)
+            return
+        buf += chunk
+    unit = _UNIT.search(buf, 0, match.start())
+    unit = (
+        "us" if match.group(1) == "traceEvents" else (unit.group(1) if unit else "ns")
+    )
+    yield from ((item, unit) for item in _array_items(f, buf, match.end()))
+
+
+def iter_dump(path):
+    """Timed records of a profiling dump in file order, streamed"""
+    with open(path) as f:
+        index = 0
+        for entry, unit in _raw_records(f):
+            record = (
+                normalize_record(entry, index, unit)
+                if isinstance(entry, dict)
+                else None
+            )
+            if record is not None:
+                yield record
+                index += 1
+
+
+def read_dump(path):
+    """All timed records of a profiling dump, in file order"""
+    return list(iter_dump(path))
+
+
+def command_category(record):
+    """Timeline category of a record: dispatch, barrier, transfer or other"""
+    kind = f"{record['type']} {record['name']}".lower()
+    if "dispatch" in kind and "barrier" not in kind:
+        return "dispatch"
+    if "barrier" in kind or "boundary" in kind:
+        return "barrier"
+    if any(
+        word in kind
+        for word in ("copy", "transfer", "upload", "download", "write", "read", "fill")
+    ):
+        return "transfer"
+    return "other"
+
+
+def is_dispatch(record):
+    return command_category(record) == "dispatch" or record["type"] == "command"
+
+
+def read_dispatches(path):
+    """Dispatch records of a profiling dump, in the form of session run dispatches"""
+    return [
+        {
+            "index": r["index"],
+            "shader": r["name"],
+            "time_ms": r["time_ms"],
+            "start_ns": r["start_ns"],
+            "end_ns": r["end_ns"],
+        }
+        for r in iter_dump(path)
+        if is_dispatch(r)
+    ]
@@ -1,21 +1,75 @@
 #!/usr/bin/env python3
 """
 Real-time performance monitoring for Vulkan ML workloads
+
+Memory use is constant however long the monitor runs: the latest samples
+are kept in a ring buffer and the statistics, including p50/p95/p99/p999,
+come from streaming estimators (see streaming_stats.py). Each metric also
+carries the runner's host resource usage for the run (see process_usage.py).
+
+With --concurrency K the monitor runs a closed-loop scaling sweep instead:
+for N = 1..K, N workers each keep one request in flight against their own
+runner session. Every level reports aggregate throughput and per-request
+latency percentiles, and the sweep reports the knee, the concurrency beyond
+which extra workers stop adding throughput.
 """
 
-import subprocess
+import contextlib
 import time
 import threading
 import queue
 import json
+import math
+import os
 import sys
 from datetime import datetime
 
+from process_usage import PEAK_FIELDS, USAGE_FIELDS
+from scenario_session import open_session
+from streaming_stats import (DEFAULT_QUANTILES, DDSketch, RingBuffer, RunningStats, quantile_label,
+                             sample_dtype)
+
+SCENARIO_RUNNER = os.environ.get("SCENARIO_RUNNER", "../bin/scenario-runner")
+OUTPUT_DIR = "/tmp/vulkan_output"
+
 class VulkanPerformanceMonitor:
-    def __init__(self):
+    def __init__(self, capacity=4096, relative_accuracy=0.01):
         self.metrics_queue = queue.Queue()
         self.monitoring = False
-        self.metrics_history = []
+        # Latest samples only; statistics cover the whole run
+        self.recent = RingBuffer(capacity, sample_dtype(USAGE_FIELDS))
+        self.latency = DDSketch(relative_accuracy)
+        self.stats = RunningStats()
+        self.usage_totals = {}
+        self.usage_runs = 0
+        self.total_iterations = 0
+        self.lock = threading.Lock()
+    
+    def _open_session(self, scenario_path, output_dir):
+        """Start a runner session and load the scenario, returning (session, handle)"""
+        env = {**os.environ, "DYLD_LIBRARY_PATH": "/usr/local/lib"}
+        session = open_session(SCENARIO_RUNNER, env, extra_args=["--quiet"])
+        try:
+            return session, session.load(scenario_path, output_dir)
+        except BaseException:
+            session.close()
+            raise
+    
+    @contextlib.contextmanager
+    def _open_sessions(self, scenario_path, count):
+        """
+        Pool of `count` sessions with the scenario loaded, each writing to its
+        own output folder, as (session, handle) pairs; opened up front so
+        process start is not measured, and closed on exit.
+        """
+        sessions = []
+        try:
+            for worker in range(count):
+                sessions.append(self._open_session(scenario_path, f"{OUTPUT_DIR}/worker{worker}"))
+            yield sessions
+        finally:
+            for session, _ in sessions:
+                session.close()
         
     def start_monitoring(self, scenario_path, duration=60):
         """Start real-time performance monitoring"""
@@ -26,6 +80,10 @@ class VulkanPerformanceMonitor:
         
         self.monitoring = True
         
+        # Keep one runner process alive for the whole run
+        self.session, self.handle = self._open_session(scenario_path, OUTPUT_DIR)
+        print(f"Timing: {self.session.timing_label} ({self.session.timing})\n")
+        
         # Start monitoring thread
         monitor_thread = threading.Thread(
             target=self._monitor_loop,
@@ -41,6 +99,7 @@ class VulkanPerformanceMonitor:
         
         self.monitoring = False
         monitor_thread.join()
+        self.session.close()
         
         # Generate report
         self._generate_report()
@@ -55,115 +114,262 @@ class VulkanPerformanceMonitor:
             
             # Run scenario and measure performance
             metric = self._run_and_measure(scenario_path, iteration)
+            self._record(metric)
             self.metrics_queue.put(metric)
-            self.metrics_history.append(metric)
             
             # Small delay between iterations
             time.sleep(0.1)
+        
+        # Let the display drain the queue and return
+        self.monitoring = False
     
+    def _record(self, metric):
+        """Add a metric to the ring buffer and the streaming statistics"""
+        with self.lock:
+            self.total_iterations += 1
+            usage = metric.get("usage") or {}
+            self.recent.append((metric["iteration"], time.time(),
+                                metric["execution_time_ms"], metric["success"],
+                                *(usage.get(name, float("nan")) for name in USAGE_FIELDS)))
+            if usage:
+                self.usage_runs += 1
+                for name, value in usage.items():
+                    total = self.usage_totals.get(name, 0)
+                    self.usage_totals[name] = max(total, value) if name in PEAK_FIELDS else total + value
+            if metric["success"]:
+                self.latency.add(metric["execution_time_ms"])
+                self.stats.add(metric["execution_time_ms"])
+            metric["p50_ms"], metric["p99_ms"] = self.latency.quantiles((0.5, 0.99))
+
     def _run_and_measure(self, scenario_path, iteration):
         """Run scenario and measure performance"""
-        start = time.perf_counter()
-        
-        # Run scenario
-        result = subprocess.run([
-            "../bin/scenario-runner",
-            "--scenario", scenario_path,
-            "--output", "/tmp/vulkan_output",
-            "--quiet"
-        ], capture_output=True, env={"DYLD_LIBRARY_PATH": "/usr/local/lib"})
-        
-        end = time.perf_counter()
+        # Run scenario in the session
+        run = self.session.run(self.handle)[0]
+        elapsed_ms = run.get(self.session.timing, run["wall_ms"])
         
         # Create metric
         metric = {
             "iteration": iteration,
             "timestamp": datetime.now().isoformat(),
-            "execution_time_ms": (end - start) * 1000,
-            "success": result.returncode == 0,
-            "fps": 1000 / ((end - start) * 1000) if (end - start) > 0 else 0
+            "execution_time_ms": elapsed_ms,
+            "success": run["success"],
+            "fps": 1000 / elapsed_ms if elapsed_ms > 0 else 0,
+            # Host-side cost of the run: CPU time, peak RSS, faults, context
+            # switches and I/O of the runner process
+            "usage": run.get("usage", {})
         }
         
-        # Parse GPU metrics if available
-        if result.returncode == 0 and result.stdout:
-            try:
-                output = result.stdout.decode()
-                # Extract metrics from output
-                if "gpu_time" in output:
-                    metric["gpu_time_ms"] = float(output.split("gpu_time:")[1].split()[0])
-                if "memory_used" in output:
-                    metric["memory_mb"] = float(output.split("memory_used:")[1].split()[0])
-            except:
-                pass
-        
         return metric
     
     def _display_metrics(self):
         """Display real-time metrics"""
-        print("Iteration | Time (ms) | FPS   | Status")
-        print("----------|-----------|-------|--------")
+        print("Iteration | Time (ms) | FPS   | p50 (ms) | p99 (ms) | Status")
+        print("----------|-----------|-------|----------|----------|--------")
         
-        while self.monitoring:
+        while self.monitoring or not self.metrics_queue.empty():
             try:
                 metric = self.metrics_queue.get(timeout=1)
                 status = "OK" if metric["success"] else "FAIL"
-                print(f"{metric['iteration']:9d} | {metric['execution_time_ms']:9.2f} | {metric['fps']:5.1f} | {status}")
+                p50, p99 = (f"{metric[k]:8.2f}" if metric[k] is not None else f"{'-':>8}"
+                            for k in ("p50_ms", "p99_ms"))
+                print(f"{metric['iteration']:9d} | {metric['execution_time_ms']:9.2f} | {metric['fps']:5.1f} | "
+                      f"{p50} | {p99} | {status}")
             except queue.Empty:
                 continue
     
     def _generate_report(self):
         """Generate performance report"""
-        if not self.metrics_history:
+        if not self.total_iterations:
             print("\nNo metrics collected")
             return
         
         print("\n=== Performance Summary ===")
         
-        # Calculate statistics
-        times = [m["execution_time_ms"] for m in self.metrics_history if m["success"]]
-        if times:
-            avg_time = sum(times) / len(times)
-            min_time = min(times)
-            max_time = max(times)
-            
-            print(f"Average execution time: {avg_time:.2f} ms")
-            print(f"Min execution time: {min_time:.2f} ms")
-            print(f"Max execution time: {max_time:.2f} ms")
-            print(f"Average FPS: {1000/avg_time:.1f}")
+        # Statistics of the whole run, from the streaming estimators
+        stats = self.stats
+        percentiles = dict(zip((quantile_label(q) for q in DEFAULT_QUANTILES),
+                               self.latency.quantiles(DEFAULT_QUANTILES)))
+        if stats.count:
+            print(f"Average execution time: {stats.mean:.2f} ms")
+            print(f"Min execution time: {stats.min:.2f} ms")
+            print(f"Max execution time: {stats.max:.2f} ms")
+            print(f"Average FPS: {1000/stats.mean:.1f}")
+            print("Percentiles: " + ", ".join(f"{name} {value:.2f} ms" for name, value in percentiles.items())
+                  + f" (±{self.latency.relative_accuracy:.0%})")
             
             # Performance consistency
-            variance = sum((t - avg_time) ** 2 for t in times) / len(times)
-            std_dev = variance ** 0.5
-            print(f"Standard deviation: {std_dev:.2f} ms")
-            print(f"Performance consistency: {100 - (std_dev/avg_time * 100):.1f}%")
+            print(f"Standard deviation: {stats.std:.2f} ms")
+            print(f"Performance consistency: {100 - (stats.std/stats.mean * 100):.1f}%")
+        
+        usage = self._mean_usage()
+        if usage:
+            print("Host usage per run: " + ", ".join(
+                f"{name} {usage[name]:.2f}" for name in USAGE_FIELDS if name in usage))
         
-        # Save detailed report
+        # Save detailed report; per-iteration metrics are the latest samples
+        recent = self.recent.values()
         report = {
             "summary": {
-                "total_iterations": len(self.metrics_history),
-                "successful_runs": len(times),
-                "average_time_ms": avg_time if times else 0,
-                "min_time_ms": min_time if times else 0,
-                "max_time_ms": max_time if times else 0
+                "total_iterations": self.total_iterations,
+                "timing": self.session.timing,
+                "successful_runs": stats.count,
+                "average_time_ms": stats.mean if stats.count else 0,
+                "min_time_ms": stats.min if stats.count else 0,
+                "max_time_ms": stats.max if stats.count else 0,
+                "std_time_ms": stats.std,
+                "percentiles_ms": percentiles,
+                "percentile_relative_accuracy": self.latency.relative_accuracy,
+                "usage_per_run": usage
             },
-            "metrics": self.metrics_history
+            "metrics": [
+                {
+                    "iteration": int(sample["iteration"]),
+                    "timestamp": datetime.fromtimestamp(sample["timestamp"]).isoformat(),
+                    "execution_time_ms": float(sample["time_ms"]),
+                    "success": bool(sample["success"]),
+                    "usage": {name: float(sample[name]) for name in USAGE_FIELDS
+                              if not math.isnan(sample[name])}
+                }
+                for sample in recent
+            ]
         }
         
         with open("performance_report.json", 'w') as f:
             json.dump(report, f, indent=2)
         
         print(f"\nDetailed report saved to: performance_report.json")
+    
+    def _mean_usage(self):
+        """Mean host usage per run over the whole run; peak fields are maxima"""
+        if not self.usage_runs:
+            return {}
+        return {name: value if name in PEAK_FIELDS else value / self.usage_runs
+                for name, value in self.usage_totals.items()}
+    
+    def run_concurrency_sweep(self, scenario_path, max_workers, level_duration=10, warmup=1.0,
+                              min_gain=0.05, report_path="concurrency_report.json"):
+        """Closed-loop sweep over 1..max_workers concurrent workers"""
+        print(f"=== Concurrency Sweep ===")
+        print(f"Scenario: {scenario_path}")
+        print(f"Workers: 1..{max_workers}, {level_duration} s per level after {warmup} s warmup\n")
+        
+        levels = []
+        self.monitoring = True
+        try:
+            with self._open_sessions(scenario_path, max_workers) as sessions:
+                print("Workers | Throughput (req/s) | Speedup | Efficiency | p50 (ms) | p95 (ms) | p99 (ms) | Failed")
+                print("--------|--------------------|---------|------------|----------|----------|----------|-------")
+                for workers in range(1, max_workers + 1):
+                    level = self._run_level(sessions[:workers], level_duration, warmup)
+                    levels.append(level)
+                    base = levels[0]["throughput_rps"]
+                    level["speedup"] = level["throughput_rps"] / base if base else 0
+                    level["efficiency"] = level["speedup"] / workers
+                    p50, p95, p99 = (f"{level['percentiles_ms'][k]:8.2f}" if level['percentiles_ms'][k] is not None
+                                     else f"{'-':>8}" for k in ("p50", "p95", "p99"))
+                    print(f"{workers:7d} | {level['throughput_rps']:18.1f} | {level['speedup']:7.2f} | "
+                          f"{level['efficiency']:10.0%} | {p50} | {p95} | {p99} | {level['failed']:6d}")
+                    if not self.monitoring:
+                        break
+        except KeyboardInterrupt:
+            print("\nStopping sweep...")
+        finally:
+            self.monitoring = False
+        
+        knee = find_knee(levels, min_gain)
+        if knee is not None:
+            print(f"\nKnee: {knee} worker(s); more concurrency adds less than {min_gain:.0%} throughput")
+        
+        with open(report_path, 'w') as f:
+            json.dump({"scenario": scenario_path, "min_gain": min_gain, "knee_workers": knee,
+                       "levels": levels}, f, indent=2)
+        print(f"Sweep report saved to: {report_path}")
+        return levels, knee
+    
+    def _run_level(self, sessions, level_duration, warmup):
+        """Run len(sessions) closed-loop workers; requests started during warmup are not counted"""
+        sketch = DDSketch(self.latency.relative_accuracy)
+        stats = RunningStats()
+        counts = {"completed": 0, "failed": 0, "last_end": None}
+        level_start = time.perf_counter()
+        warmup_end = level_start + warmup
+        deadline = warmup_end + level_duration
+        
+        def worker(session, handle):
+            while self.monitoring and time.perf_counter() < deadline:
+                start = time.perf_counter()
+                run = session.run(handle)[0]
+                end = time.perf_counter()
+                if start < warmup_end:
+                    continue
+                latency_ms = (end - start) * 1000
+                with self.lock:
+                    counts["last_end"] = max(counts["last_end"] or end, end)
+                    if run["success"]:
+                        counts["completed"] += 1
+                        sketch.add(latency_ms)
+                        stats.add(latency_ms)
+                    else:
+                        counts["failed"] += 1
+        
+        threads = [threading.Thread(target=worker, args=pair) for pair in sessions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        elapsed = (counts["last_end"] or deadline) - warmup_end
+        return {
+            "workers": len(sessions),
+            "completed": counts["completed"],
+            "failed": counts["failed"],
+            "elapsed_s": elapsed,
+            "throughput_rps": counts["completed"] / elapsed if elapsed > 0 else 0,
+            "mean_latency_ms": stats.mean if stats.count else None,
+            "percentiles_ms": dict(zip((quantile_label(q) for q in DEFAULT_QUANTILES),
+                                       sketch.quantiles(DEFAULT_QUANTILES)))
+        }
+
+def find_knee(levels, min_gain=0.05):
+    """
+    Concurrency of the knee of a sweep: the fewest workers reaching the
+    peak throughput to within min_gain. Comparing against the peak rather
+    than the next level keeps a single noisy level from ending the search.
+    None for an empty sweep.
+    """
+    if not levels:
+        return None
+    peak = max(level["throughput_rps"] for level in levels)
+    for level in levels:
+        if level["throughput_rps"] * (1 + min_gain) >= peak:
+            return level["workers"]
 
 def main():
     import argparse
     parser = argparse.ArgumentParser(description="Real-time performance monitor")
     parser.add_argument("scenario", help="Path to scenario file")
     parser.add_argument("--duration", type=int, default=60, help="Monitoring duration in seconds")
+    parser.add_argument("--history", type=int, default=4096,
+                        help="Number of latest samples kept for the detailed report")
+    parser.add_argument("--accuracy", type=float, default=0.01,
+                        help="Relative accuracy of the percentile estimates")
+    parser.add_argument("--concurrency", type=int, metavar="K",
+                        help="Run a closed-loop sweep with 1..K concurrent workers instead")
+    parser.add_argument("--level-duration", type=float, default=10,
+                        help="Measured seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=1.0,
+                        help="Unmeasured seconds at the start of every concurrency level")
+    parser.add_argument("--min-gain", type=float, default=0.05,
+                        help="Throughput gain below which more workers count as not helping")
     
     args = parser.parse_args()
     
-    monitor = VulkanPerformanceMonitor()
-    monitor.start_monitoring(args.scenario, args.duration)
+    monitor = VulkanPerformanceMonitor(args.history, args.accuracy)
+    if args.concurrency:
+        monitor.run_concurrency_sweep(args.scenario, args.concurrency, args.level_duration,
+                                      args.warmup, args.min_gain)
+    else:
+        monitor.start_monitoring(args.scenario, args.duration)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Long-lived scenario-runner sessions
+
+Starting scenario-runner for every measured iteration means the timings are
+dominated by process start, Vulkan instance creation and shader loading.
+A session starts the runner once with --session and then talks to it over
+its stdin/stdout, one JSON object per line:
+
+    runner -> {"ready": true, "protocol": 1}
+    client -> {"op": "load", "scenario": "<path>", "output": "<dir>"}
+    runner -> {"ok": true, "handle": 0}
+    client -> {"op": "run", "handle": 0, "iterations": N,
+               "inputs": {"<uid>": "<new src .npy>"}}
+    runner -> {"ok": true, "runs": [{"time_ms": .., "total_ms": ..,
+                                      "dispatches": [..]}, ...]}
+    client -> {"op": "close"}
+    runner -> {"ok": true}
+
+Failures are reported as {"ok": false, "error": "<message>"}.
+numpy_scenario_runner.py implements the runner side. For runners without
+session support, open_session() falls back to SpawnSession, which keeps the
+same API but starts one process per run.
+
+Runs report "wall_ms", the host wall time per run, and session runs also
+"compute_ms", the execution time measured inside the runner. Without a
+session, wall_ms includes process start. A session's `timing` names the key
+of its most precise time, which is the one to report.
+
+Every run also reports the runner's host resource usage as "usage", see
+process_usage.py.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from process_usage import ProcessSampler, run_measured, split_usage
+from profiling_dump import read_dispatches
+
+PROTOCOL = 1
+
+
+class SessionError(RuntimeError):
+    """The session process failed or broke the protocol"""
+
+
+class ScenarioSession:
+    """
+    Scenario runner process driven over a JSON-lines pipe.
+
+    Parameters
+    ----------
+    runner : 'str'
+        Path to a runner that supports --session.
+    env : 'dict'
+        Environment for the runner process.
+    preexec_fn : 'callable'
+        Called in the runner process before it starts, e.g. to pin it to CPUs.
+    """
+
+    timing = "compute_ms"
+    timing_label = "compute time inside the runner"
+
+    def __init__(self, runner, env=None, preexec_fn=None):
+        self.runner = runner
+        self._stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(
+            [runner, "--session"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=self._stderr,
+            env=env,
+            text=True,
+            bufsize=1,
+            preexec_fn=preexec_fn,
+        )
+        self.sampler = ProcessSampler(self.process.pid)
+        try:
+            hello = self._receive()
+        except SessionError:
+            self.close()
+            raise
+        if not hello.get("ready") or hello.get("protocol") != PROTOCOL:
+            self.close()
+            raise SessionError(f"{runner} does not speak session protocol {PROTOCOL}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _receive(self):
+        line = self.process.stdout.readline()
+        if not line:
+            self.process.wait()
+            self._stderr.seek(0)
+            error = self._stderr.read().decode(errors="replace").strip()
+            raise SessionError(
+                f"{self.runner} exited with code {self.process.returncode}: {error}"
+            )
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            raise SessionError(f"Unexpected output from {self.runner}: {line.strip()}")
+
+    def _request(self, **request):
+        try:
+            self.process.stdin.write(json.dumps(request) + "\n")
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            pass  # _receive reports the exit status
+        return self._receive()
+
+    def load(self, scenario_path, output_dir=None):
+        """Parse a scenario and load its inputs once, returning a handle"""
+        reply = self._request(
+            op="load", scenario=os.path.abspath(scenario_path), output=output_dir
+        )
+        if not reply.get("ok"):
+            raise SessionError(f"Failed to load {scenario_path}: {reply.get('error')}")
+        return reply["handle"]
+
+    def run(self, handle, iterations=1, inputs=None):
+        """
+        Execute a loaded scenario `iterations` times.
+
+        Returns one dict per run with "success", "compute_ms" (execution
+        inside the runner), "runner_ms" (including input/output files),
+        "wall_ms" (the request's wall time, split evenly over its runs),
+        "dispatches" and "usage" (the request's resource usage, split the
+        same way); a failed request yields a single unsuccessful run.
+        """
+        if inputs:
+            inputs = {uid: os.path.abspath(path) for uid, path in inputs.items()}
+        before = self.sampler.snapshot()
+        start = time.perf_counter()
+        reply = self._request(
+            op="run", handle=handle, iterations=iterations, inputs=inputs
+        )
+        wall_ms = (time.perf_counter() - start) * 1000
+        usage = ProcessSampler.delta(before, self.sampler.snapshot())
+        if not reply.get("ok"):
+            return [
+                {
+                    "success": False,
+                    "error": reply.get("error"),
+                    "wall_ms": wall_ms,
+                    "usage": usage,
+                }
+            ]
+        runs = reply["runs"]
+        return [
+            {
+                "success": True,
+                "compute_ms": run["time_ms"],
+                "runner_ms": run["total_ms"],
+                "wall_ms": wall_ms / len(runs),
+                "dispatches": run.get("dispatches", []),
+                "usage": split_usage(usage, len(runs)),
+            }
+            for run in runs
+        ]
+
+    def close(self):
+        """Ask the runner to exit and reap it"""
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.write(json.dumps({"op": "close"}) + "\n")
+                self.process.stdin.close()
+                self.process.wait(timeout=10)
+            except (BrokenPipeError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+        self._stderr.close()
+
+
+class SpawnSession:
+    """
+    Session API for runners without --session: one process per run.
+
+    Parameters
+    ----------
+    runner : 'str'
+        Path to the scenario-runner binary.
+    env : 'dict'
+        Environment for the runner processes.
+    extra_args : 'list'
+        Additional command line arguments for every run.
+    profiling : 'bool'
+        Pass --profiling-dump-path to every run and report the dumped
+        per-dispatch device times as the run's "dispatches".
+    preexec_fn : 'callable'
+        Called in every runner process before it starts.
+    """
+
+    timing = "wall_ms"
+    timing_label = "wall time per run, including process start"
+
+    def __init__(
+        self, runner, env=None, extra_args=(), profiling=False, preexec_fn=None
+    ):
+        self.runner = runner
+        self.env = env
+        self.extra_args = list(extra_args)
+        self.profiling = profiling
+        self.preexec_fn = preexec_fn
+        self.scenarios = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def load(self, scenario_path, output_dir=None):
+        self.scenarios.append((scenario_path, output_dir))
+        return len(self.scenarios) - 1
+
+    def run(self, handle, iterations=1, inputs=None):
+        """
+        Start the runner `iterations` times. Runs report "success",
+        "wall_ms", "stdout", "error", "usage" and, with profiling, the
+        dumped "dispatches".
+        """
+        scenario_path, output_dir = self.scenarios[handle]
+        if inputs:
+            scenario_path = self._with_inputs(scenario_path, inputs)
+        cmd = [self.runner, "--scenario", scenario_path]
+        if output_dir:
+            cmd += ["--output", output_dir]
+        cmd += self.extra_args
+
+        dump = None
+        if self.profiling:
+            dump_dir = tempfile.mkdtemp(prefix="profiling-")
+            dump = os.path.join(dump_dir, "dump.json")
+            cmd += ["--profiling-dump-path", dump]
+
+        runs = []
+        try:
+            for _ in range(iterations):
+                if dump and os.path.exists(dump):
+                    # Only a dump written by this run may be read after it
+                    os.unlink(dump)
+                start = time.perf_counter()
+                result, usage = run_measured(
+                    cmd, env=self.env, preexec_fn=self.preexec_fn
+                )
+                elapsed = (time.perf_counter() - start) * 1000
+                run = {
+                    "success": result.returncode == 0,
+                    "wall_ms": elapsed,
+                    "stdout": result.stdout,
+                    "error": result.stderr if result.returncode else None,
+                    "usage": usage,
+                }
+                if dump and result.returncode == 0 and os.path.exists(dump):
+                    try:
+                        run["dispatches"] = read_dispatches(dump)
+                    except (OSError, ValueError):
+                        pass
+                runs.append(run)
+        finally:
+            if inputs:
+                os.unlink(scenario_path)
+            if dump:
+                shutil.rmtree(dump_dir, ignore_errors=True)
+        return runs
+
+    @staticmethod
+    def _with_inputs(scenario_path, inputs):
+        """Write a copy of the scenario with the src of some resources replaced"""
+        with open(scenario_path) as f:
+            scenario = json.load(f)
+        missing = set(inputs)
+        for entry in scenario.get("resources", []):
+            desc = next(iter(entry.values()))
+            if desc.get("uid") in inputs:
+                desc["src"] = os.path.abspath(inputs[desc["uid"]])
+                missing.discard(desc["uid"])
+        if missing:
+            raise KeyError(f"Unknown resource(s) {sorted(missing)}")
+        # Same directory, so relative paths in the scenario still resolve
+        fd, path = tempfile.mkstemp(
+            suffix=".json", dir=os.path.dirname(os.path.abspath(scenario_path))
+        )
+        with os.fdopen(fd, "w") as f:
+            json.dump(scenario, f)
+        return path
+
+    def close(self):
+        pass
+
+
+def open_session(runner, env=None, extra_args=(), profiling=False, preexec_fn=None):
+    """
+    Start a persistent session, or fall back to one process per run.
+
+    Session runs always report per-dispatch times; with profiling, per-run
+    processes get them from the runner's profiling dump.
+    """
+    try:
+        return ScenarioSession(runner, env, preexec_fn)
+    except (SessionError, OSError):
+        return SpawnSession(runner, env, extra_args, profiling, preexec_fn)
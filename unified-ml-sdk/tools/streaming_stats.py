@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Constant-memory statistics for long-running measurements
+
+RingBuffer keeps the most recent samples in a preallocated numpy array.
+DDSketch estimates quantiles with a bounded relative error from logarithmic
+buckets. RunningStats keeps count, mean, standard deviation, min and max
+(Welford). Memory use depends on the configuration, never on the number of
+samples, so a monitor can run for days.
+"""
+
+import math
+
+import numpy as np
+
+SAMPLE_DTYPE = np.dtype(
+    [
+        ("iteration", np.int64),
+        ("timestamp", np.float64),
+        ("time_ms", np.float64),
+        ("success", np.bool_),
+    ]
+)
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99, 0.999)
+
+
+def sample_dtype(extra_fields=()):
+    """SAMPLE_DTYPE with additional float64 fields"""
+    return np.dtype(SAMPLE_DTYPE.descr + [(name, np.float64) for name in extra_fields])
+
+
+class RingBuffer:
+    """
+    Fixed-capacity buffer of the latest samples; older samples are overwritten.
+
+    Parameters
+    ----------
+    capacity : 'int'
+        Number of samples kept.
+    dtype : 'numpy.dtype'
+        Sample type, by default SAMPLE_DTYPE.
+    """
+
+    def __init__(self, capacity, dtype=SAMPLE_DTYPE):
+        if capacity < 1:
+            raise ValueError("Ring buffer capacity must be at least 1")
+        self.data = np.zeros(capacity, dtype=dtype)
+        self.capacity = capacity
+        self.count = 0
+
+    def append(self, sample):
+        self.data[self.count % self.capacity] = sample
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def values(self):
+        """Stored samples, oldest first"""
+        if self.count <= self.capacity:
+            return self.data[: self.count].copy()
+        start = self.count % self.capacity
+        return np.concatenate((self.data[start:], self.data[:start]))
+
+
+class DDSketch:
+    """
+    Quantile sketch with relative accuracy guarantees (Masson et al., 2019).
+
+    A positive value x falls in bucket ceil(log_gamma(x)) with
+    gamma = (1 + alpha) / (1 - alpha). Any quantile is then returned within a
+    relative error alpha of a true sample value. When more than max_buckets
+    buckets are in use, the lowest buckets are merged, which only costs
+    accuracy on the low quantiles. Sketches with the same alpha can be merged.
+
+    Parameters
+    ----------
+    relative_accuracy : 'float'
+        Relative error bound alpha of the quantiles.
+    max_buckets : 'int'
+        Bound on the number of buckets.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("Relative accuracy must be in (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value, weight=1):
+        """Add a non-negative value"""
+        value = float(value)
+        if value < 0 or math.isnan(value):
+            raise ValueError(f"DDSketch only accepts non-negative values, got {value}")
+        self.count += weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value <= 1e-9:
+            self.zero_count += weight
+            return
+        key = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + weight
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self):
+        keys = sorted(self.buckets)
+        excess = len(keys) - self.max_buckets
+        folded = sum(self.buckets.pop(key) for key in keys[:excess])
+        self.buckets[keys[excess]] += folded
+
+    def merge(self, other):
+        """Add the contents of a sketch with the same relative accuracy"""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracies")
+        for key, weight in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + weight
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        while len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def quantiles(self, qs=DEFAULT_QUANTILES):
+        """Estimates of several quantiles in one pass over the buckets; None when empty"""
+        if self.count == 0:
+            return [None for _ in qs]
+        order = sorted(range(len(qs)), key=lambda i: qs[i])
+        results = [None] * len(qs)
+        keys = iter(sorted(self.buckets))
+        seen = self.zero_count
+        key = None
+        for i in order:
+            q = qs[i]
+            if not 0 <= q <= 1:
+                raise ValueError(f"Quantile {q} outside [0, 1]")
+            rank = q * (self.count - 1)
+            if rank < self.zero_count:
+                results[i] = max(self.min, 0.0)
+                continue
+            while seen <= rank:
+                key = next(keys)
+                seen += self.buckets[key]
+            value = 2 * self.gamma**key / (self.gamma + 1)
+            results[i] = min(max(value, self.min), self.max)
+        return results
+
+    def quantile(self, q):
+        return self.quantiles((q,))[0]
+
+
+class RunningStats:
+    """Count, mean, standard deviation, min and max of a stream (Welford)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def std(self):
+        return math.sqrt(self._m2 / self.count) if self.count else 0.0
+
+
+def quantile_label(q):
+    """Report name of a quantile: 0.5 -> p50, 0.999 -> p999"""
+    return "p" + f"{q * 100:g}".replace(".", "")
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Tests of the scenario memory planner"""
+
+import unittest
+
+from memory_planner import plan_memory
+
+
+def chain_scenario(length, size=1024):
+    """in -> t1 -> ... -> out, one dispatch per link, all buffers intermediate"""
+    uids = ["in"] + [f"t{i}" for i in range(1, length)] + ["out"]
+    resources = [{"shader": {"uid": "shader", "src": "op.spv", "entry": "main"}}]
+    resources += [
+        {"buffer": {"uid": uid, "size": size, "shader_access": "readwrite"}}
+        for uid in uids
+    ]
+    commands = [
+        {
+            "dispatch_compute": {
+                "bindings": [
+                    {"set": 0, "id": 0, "resource_ref": src},
+                    {"set": 0, "id": 1, "resource_ref": dst},
+                ],
+                "shader_ref": "shader",
+                "rangeND": [1, 1, 1],
+            }
+        }
+        for src, dst in zip(uids, uids[1:])
+    ]
+    return {"resources": resources, "commands": commands}
+
+
+def resource_uids(scenario):
+    return [next(iter(entry.values()))["uid"] for entry in scenario["resources"]]
+
+
+class PlanMemoryTest(unittest.TestCase):
+    def test_inputs_and_outputs_keep_their_uids(self):
+        for length in (1, 2, 3, 20):
+            planned, _ = plan_memory(
+                chain_scenario(length), inputs=["in"], outputs=["out"]
+            )
+            uids = resource_uids(planned)
+            self.assertIn("in", uids, f"chain of {length}")
+            self.assertIn("out", uids, f"chain of {length}")
+
+    def test_input_is_never_shared(self):
+        planned, report = plan_memory(
+            chain_scenario(20), inputs=["in"], outputs=["out"]
+        )
+        sharing = [uid for uid, slot in report["assignment"].items() if slot == "in"]
+        self.assertEqual(sharing, ["in"])
+        # Only the first dispatch touches the input, and only reads it
+        refs = [
+            binding["resource_ref"]
+            for command in planned["commands"]
+            for binding in command["dispatch_compute"]["bindings"]
+        ]
+        self.assertEqual(refs.count("in"), 1)
+
+    def test_intermediates_are_shared(self):
+        planned, report = plan_memory(
+            chain_scenario(20), inputs=["in"], outputs=["out"]
+        )
+        self.assertLess(
+            len(resource_uids(planned)), len(resource_uids(chain_scenario(20)))
+        )
+        self.assertLess(report["planned_bytes"], report["naive_bytes"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Zero-copy reader for TensorFlow Lite FlatBuffers models
+
+The model file is memory-mapped and only the tables that are asked for are
+decoded. Weight buffers and quantization vectors are returned as NumPy views
+over the mapping, so nothing is copied until the caller touches the data.
+"""
+
+import mmap
+import os
+import struct
+
+import numpy as np
+
+TFLITE_IDENTIFIER = b"TFL3"
+
+_I8 = struct.Struct("<b")
+_U16 = struct.Struct("<H")
+_I32 = struct.Struct("<i")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+
+# tflite::TensorType -> (name, little-endian NumPy dtype)
+TENSOR_TYPES = {
+    0: ("FLOAT32", "<f4"),
+    1: ("FLOAT16", "<f2"),
+    2: ("INT32", "<i4"),
+    3: ("UINT8", "u1"),
+    4: ("INT64", "<i8"),
+    5: ("STRING", None),
+    6: ("BOOL", "?"),
+    7: ("INT16", "<i2"),
+    8: ("COMPLEX64", "<c8"),
+    9: ("INT8", "i1"),
+    10: ("FLOAT64", "<f8"),
+    11: ("COMPLEX128", "<c16"),
+    12: ("UINT64", "<u8"),
+    13: ("RESOURCE", None),
+    14: ("VARIANT", None),
+    15: ("UINT32", "<u4"),
+    16: ("UINT16", "<u2"),
+    17: ("INT4", None),
+    18: ("BFLOAT16", None),
+}
+
+# tflite::BuiltinOperator, indexed by enum value
+# fmt: off
+BUILTIN_OPERATORS = [
+    "ADD", "AVERAGE_POOL_2D", "CONCATENATION", "CONV_2D", "DEPTHWISE_CONV_2D",
+    "DEPTH_TO_SPACE", "DEQUANTIZE", "EMBEDDING_LOOKUP", "FLOOR",
+    "FULLY_CONNECTED", "HASHTABLE_LOOKUP", "L2_NORMALIZATION", "L2_POOL_2D",
+    "LOCAL_RESPONSE_NORMALIZATION", "LOGISTIC", "LSH_PROJECTION", "LSTM",
+    "MAX_POOL_2D", "MUL", "RELU", "RELU_N1_TO_1", "RELU6", "RESHAPE",
+    "RESIZE_BILINEAR", "RNN", "SOFTMAX", "SPACE_TO_DEPTH", "SVDF", "TANH",
+    "CONCAT_EMBEDDINGS", "SKIP_GRAM", "CALL", "CUSTOM",
+    "EMBEDDING_LOOKUP_SPARSE", "PAD", "UNIDIRECTIONAL_SEQUENCE_RNN", "GATHER",
+    "BATCH_TO_SPACE_ND", "SPACE_TO_BATCH_ND", "TRANSPOSE", "MEAN", "SUB", "DIV",
+    "SQUEEZE", "UNIDIRECTIONAL_SEQUENCE_LSTM", "STRIDED_SLICE",
+    "BIDIRECTIONAL_SEQUENCE_RNN", "EXP", "TOPK_V2", "SPLIT", "LOG_SOFTMAX",
+    "DELEGATE", "BIDIRECTIONAL_SEQUENCE_LSTM", "CAST", "PRELU", "MAXIMUM",
+    "ARG_MAX", "MINIMUM", "LESS", "NEG", "PADV2", "GREATER", "GREATER_EQUAL",
+    "LESS_EQUAL", "SELECT", "SLICE", "SIN", "TRANSPOSE_CONV",
+    "SPARSE_TO_DENSE", "TILE", "EXPAND_DIMS", "EQUAL", "NOT_EQUAL", "LOG",
+    "SUM", "SQRT", "RSQRT", "SHAPE", "POW", "ARG_MIN", "FAKE_QUANT",
+    "REDUCE_PROD", "REDUCE_MAX", "PACK", "LOGICAL_OR", "ONE_HOT",
+    "LOGICAL_AND", "LOGICAL_NOT", "UNPACK", "REDUCE_MIN", "FLOOR_DIV",
+    "REDUCE_ANY", "SQUARE", "ZEROS_LIKE", "FILL", "FLOOR_MOD", "RANGE",
+    "RESIZE_NEAREST_NEIGHBOR", "LEAKY_RELU", "SQUARED_DIFFERENCE",
+    "MIRROR_PAD", "ABS", "SPLIT_V", "UNIQUE", "CEIL", "REVERSE_V2", "ADD_N",
+    "GATHER_ND", "COS", "WHERE", "RANK", "ELU", "REVERSE_SEQUENCE",
+    "MATRIX_DIAG", "QUANTIZE", "MATRIX_SET_DIAG", "ROUND", "HARD_SWISH", "IF",
+    "WHILE", "NON_MAX_SUPPRESSION_V4", "NON_MAX_SUPPRESSION_V5", "SCATTER_ND",
+    "SELECT_V2", "DENSIFY", "SEGMENT_SUM", "BATCH_MATMUL",
+    "PLACEHOLDER_FOR_GREATER_OP_CODES", "CUMSUM", "CALL_ONCE",
+    "BROADCAST_TO", "RFFT2D", "CONV_3D", "IMAG", "REAL", "COMPLEX_ABS",
+    "HASHTABLE", "HASHTABLE_FIND", "HASHTABLE_IMPORT", "HASHTABLE_SIZE",
+    "REDUCE_ALL", "CONV_3D_TRANSPOSE", "VAR_HANDLE", "READ_VARIABLE",
+    "ASSIGN_VARIABLE", "BROADCAST_ARGS", "RANDOM_STANDARD_NORMAL",
+    "BUCKETIZE", "RANDOM_UNIFORM", "MULTINOMIAL", "GELU",
+    "DYNAMIC_UPDATE_SLICE", "RELU_0_TO_1", "UNSORTED_SEGMENT_PROD",
+    "UNSORTED_SEGMENT_MAX", "UNSORTED_SEGMENT_SUM", "ATAN2",
+    "UNSORTED_SEGMENT_MIN", "SIGN", "BITCAST", "BITWISE_XOR",
+    "RIGHT_SHIFT",
+]
+# fmt: on
+
+PADDING = {0: "SAME", 1: "VALID"}
+ACTIVATIONS = {
+    0: "NONE",
+    1: "RELU",
+    2: "RELU_N1_TO_1",
+    3: "RELU6",
+    4: "TANH",
+    5: "SIGN_BIT",
+}
+
+# Builtin option tables that matter for pipeline generation, keyed by
+# operator name: list of (field index, option name, struct, decoder, default)
+_POOL_OPTIONS = [
+    (0, "padding", _I8, PADDING.get, 0),
+    (1, "stride_w", _I32, None, 1),
+    (2, "stride_h", _I32, None, 1),
+    (3, "filter_width", _I32, None, 0),
+    (4, "filter_height", _I32, None, 0),
+    (5, "fused_activation_function", _I8, ACTIVATIONS.get, 0),
+]
+_ACTIVATION_OPTIONS = [(0, "fused_activation_function", _I8, ACTIVATIONS.get, 0)]
+BUILTIN_OPTIONS = {
+    "CONV_2D": [
+        (0, "padding", _I8, PADDING.get, 0),
+        (1, "stride_w", _I32, None, 1),
+        (2, "stride_h", _I32, None, 1),
+        (3, "fused_activation_function", _I8, ACTIVATIONS.get, 0),
+        (4, "dilation_w_factor", _I32, None, 1),
+        (5, "dilation_h_factor", _I32, None, 1),
+    ],
+    "DEPTHWISE_CONV_2D": [
+        (0, "padding", _I8, PADDING.get, 0),
+        (1, "stride_w", _I32, None, 1),
+        (2, "stride_h", _I32, None, 1),
+        (3, "depth_multiplier", _I32, None, 0),
+        (4, "fused_activation_function", _I8, ACTIVATIONS.get, 0),
+        (5, "dilation_w_factor", _I32, None, 1),
+        (6, "dilation_h_factor", _I32, None, 1),
+    ],
+    "TRANSPOSE_CONV": [
+        (0, "padding", _I8, PADDING.get, 0),
+        (1, "stride_w", _I32, None, 1),
+        (2, "stride_h", _I32, None, 1),
+        (3, "fused_activation_function", _I8, ACTIVATIONS.get, 0),
+    ],
+    "AVERAGE_POOL_2D": _POOL_OPTIONS,
+    "MAX_POOL_2D": _POOL_OPTIONS,
+    "L2_POOL_2D": _POOL_OPTIONS,
+    "FULLY_CONNECTED": _ACTIVATION_OPTIONS,
+    "ADD": _ACTIVATION_OPTIONS,
+    "SUB": _ACTIVATION_OPTIONS,
+    "MUL": _ACTIVATION_OPTIONS,
+    "DIV": _ACTIVATION_OPTIONS,
+    "CONCATENATION": [
+        (0, "axis", _I32, None, 0),
+        (1, "fused_activation_function", _I8, ACTIVATIONS.get, 0),
+    ],
+    "SOFTMAX": [(0, "beta", struct.Struct("<f"), None, 0.0)],
+}
+
+
+class _Table:
+    """View of a single FlatBuffers table inside the mapped file"""
+
+    __slots__ = ("buf", "pos", "vtable", "vtable_size")
+
+    def __init__(self, buf, pos):
+        self.buf = buf
+        self.pos = pos
+        self.vtable = pos - _I32.unpack_from(buf, pos)[0]
+        self.vtable_size = _U16.unpack_from(buf, self.vtable)[0]
+
+    def _field(self, index):
+        entry = 4 + 2 * index
+        if entry >= self.vtable_size:
+            return 0
+        offset = _U16.unpack_from(self.buf, self.vtable + entry)[0]
+        return self.pos + offset if offset else 0
+
+    def _indirect(self, pos):
+        return pos + _U32.unpack_from(self.buf, pos)[0]
+
+    def scalar(self, index, fmt, default=0):
+        pos = self._field(index)
+        return fmt.unpack_from(self.buf, pos)[0] if pos else default
+
+    def table(self, index):
+        pos = self._field(index)
+        return _Table(self.buf, self._indirect(pos)) if pos else None
+
+    def string(self, index):
+        pos = self._field(index)
+        if not pos:
+            return None
+        start = self._indirect(pos)
+        length = _U32.unpack_from(self.buf, start)[0]
+        return bytes(self.buf[start + 4 : start + 4 + length]).decode(
+            "utf-8", "replace"
+        )
+
+    def vector(self, index):
+        """Return (first element position, length) of a vector field"""
+        pos = self._field(index)
+        if not pos:
+            return 0, 0
+        start = self._indirect(pos)
+        return start + 4, _U32.unpack_from(self.buf, start)[0]
+
+    def array(self, index, dtype):
+        """Return a scalar vector field as a NumPy view over the file"""
+        start, length = self.vector(index)
+        if not length:
+            return np.empty(0, dtype=dtype)
+        return np.frombuffer(self.buf, dtype=dtype, count=length, offset=start)
+
+    def tables(self, index):
+        start, length = self.vector(index)
+        return [_Table(self.buf, self._indirect(start + 4 * i)) for i in range(length)]
+
+
+class TFLiteModel:
+    """
+    Memory-mapped TensorFlow Lite model.
+
+    Subgraphs, operators and tensors are decoded into plain dictionaries when
+    the model is opened; weight data stays in the mapping and is only exposed
+    through `buffer` and `tensor_data`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path)
+        if self.size < 8:
+            raise ValueError(f"{path} is too small to be a TFLite model")
+
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = self._mmap
+
+        self.identifier = bytes(buf[4:8])
+        root = _U32.unpack_from(buf, 0)[0]
+        if root + 4 > self.size:
+            raise ValueError(f"{path} has an invalid FlatBuffers root offset")
+        model = _Table(buf, root)
+
+        self.version = model.scalar(0, _U32)
+        self.description = model.string(3)
+        self.operator_codes = [self._decode_opcode(t) for t in model.tables(1)]
+        self._buffers = model.tables(4)
+        self.subgraphs = [self._decode_subgraph(t) for t in model.tables(2)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Release the mapping once no NumPy views reference it"""
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Views handed out by buffer()/tensor_data() are still alive, the
+            # mapping is released when the last of them is collected
+            pass
+
+    @staticmethod
+    def _decode_opcode(table):
+        # builtin_code (field 3) superseded the deprecated int8 field 0 once
+        # operator codes outgrew 127, take whichever is larger
+        code = max(table.scalar(0, _I8), table.scalar(3, _I32))
+        if code == 32:
+            return table.string(1) or "CUSTOM"
+        if code < len(BUILTIN_OPERATORS):
+            return BUILTIN_OPERATORS[code]
+        return f"BUILTIN_{code}"
+
+    def _decode_subgraph(self, table):
+        tensors = [self._decode_tensor(i, t) for i, t in enumerate(table.tables(0))]
+        operators = [
+            self._decode_operator(i, t, tensors) for i, t in enumerate(table.tables(3))
+        ]
+        return {
+            "name": table.string(4) or "",
+            "inputs": table.array(1, "<i4").tolist(),
+            "outputs": table.array(2, "<i4").tolist(),
+            "tensors": tensors,
+            "operators": operators,
+        }
+
+    @staticmethod
+    def _decode_tensor(index, table):
+        type_code = table.scalar(1, _I8)
+        type_name, dtype = TENSOR_TYPES.get(type_code, (f"TYPE_{type_code}", None))
+        tensor = {
+            "index": index,
+            "name": table.string(3) or f"tensor_{index}",
+            "shape": table.array(0, "<i4").tolist(),
+            "type": type_name,
+            "dtype": np.dtype(dtype).name if dtype else None,
+            "buffer": table.scalar(2, _U32),
+        }
+
+        quant = table.table(4)
+        if quant is not None:
+            scale = quant.array(2, "<f4")
+            zero_point = quant.array(3, "<i8")
+            if len(scale):
+                tensor["quantization"] = {
+                    "scale": scale,
+                    "zero_point": zero_point,
+                    "quantized_dimension": quant.scalar(6, _I32),
+                }
+        return tensor
+
+    def _decode_operator(self, index, table, tensors):
+        opcode_index = table.scalar(0, _U32)
+        op_type = self.operator_codes[opcode_index]
+        inputs = table.array(1, "<i4").tolist()
+        outputs = table.array(2, "<i4").tolist()
+
+        options = {}
+        option_table = table.table(4)
+        if option_table is not None:
+            for field, name, fmt, decode, default in BUILTIN_OPTIONS.get(op_type, ()):
+                value = option_table.scalar(field, fmt, default)
+                options[name] = decode(value, value) if decode else value
+
+        first_output = outputs[0] if outputs else -1
+        return {
+            "index": index,
+            "type": op_type,
+            "name": tensors[first_output]["name"]
+            if first_output >= 0
+            else f"op_{index}",
+            "inputs": inputs,
+            "outputs": outputs,
+            "params": options,
+        }
+
+    def buffer_extent(self, index):
+        """Return the (file offset, byte size) of a model buffer"""
+        table = self._buffers[index]
+        start, length = table.vector(0)
+        if length:
+            return start, length
+        # Models over 2 GB keep buffer data after the FlatBuffer and only
+        # store its location in the table
+        offset = table.scalar(1, _U64)
+        size = table.scalar(2, _U64)
+        return (offset, size) if offset > 1 else (0, 0)
+
+    def buffer(self, index):
+        """Return model buffer `index` as a read-only uint8 view"""
+        offset, size = self.buffer_extent(index)
+        if not size:
+            return np.empty(0, dtype=np.uint8)
+        return np.frombuffer(self._mmap, dtype=np.uint8, count=size, offset=offset)
+
+    def tensor_data(self, tensor, subgraph=0):
+        """
+        Return the constant data of a tensor as a typed, shaped view.
+
+        Returns None for activations and other tensors without a buffer.
+        """
+        if isinstance(tensor, int):
+            tensor = self.subgraphs[subgraph]["tensors"][tensor]
+        offset, size = (
+            self.buffer_extent(tensor["buffer"]) if tensor["buffer"] else (0, 0)
+        )
+        if not size or tensor["dtype"] is None:
+            return None
+        dtype = np.dtype(tensor["dtype"]).newbyteorder("<")
+        data = np.frombuffer(
+            self._mmap, dtype=dtype, count=size // dtype.itemsize, offset=offset
+        )
+        shape = tensor["shape"]
+        return data.reshape(shape) if int(np.prod(shape)) == data.size else data
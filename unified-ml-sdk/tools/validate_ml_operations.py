@@ -7,6 +7,13 @@ import numpy as np
 import json
 import subprocess
 import os
+import tempfile
+import time
+
+import conv_reference
+
+SCENARIO_RUNNER = os.environ.get("SCENARIO_RUNNER", "../bin/scenario-runner")
+SHADER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shaders")
 
 class MLOperationValidator:
     def __init__(self):
@@ -14,31 +21,39 @@ class MLOperationValidator:
         self.tolerance = 1e-4  # FP32 tolerance
         self.fp16_tolerance = 1e-2  # FP16 tolerance
     
-    def validate_conv2d(self):
+    def validate_conv2d(self, input_shape=(1, 8, 8, 3), filter_shape=(3, 3, 3, 16)):
         """Validate convolution operation"""
-        print("\nValidating Conv2D...")
-        
-        # Create test data
-        input_shape = (1, 8, 8, 3)  # NHWC
-        filter_shape = (3, 3, 3, 16)  # HWIO
+        print(f"\nValidating Conv2D {input_shape} x {filter_shape}...")
         
+        # Create test data (NHWC input, HWIO filter shape); conv2d.comp reads
+        # the filter as [OC, KH, KW, IC]
         input_data = np.random.randn(*input_shape).astype(np.float32)
-        filter_data = np.random.randn(*filter_shape).astype(np.float32)
+        filter_data = np.random.randn(*filter_shape).astype(np.float32).transpose(3, 0, 1, 2)
         
         # Reference implementation (NumPy)
+        start = time.perf_counter()
         ref_output = self._conv2d_reference(input_data, filter_data)
+        print(f"  Reference: {(time.perf_counter() - start) * 1000:.1f} ms")
         
         # Vulkan implementation
-        vulkan_output = self._run_vulkan_conv2d(input_data, filter_data)
+        vulkan_output = self._run_vulkan_conv2d(input_data, filter_data, ref_output.shape)
         
         # Compare results
-        if vulkan_output is not None:
+        if vulkan_output is not None and vulkan_output.shape != ref_output.shape:
+            result = {
+                "operation": "Conv2D",
+                "shape": list(input_shape),
+                "passed": False,
+                "error": f"Output shape {list(vulkan_output.shape)} != reference {list(ref_output.shape)}"
+            }
+        elif vulkan_output is not None:
             diff = np.abs(ref_output - vulkan_output)
             max_diff = np.max(diff)
-            passed = max_diff < self.tolerance
+            passed = bool(max_diff < self.tolerance)
             
             result = {
                 "operation": "Conv2D",
+                "shape": list(input_shape),
                 "passed": passed,
                 "max_difference": float(max_diff),
                 "tolerance": self.tolerance
@@ -46,6 +61,7 @@ class MLOperationValidator:
         else:
             result = {
                 "operation": "Conv2D",
+                "shape": list(input_shape),
                 "passed": False,
                 "error": "Vulkan execution failed"
             }
@@ -54,40 +70,34 @@ class MLOperationValidator:
         print(f"  Result: {'PASS' if result.get('passed', False) else 'FAIL'}")
         if 'max_difference' in result:
             print(f"  Max difference: {result['max_difference']:.6e}")
+        elif 'error' in result:
+            print(f"  Error: {result['error']}")
     
     def _conv2d_reference(self, input_data, filter_data):
-        """Reference Conv2D implementation"""
-        N, H, W, C_in = input_data.shape
-        F_h, F_w, _, C_out = filter_data.shape
-        
-        # Simple convolution (no padding, stride=1)
-        H_out = H - F_h + 1
-        W_out = W - F_w + 1
-        output = np.zeros((N, H_out, W_out, C_out), dtype=np.float32)
-        
-        for n in range(N):
-            for h in range(H_out):
-                for w in range(W_out):
-                    for c_out in range(C_out):
-                        # Compute convolution
-                        patch = input_data[n, h:h+F_h, w:w+F_w, :]
-                        kernel = filter_data[:, :, :, c_out]
-                        output[n, h, w, c_out] = np.sum(patch * kernel)
-        
-        return output
+        """Reference Conv2D implementation (no padding, stride=1, OHWI filter)"""
+        return conv_reference.conv2d(input_data, filter_data)
     
-    def _run_vulkan_conv2d(self, input_data, filter_data):
+    def _run_vulkan_conv2d(self, input_data, filter_data, output_shape):
         """Run Conv2D on Vulkan"""
+        # A fresh directory per run, so no stale output can be compared
+        with tempfile.TemporaryDirectory(prefix="conv2d_test-") as work_dir:
+            return self._run_conv2d_scenario(work_dir, input_data, filter_data, output_shape)
+    
+    def _run_conv2d_scenario(self, work_dir, input_data, filter_data, output_shape):
         # Save test data
-        np.save("/tmp/conv2d_input.npy", input_data)
-        np.save("/tmp/conv2d_filter.npy", filter_data)
+        input_path = os.path.join(work_dir, "conv2d_input.npy")
+        filter_path = os.path.join(work_dir, "conv2d_filter.npy")
+        scenario_path = os.path.join(work_dir, "conv2d_test.json")
+        output_path = os.path.join(work_dir, "output.npy")
+        np.save(input_path, input_data)
+        np.save(filter_path, filter_data)
         
         # Create test scenario
         scenario = {
             "commands": [{
                 "dispatch_compute": {
                     "shader_ref": "conv2d_test",
-                    "rangeND": [6, 6, 1],  # Output dimensions
+                    "rangeND": [output_shape[2], output_shape[1], 1],  # Output dimensions
                     "bindings": [
                         {"id": 0, "set": 0, "resource_ref": "input"},
                         {"id": 1, "set": 0, "resource_ref": "filter"},
@@ -100,7 +110,7 @@ class MLOperationValidator:
                     "shader": {
                         "uid": "conv2d_test",
                         "type": "SPIR-V",
-                        "src": "../shaders/conv2d.spv",
+                        "src": os.path.join(SHADER_DIR, "conv2d.spv"),
                         "entry": "main"
                     }
                 },
@@ -109,7 +119,7 @@ class MLOperationValidator:
                         "uid": "input",
                         "shader_access": "readonly",
                         "size": input_data.nbytes,
-                        "src": "/tmp/conv2d_input.npy"
+                        "src": input_path
                     }
                 },
                 {
@@ -117,32 +127,32 @@ class MLOperationValidator:
                         "uid": "filter",
                         "shader_access": "readonly",
                         "size": filter_data.nbytes,
-                        "src": "/tmp/conv2d_filter.npy"
+                        "src": filter_path
                     }
                 },
                 {
                     "buffer": {
                         "uid": "output",
                         "shader_access": "writeonly",
-                        "size": 6 * 6 * 16 * 4  # Output size
+                        "size": int(np.prod(output_shape)) * 4  # Output size
                     }
                 }
             ]
         }
         
         # Save scenario
-        with open("/tmp/conv2d_test.json", 'w') as f:
+        with open(scenario_path, 'w') as f:
             json.dump(scenario, f)
         
         # Run scenario
         result = subprocess.run([
-            "../bin/scenario-runner",
-            "--scenario", "/tmp/conv2d_test.json",
-            "--output", "/tmp/"
-        ], capture_output=True, env={"DYLD_LIBRARY_PATH": "/usr/local/lib"})
+            SCENARIO_RUNNER,
+            "--scenario", scenario_path,
+            "--output", work_dir
+        ], capture_output=True, env={**os.environ, "DYLD_LIBRARY_PATH": "/usr/local/lib"})
         
-        if result.returncode == 0 and os.path.exists("/tmp/output.npy"):
-            return np.load("/tmp/output.npy")
+        if result.returncode == 0 and os.path.exists(output_path):
+            return np.load(output_path)
         
         return None
     
@@ -203,6 +213,7 @@ def main():
     
     # Run validations
     validator.validate_conv2d()
+    validator.validate_conv2d((1, 224, 224, 32), (3, 3, 32, 32))
     validator.validate_matmul()
     # Add more operations as needed
     